@@ -1,4 +1,5 @@
 from rest_framework import permissions
+from backend.roles import get_roles
 
 class IsAdminGroup(permissions.BasePermission):
     """
@@ -15,5 +16,5 @@ class IsAdminGroup(permissions.BasePermission):
         return (
             request.user and
             request.user.is_authenticated and
-            request.user.groups.filter(name='Admin').exists()
+            get_roles(request).is_admin
         )
@@ -0,0 +1,7 @@
+from django.contrib import admin
+from .models import Blob
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'tamaño', 'referencias', 'usado_en')
+    search_fields = ('sha256', 'nombre')
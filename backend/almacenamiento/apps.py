@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class AlmacenamientoConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'almacenamiento'
+
+    def ready(self):
+        from .signals import conectar_contadores
+        conectar_contadores()
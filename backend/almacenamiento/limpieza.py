@@ -0,0 +1,64 @@
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Blob
+from .signals import modelos_con_blobs
+from .storage import almacenamiento_por_contenido
+
+
+def get_periodo_gracia():
+    # Un blob recién guardado no tiene referencias hasta que se guarda la fila
+    # que lo usa; el periodo de gracia evita borrarlo entre medias
+    return getattr(settings, 'BLOBS_PERIODO_GRACIA', timedelta(hours=1))
+
+
+def recontar_referencias():
+    """
+    Recalcula Blob.referencias a partir de las filas que usan el storage: cada
+    fila cuenta para el blob al que apunta su fichero. Sirve para corregir las
+    cuentas tras borrados que no pasan por las señales (QuerySet.update(),
+    SQL a mano...). Devuelve cuántos blobs tenían la cuenta mal.
+    """
+    cuentas = Counter()
+    for model, campos in modelos_con_blobs():
+        for campo in campos:
+            nombres = model._base_manager.exclude(**{f"{campo.attname}__isnull": True}).exclude(**{campo.attname: ''})
+            for nombre in nombres.values_list(campo.attname, flat=True).iterator():
+                blob = campo.storage.blob_de(nombre)
+                if blob:
+                    cuentas[blob] += 1
+
+    corregidos = 0
+    for blob in Blob.objects.only('id', 'nombre', 'referencias').iterator():
+        referencias = cuentas.get(blob.nombre, 0)
+        if blob.referencias != referencias:
+            Blob.objects.filter(pk=blob.pk).update(referencias=referencias)
+            corregidos += 1
+    return corregidos
+
+
+def limpiar_blobs(periodo_gracia=None):
+    """
+    Borra los blobs sin referencias que no se han usado durante el periodo de
+    gracia. Cada uno se comprueba de nuevo bloqueado antes de borrarlo, por si
+    alguna fila lo ha empezado a usar mientras tanto. Devuelve cuántos se han
+    borrado y los bytes liberados.
+    """
+    limite = timezone.now() - (periodo_gracia if periodo_gracia is not None else get_periodo_gracia())
+    candidatos = Blob.objects.filter(referencias__lte=0, usado_en__lt=limite)
+
+    borrados = liberados = 0
+    for blob_id in candidatos.values_list('id', flat=True).iterator():
+        with transaction.atomic():
+            blob = Blob.objects.select_for_update().filter(id=blob_id).first()
+            # _save cuenta la referencia con el blob bloqueado antes de crear
+            # el enlace: con el bloqueo ya tomado se ve la cuenta al día
+            if blob is None or blob.referencias > 0 or blob.usado_en >= limite:
+                continue
+            almacenamiento_por_contenido.borrar_blob(blob.nombre)
+            blob.delete()
+        borrados += 1
+        liberados += blob.tamaño
+    return borrados, liberados
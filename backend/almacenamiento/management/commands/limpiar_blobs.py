@@ -0,0 +1,22 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from almacenamiento.limpieza import limpiar_blobs, recontar_referencias
+
+
+class Command(BaseCommand):
+    help = "Borra los ficheros del almacenamiento por contenido que ya no usa ninguna fila (para cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recontar', action='store_true',
+                            help="Recalcular antes las referencias de cada blob a partir de las filas")
+        parser.add_argument('--gracia', type=int, default=None,
+                            help="Minutos sin uso antes de borrar un blob sin referencias (BLOBS_PERIODO_GRACIA)")
+
+    def handle(self, *args, **options):
+        if options['recontar']:
+            corregidos = recontar_referencias()
+            self.stdout.write(f"Referencias corregidas: {corregidos}")
+
+        gracia = timedelta(minutes=options['gracia']) if options['gracia'] is not None else None
+        borrados, liberados = limpiar_blobs(gracia)
+        self.stdout.write(self.style.SUCCESS(f"Blobs borrados: {borrados} ({liberados} bytes liberados)"))
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:53
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('nombre', models.CharField(max_length=255, unique=True)),
+                ('tamaño', models.BigIntegerField()),
+                ('referencias', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('usado_en', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['referencias', 'usado_en'], name='blob_sin_referencias_idx')],
+            },
+        ),
+    ]
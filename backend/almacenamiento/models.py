@@ -0,0 +1,27 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Blob(models.Model):
+    """
+    Contenido único guardado por AlmacenamientoPorContenido. 'referencias' es
+    el número de ficheros (enlaces) que apuntan a él; el comando limpiar_blobs
+    borra los que se quedan sin ninguno y con --recontar lo recalcula a partir
+    de las filas de los modelos.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    nombre = models.CharField(max_length=255, unique=True)  # nombre en el storage
+    tamaño = models.BigIntegerField()
+    referencias = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Última vez que se guardó o se referenció; el periodo de gracia de la
+    # limpieza cuenta desde aquí
+    usado_en = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['referencias', 'usado_en'], name='blob_sin_referencias_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre} ({self.referencias} referencias)"
@@ -0,0 +1,70 @@
+"""
+Los ficheros de AlmacenamientoPorContenido siguen la vida de sus filas.
+
+Para cada modelo con algún FileField en ese storage se guarda, al cargar la
+fila, el nombre de cada fichero. Cuando la fila se borra, o se guarda con otro
+fichero en ese campo, se borra el enlace al blob anterior (y con él su
+referencia) una vez confirmada la transacción. Así Blob.referencias es el
+número de filas que usan cada contenido.
+"""
+from django.apps import apps
+from django.db import transaction
+from django.db.models import FileField
+from django.db.models.signals import post_delete, post_init, post_save
+from .storage import AlmacenamientoPorContenido
+
+
+def campos_blob(model):
+    return [
+        campo for campo in model._meta.concrete_fields
+        if isinstance(campo, FileField) and isinstance(campo.storage, AlmacenamientoPorContenido)
+    ]
+
+
+def modelos_con_blobs():
+    for model in apps.get_models():
+        campos = campos_blob(model)
+        if campos:
+            yield model, campos
+
+
+def nombre_fichero(valor):
+    return getattr(valor, 'name', valor) or None
+
+
+def borrar_al_confirmar(campo, nombre):
+    if nombre:
+        transaction.on_commit(lambda: campo.storage.delete(nombre))
+
+
+def conectar_contadores():
+    for model, campos in modelos_con_blobs():
+
+        def guardar_originales(sender, instance, campos=campos, **kwargs):
+            # Los campos diferidos no se conocen; no se tocan sus ficheros
+            instance._blobs_originales = {
+                campo.attname: nombre_fichero(instance.__dict__[campo.attname])
+                for campo in campos if campo.attname in instance.__dict__
+            }
+
+        def ficheros_sustituidos(sender, instance, created, update_fields=None, campos=campos, **kwargs):
+            originales = instance._blobs_originales
+            for campo in campos:
+                if campo.attname not in instance.__dict__:
+                    continue
+                if update_fields is not None and campo.attname not in update_fields:
+                    continue
+                nuevo = nombre_fichero(instance.__dict__[campo.attname])
+                anterior = originales.get(campo.attname)
+                if anterior and anterior != nuevo:
+                    borrar_al_confirmar(campo, anterior)
+                originales[campo.attname] = nuevo
+
+        def ficheros_borrados(sender, instance, campos=campos, **kwargs):
+            for campo in campos:
+                borrar_al_confirmar(campo, instance._blobs_originales.get(campo.attname))
+
+        uid = f"almacenamiento.{model._meta.label}"
+        post_init.connect(guardar_originales, sender=model, weak=False, dispatch_uid=uid)
+        post_save.connect(ficheros_sustituidos, sender=model, weak=False, dispatch_uid=uid)
+        post_delete.connect(ficheros_borrados, sender=model, weak=False, dispatch_uid=uid)
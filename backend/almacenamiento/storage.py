@@ -0,0 +1,111 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+PREFIJO_BLOBS = 'blobs/'
+
+
+def es_blob(nombre):
+    return bool(nombre) and nombre.startswith(PREFIJO_BLOBS)
+
+
+class AlmacenamientoPorContenido(FileSystemStorage):
+    """
+    Storage que guarda cada contenido una sola vez, bajo su sha256.
+
+    Al guardar se calcula el hash mientras se copia el fichero a un temporal.
+    El contenido se guarda (si no existía ya) en blobs/<ab>/<sha256> y en la
+    ruta de siempre (la de upload_to) se crea un enlace simbólico al blob, así
+    que los nombres, las URLs y .path no cambian para el resto del código.
+
+    Blob.referencias cuenta los enlaces: sube al guardar y baja en delete(),
+    que solo quita el enlace. Las filas borran su enlace al borrarse o al
+    cambiar de fichero (almacenamiento/signals.py) y el comando limpiar_blobs
+    borra los blobs que se quedan sin ninguno.
+    """
+
+    def _save(self, name, content):
+        from .models import Blob
+
+        directorio_tmp = self.path(os.path.join(PREFIJO_BLOBS, 'tmp'))
+        os.makedirs(directorio_tmp, exist_ok=True)
+        hash_contenido = hashlib.sha256()
+        tamaño = 0
+        with tempfile.NamedTemporaryFile(dir=directorio_tmp, delete=False) as temporal:
+            for bloque in content.chunks():
+                hash_contenido.update(bloque)
+                temporal.write(bloque)
+                tamaño += len(bloque)
+        sha256 = hash_contenido.hexdigest()
+
+        try:
+            # La referencia se cuenta antes de crear el enlace, con el blob
+            # bloqueado: así limpiar_blobs no puede borrarlo entre medias
+            with transaction.atomic():
+                blob, _ = Blob.objects.select_for_update().get_or_create(
+                    sha256=sha256,
+                    defaults={'nombre': f"{PREFIJO_BLOBS}{sha256[:2]}/{sha256}", 'tamaño': tamaño},
+                )
+                ruta_blob = self.path(blob.nombre)
+                if not os.path.exists(ruta_blob):
+                    os.makedirs(os.path.dirname(ruta_blob), exist_ok=True)
+                    os.replace(temporal.name, ruta_blob)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(ruta_blob, self.file_permissions_mode)
+                Blob.objects.filter(pk=blob.pk).update(referencias=F('referencias') + 1, usado_en=timezone.now())
+        finally:
+            if os.path.exists(temporal.name):
+                os.remove(temporal.name)
+
+        while True:
+            ruta = self.path(name)
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            try:
+                os.symlink(os.path.relpath(ruta_blob, os.path.dirname(ruta)), ruta)
+                break
+            except FileExistsError:
+                name = self.get_available_name(name)
+            except OSError:
+                # Sistemas sin enlaces simbólicos: se guarda una copia normal,
+                # que no cuenta como referencia del blob
+                shutil.copyfile(ruta_blob, ruta)
+                Blob.objects.filter(pk=blob.pk).update(referencias=F('referencias') - 1)
+                break
+
+        return name.replace('\\', '/')
+
+    def blob_de(self, name):
+        """Nombre del blob al que apunta 'name', o None si es un fichero normal."""
+        ruta = self.path(name)
+        if not os.path.islink(ruta):
+            return None
+        destino = os.path.normpath(os.path.join(os.path.dirname(ruta), os.readlink(ruta)))
+        nombre = os.path.relpath(destino, self.location).replace(os.sep, '/')
+        return nombre if es_blob(nombre) else None
+
+    def delete(self, name):
+        from .models import Blob
+
+        if not name:
+            raise ValueError("The name must be given to delete().")
+        blob = self.blob_de(name)
+        if blob is None:
+            super().delete(name)
+            return
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            return
+        Blob.objects.filter(nombre=blob).update(referencias=F('referencias') - 1, usado_en=timezone.now())
+
+    def borrar_blob(self, name):
+        """Borra el contenido de un blob; solo para limpiar_blobs."""
+        super().delete(name)
+
+
+almacenamiento_por_contenido = AlmacenamientoPorContenido()
@@ -0,0 +1,139 @@
+from datetime import timedelta
+from django.contrib.auth.models import Group, User
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.urls import reverse
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from patients.models import Paciente, PacienteDocumentacion
+from workers.models import PDFRegistro, Worker
+from .limpieza import limpiar_blobs, recontar_referencias
+from .models import Blob
+from .storage import almacenamiento_por_contenido
+from unittest import mock
+import io
+import os
+import shutil
+import tempfile
+
+MEDIA_TEMPORAL = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_TEMPORAL)
+class AlmacenamientoPorContenidoTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_TEMPORAL, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.group = Group.objects.create(name='Fisioterapia')
+        self.paciente = Paciente.objects.create(
+            nombre="Ana", primer_apellido="Ruiz", segundo_apellido="Paz", email="ana@example.com",
+            fecha_nacimiento="1990-01-01", grupo=self.group
+        )
+
+    def documento(self, nombre, contenido):
+        documento = PacienteDocumentacion(paciente=self.paciente)
+        documento.archivo.save(nombre, ContentFile(contenido))
+        return documento
+
+    def referencias(self, documento):
+        return Blob.objects.get(nombre=almacenamiento_por_contenido.blob_de(documento.archivo.name)).referencias
+
+    def test_mismo_contenido_se_guarda_una_vez(self):
+        primero = self.documento("consentimiento.pdf", b"%PDF plantilla")
+        segundo = self.documento("escaneo.pdf", b"%PDF plantilla")
+        self.documento("otro.pdf", b"%PDF distinto")
+
+        # Cada fila conserva su ruta de upload_to y comparten el contenido
+        self.assertIn("documentos/consentimiento.pdf", primero.archivo.name)
+        self.assertIn("documentos/escaneo.pdf", segundo.archivo.name)
+        self.assertEqual(Blob.objects.count(), 2)
+        self.assertEqual(self.referencias(primero), 2)
+        with segundo.archivo.open('rb') as archivo:
+            self.assertEqual(archivo.read(), b"%PDF plantilla")
+
+    def test_referencias_siguen_a_las_filas(self):
+        primero = self.documento("a.pdf", b"uno")
+        segundo = self.documento("b.pdf", b"uno")
+        blob = almacenamiento_por_contenido.blob_de(primero.archivo.name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            primero.delete()
+        self.assertEqual(Blob.objects.get(nombre=blob).referencias, 1)
+        self.assertFalse(almacenamiento_por_contenido.exists(primero.archivo.name))
+        self.assertTrue(almacenamiento_por_contenido.exists(segundo.archivo.name))
+
+        # Cambiar el fichero de una fila suelta el anterior
+        with self.captureOnCommitCallbacks(execute=True):
+            segundo.archivo.save("c.pdf", ContentFile(b"dos"))
+        self.assertEqual(Blob.objects.get(nombre=blob).referencias, 0)
+        self.assertEqual(self.referencias(segundo), 1)
+
+        # Borrar el paciente borra en cascada sus documentos
+        with self.captureOnCommitCallbacks(execute=True):
+            self.paciente.delete()
+        self.assertFalse(Blob.objects.filter(referencias__gt=0).exists())
+
+    def test_limpieza_respeta_referencias_y_periodo_de_gracia(self):
+        usado = self.documento("usado.pdf", b"usado")
+        huerfano = self.documento("huerfano.pdf", b"huerfano")
+        blob_huerfano = almacenamiento_por_contenido.blob_de(huerfano.archivo.name)
+        with self.captureOnCommitCallbacks(execute=True):
+            huerfano.delete()
+
+        self.assertEqual(limpiar_blobs(), (0, 0))
+        self.assertEqual(limpiar_blobs(timedelta(0)), (1, len(b"huerfano")))
+        self.assertFalse(almacenamiento_por_contenido.exists(blob_huerfano))
+        with usado.archivo.open('rb') as archivo:
+            self.assertEqual(archivo.read(), b"usado")
+
+    def test_limpieza_durante_un_guardado_no_borra_el_blob(self):
+        huerfano = self.documento("huerfano.pdf", b"reutilizado")
+        with self.captureOnCommitCallbacks(execute=True):
+            huerfano.delete()
+        Blob.objects.update(usado_en=timezone.now() - timedelta(days=1))
+
+        # La limpieza se ejecuta justo antes de que el guardado cree el enlace
+        symlink = os.symlink
+
+        def symlink_tras_limpiar(*args):
+            self.assertEqual(limpiar_blobs(), (0, 0))
+            symlink(*args)
+
+        with mock.patch('almacenamiento.storage.os.symlink', symlink_tras_limpiar):
+            documento = self.documento("nuevo.pdf", b"reutilizado")
+        self.assertEqual(self.referencias(documento), 1)
+        with documento.archivo.open('rb') as archivo:
+            self.assertEqual(archivo.read(), b"reutilizado")
+
+    def test_recontar_referencias(self):
+        documento = self.documento("a.pdf", b"contenido")
+        Blob.objects.update(referencias=0)
+        self.assertEqual(recontar_referencias(), 1)
+        self.assertEqual(self.referencias(documento), 1)
+
+        salida = io.StringIO()
+        call_command('limpiar_blobs', '--recontar', '--gracia', '0', stdout=salida)
+        self.assertIn("Blobs borrados: 0", salida.getvalue())
+
+    def test_upload_pdf_registro_guarda_una_sola_copia(self):
+        admin = User.objects.create_user(username='admin', password='testpass')
+        admin.groups.add(Group.objects.create(name='Admin'))
+        empleado = User.objects.create_user(username='empleado', password='testpass')
+        worker = Worker.objects.create(user=empleado, created_by=admin)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(admin).access_token}')
+
+        for _ in range(2):
+            fichero = ContentFile(b"%PDF registro", name="jornada.pdf")
+            response = client.post(reverse('worker-pdf-upload', args=[worker.id]), {'file': fichero}, format='multipart')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(PDFRegistro.objects.count(), 2)
+        self.assertEqual(Blob.objects.get().referencias, 2)
+        self.assertIn("registro_jornada", response.data['file_url'])
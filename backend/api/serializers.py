@@ -4,6 +4,7 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth.password_validation import validate_password
 from rest_framework.validators import UniqueValidator
 from django.contrib.auth.models import Group
+from userinfo.tokens import añadir_claims
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(
@@ -44,8 +45,4 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
-        token['user_id'] = user.id
-        token['groups'] = [group.name for group in user.groups.all()]
-        token['first_name'] = user.first_name
-        token['last_name'] = user.last_name
-        return token
+        return añadir_claims(token, user)
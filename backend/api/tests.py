@@ -6,6 +6,12 @@ from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes
 from django.contrib.auth.tokens import default_token_generator
 from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from unittest import mock
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
 
 class UserTests(APITestCase):
     def setUp(self):
@@ -152,4 +158,54 @@ class UserTests(APITestCase):
         }
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertEqual(response.data['error'], 'Token inválido o expirado.')
\ No newline at end of file
+        self.assertEqual(response.data['error'], 'Token inválido o expirado.')
+
+class ClaimsJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(name='Fisioterapia')
+        self.user = User.objects.create_user(username='claims', password='Claimspass123!', first_name='Ana')
+        self.user.groups.add(self.group)
+
+        response = self.client.post(
+            reverse('token_obtain_pair'), {'username': 'claims', 'password': 'Claimspass123!'}, format='json'
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def consultas_get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [q['sql'] for q in ctx.captured_queries]
+
+    def test_lectura_sin_consultar_usuario_ni_grupos(self):
+        self.consultas_get('/pacientes/')  # calienta la caché de token_version
+
+        consultas = self.consultas_get('/pacientes/')
+        self.assertFalse([sql for sql in consultas if '"auth_user"' in sql or 'auth_user_groups' in sql])
+
+    def test_lectura_con_menos_consultas_que_jwt_authentication(self):
+        self.consultas_get('/pacientes/')
+        con_claims = self.consultas_get('/pacientes/')
+
+        with mock.patch.object(APIView, 'authentication_classes', [JWTAuthentication]):
+            self.consultas_get('/pacientes/')
+            sin_claims = self.consultas_get('/pacientes/')
+
+        # La versión del token sale de la caché, no de la base de datos: lo
+        # único que cambia es que ya no se cargan el usuario y sus grupos
+        consultas_usuario = [sql for sql in sin_claims if 'auth_user' in sql]
+        self.assertTrue(consultas_usuario)
+        self.assertEqual(len(con_claims), len(sin_claims) - len(consultas_usuario))
+
+    def test_cambio_de_grupos_invalida_los_claims(self):
+        self.consultas_get('/pacientes/')
+        self.user.groups.remove(self.group)
+
+        consultas = self.consultas_get('/pacientes/')
+        self.assertTrue([sql for sql in consultas if 'auth_user_groups' in sql])
+
+    def test_escritura_carga_el_usuario(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post('/pacientes/', {}, format='json')
+        self.assertTrue([q['sql'] for q in ctx.captured_queries if '"auth_user"' in q['sql']])
@@ -9,6 +9,7 @@ from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 from .serializers import CustomTokenObtainPairSerializer
+from userinfo.tokens import añadir_claims
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
@@ -37,10 +38,7 @@ def get_tokens_for_user(user):
     access = refresh.access_token  # Generar el token de acceso
 
     # Agregar información personalizada al token de acceso
-    access['user_id'] = user.id
-    access['groups'] = [group.name for group in user.groups.all()]
-    access['first_name'] = user.first_name
-    access['last_name'] = user.last_name
+    añadir_claims(access, user)
 
     # Debugging para verificar los valores añadidos
     print(f"Token de acceso generado para el usuario {user.username}: {access}")
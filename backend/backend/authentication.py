@@ -0,0 +1,56 @@
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from userinfo.tokens import get_token_version
+
+CLAIMS_USUARIO = ('groups', 'group_ids', 'first_name', 'last_name', 'token_version')
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication que, en las peticiones de solo lectura, construye el
+    usuario a partir de los claims del token en lugar de cargarlo de la base
+    de datos. Los grupos del token los usa RoleContext, así que la petición no
+    consulta ni auth_user ni auth_group.
+
+    Solo se confía en el token si su token_version coincide con la del
+    usuario (ver userinfo.tokens); si no, o si el token no trae los claims,
+    se sigue el camino normal.
+    """
+    def authenticate(self, request):
+        if request.method not in SAFE_METHODS:
+            return super().authenticate(request)
+
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_user_from_claims(validated_token)
+        if user is None:
+            user = self.get_user(validated_token)
+        return user, validated_token
+
+    def get_user_from_claims(self, validated_token):
+        if any(claim not in validated_token for claim in CLAIMS_USUARIO):
+            return None
+
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or get_token_version(user_id) != validated_token['token_version']:
+            return None
+
+        # El resto de campos quedan diferidos: si alguna vista los necesita se
+        # cargan de la base de datos al acceder a ellos
+        user = User.from_db(
+            DEFAULT_DB_ALIAS,
+            ['id', 'first_name', 'last_name', 'is_active'],
+            [user_id, validated_token['first_name'], validated_token['last_name'], True],
+        )
+        user.token_groups = list(zip(validated_token['group_ids'], validated_token['groups']))
+        return user
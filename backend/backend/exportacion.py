@@ -0,0 +1,79 @@
+import csv
+import json
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+FORMATOS = ('csv', 'ndjson')
+TAMAÑO_BLOQUE = 2000
+
+# Caracteres con los que Excel interpreta una celda como fórmula
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+class Eco:
+    """
+    "Fichero" que devuelve lo que se le escribe, para que csv.writer genere
+    las líneas de una en una en lugar de acumularlas.
+    """
+    def write(self, valor):
+        return valor
+
+
+def valor_exportable(valor):
+    if valor is None or isinstance(valor, (bool, int, float, str)):
+        return valor
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return str(valor)
+
+
+def celda_csv(valor):
+    valor = valor_exportable(valor)
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'true' if valor else 'false'
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def filas_csv(filas, campos, cabeceras):
+    writer = csv.writer(Eco())
+    # BOM para que Excel abra el fichero en UTF-8
+    yield '\ufeff' + writer.writerow(cabeceras)
+    for fila in filas:
+        yield writer.writerow([celda_csv(fila[campo]) for campo in campos])
+
+
+def filas_ndjson(filas, campos, cabeceras):
+    for fila in filas:
+        yield json.dumps(
+            {cabecera: valor_exportable(fila[campo]) for campo, cabecera in zip(campos, cabeceras)},
+            ensure_ascii=False,
+        ) + '\n'
+
+
+def respuesta_exportacion(queryset, columnas, nombre, formato='csv'):
+    """
+    Respuesta en streaming con las filas de 'queryset' en CSV o NDJSON.
+
+    'columnas' es una lista de (campo, cabecera): el campo es lo que se pide a
+    values() (admite lookups como 'grupo__name') y la cabecera el nombre de la
+    columna en el fichero. Las filas se leen con iterator() y se escriben
+    según llegan, sin instanciar modelos ni serializers, así que la memoria
+    no depende del tamaño de la exportación.
+    """
+    campos = [campo for campo, _ in columnas]
+    cabeceras = [cabecera for _, cabecera in columnas]
+    filas = queryset.values(*campos).iterator(chunk_size=TAMAÑO_BLOQUE)
+
+    if formato == 'ndjson':
+        contenido, content_type, extension = filas_ndjson(filas, campos, cabeceras), 'application/x-ndjson', 'ndjson'
+    else:
+        contenido, content_type, extension = filas_csv(filas, campos, cabeceras), 'text/csv; charset=utf-8', 'csv'
+
+    response = StreamingHttpResponse(contenido, content_type=content_type)
+    fecha = timezone.localdate().isoformat()
+    response['Content-Disposition'] = f'attachment; filename="{nombre}-{fecha}.{extension}"'
+    return response
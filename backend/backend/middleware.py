@@ -0,0 +1,16 @@
+from django.utils.functional import SimpleLazyObject
+from .roles import RoleContext
+
+
+class RoleContextMiddleware:
+    """
+    Deja en request.roles el RoleContext del usuario. Se evalúa de forma
+    perezosa porque con JWT el usuario lo autentica DRF dentro de la vista,
+    después de los middlewares.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.roles = SimpleLazyObject(lambda: RoleContext(request.user))
+        return self.get_response(request)
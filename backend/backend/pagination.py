@@ -0,0 +1,122 @@
+import base64
+import json
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPaginationMixin:
+    """
+    Añade a una PageNumberPagination un modo por cursor (keyset) opcional.
+
+    Si la petición trae ?cursor= (vacío para la primera página) la página se
+    obtiene con WHERE sobre los valores de la última fila vista en lugar de
+    OFFSET y no se ejecuta COUNT(*), así que cuesta lo mismo en la página 1
+    que en la 1000. Sin ?cursor= se pagina por número como siempre.
+
+    keyset_ordering son los campos (o anotaciones) del orden, con '-' para
+    descendente; el último tiene que ser único (normalmente 'id') para que el
+    orden sea total. Ninguno puede ser NULL: si hace falta se anota antes un
+    Coalesce. La respuesta tiene la forma {next, previous, results}.
+    """
+    keyset_ordering = ('-id',)
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size_keyset = self.get_page_size(request)
+        valores, atras = self.decode_cursor(request.query_params[self.cursor_query_param])
+
+        ordering = self.keyset_ordering
+        if atras:
+            ordering = [campo[1:] if campo.startswith('-') else f"-{campo}" for campo in ordering]
+
+        queryset = queryset.order_by(*ordering)
+        if valores is not None:
+            queryset = queryset.filter(self.filtro_posterior(ordering, valores))
+
+        filas = list(queryset[:self.page_size_keyset + 1])
+        hay_mas = len(filas) > self.page_size_keyset
+        filas = filas[:self.page_size_keyset]
+
+        if atras:
+            filas.reverse()
+            self.hay_siguiente = valores is not None
+            self.hay_anterior = hay_mas
+        else:
+            self.hay_siguiente = hay_mas
+            self.hay_anterior = valores is not None
+
+        self.filas = filas
+        return filas
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.hay_siguiente or not self.filas:
+            return None
+        return self.cursor_link(self.filas[-1], atras=False)
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if not self.hay_anterior or not self.filas:
+            return None
+        return self.cursor_link(self.filas[0], atras=True)
+
+    def cursor_link(self, fila, atras):
+        valores = [getattr(fila, campo.lstrip('-')) for campo in self.keyset_ordering]
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(valores, atras))
+
+    @staticmethod
+    def filtro_posterior(ordering, valores):
+        """
+        Filas que van después de 'valores' en el orden dado:
+        (a > x) OR (a = x AND b > y) OR ...
+        """
+        filtro = Q(pk__in=[])
+        iguales = Q()
+        for campo, valor in zip(ordering, valores):
+            nombre = campo.lstrip('-')
+            lookup = 'lt' if campo.startswith('-') else 'gt'
+            filtro |= iguales & Q(**{f"{nombre}__{lookup}": valor})
+            iguales &= Q(**{nombre: valor})
+        return filtro
+
+    @staticmethod
+    def encode_cursor(valores, atras):
+        # isoformat() completo: DjangoJSONEncoder recorta los microsegundos y
+        # el cursor dejaría de coincidir con la fila
+        datos = json.dumps(
+            {'v': valores, 'a': atras},
+            default=lambda valor: valor.isoformat() if hasattr(valor, 'isoformat') else str(valor),
+            separators=(',', ':'),
+        )
+        return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None, False
+        try:
+            datos = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            valores = datos['v']
+            if len(valores) != len(self.keyset_ordering):
+                raise ValueError
+            return valores, bool(datos.get('a'))
+        except (ValueError, TypeError, KeyError):
+            raise NotFound("Cursor inválido")
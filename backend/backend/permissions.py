@@ -1,18 +1,19 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
+from .roles import get_roles
 
 class IsAdmin(BasePermission):
     """
     Permiso para verificar si el usuario pertenece al grupo 'Admin'.
     """
     def has_permission(self, request, view):
-        return request.user.groups.filter(name="Admin").exists()
+        return get_roles(request).is_admin
 
 class IsWorker(BasePermission):
     """
     Permiso para verificar si el usuario pertenece al grupo 'Workers'.
     """
     def has_permission(self, request, view):
-        return request.user.groups.filter(name="Workers").exists()
+        return get_roles(request).has_group("Workers")
 
 
 class IsAdminOrReadOnlyForWorkers(BasePermission):
@@ -24,4 +25,4 @@ class IsAdminOrReadOnlyForWorkers(BasePermission):
             # GET, HEAD, OPTIONS permitidos para admins y workers
             return True
         # POST, PUT, DELETE solo para admins
-        return user.groups.filter(name="Admin").exists()
\ No newline at end of file
+        return get_roles(request).is_admin
\ No newline at end of file
@@ -0,0 +1,74 @@
+from django.contrib.auth.models import Group
+from django.utils.functional import cached_property
+
+ADMIN = "Admin"
+FISIOTERAPIA = "Fisioterapia"
+PSICOLOGIA = "Psicología"
+WORKER = "worker"
+
+
+class RoleContext:
+    """
+    Grupos del usuario resueltos con una sola consulta, la primera vez que se
+    necesitan, y reutilizados durante toda la petición.
+    """
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def grupos(self):
+        if not self.user or not self.user.is_authenticated:
+            return []
+        # ClaimsJWTAuthentication deja los grupos del token en el usuario
+        grupos = getattr(self.user, "token_groups", None)
+        if grupos is None:
+            grupos = self.user.groups.values_list("id", "name")
+        return [Group(id=group_id, name=name) for group_id, name in grupos]
+
+    @cached_property
+    def nombres(self):
+        return {grupo.name for grupo in self.grupos}
+
+    def has_group(self, name):
+        return name in self.nombres
+
+    @property
+    def is_admin(self):
+        return ADMIN in self.nombres
+
+    @property
+    def is_fisio(self):
+        return FISIOTERAPIA in self.nombres
+
+    @property
+    def is_psico(self):
+        return PSICOLOGIA in self.nombres
+
+    @property
+    def is_worker(self):
+        return WORKER in self.nombres
+
+    @cached_property
+    def tenant_groups(self):
+        """
+        Grupos de la clínica a los que pertenece el usuario (todos menos Admin);
+        son los que delimitan qué pacientes puede ver.
+        """
+        return [grupo for grupo in self.grupos if grupo.name != ADMIN]
+
+    @cached_property
+    def tenant_group_ids(self):
+        return [grupo.id for grupo in self.tenant_groups]
+
+
+def get_roles(request):
+    """
+    Devuelve el RoleContext de la petición. RoleContextMiddleware lo deja
+    preparado en request.roles; si la petición no ha pasado por el middleware
+    (p. ej. en tests de serializers) se crea y se guarda en ese momento.
+    """
+    roles = getattr(request, "roles", None)
+    if roles is None:
+        roles = RoleContext(request.user)
+        request.roles = roles
+    return roles
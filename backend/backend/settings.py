@@ -35,7 +35,7 @@ ALLOWED_HOSTS = ['*']
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'backend.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -53,6 +53,10 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
 }
 
+# Segundos que se cachea la versión de los tokens de cada usuario
+# (ver userinfo.tokens y backend.authentication.ClaimsJWTAuthentication)
+JWT_TOKEN_VERSION_CACHE_TIMEOUT = int(os.getenv('JWT_TOKEN_VERSION_CACHE_TIMEOUT', 60))
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -73,6 +77,7 @@ INSTALLED_APPS = [
     'formacion',
     'notes',
     'facturacion',
+    'almacenamiento',
 ]
 
 MIDDLEWARE = [
@@ -82,6 +87,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'backend.middleware.RoleContextMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware",  # Asegura servir estáticos en producción
@@ -115,6 +121,25 @@ DATABASES = {
     'default': dj_database_url.config(default=os.getenv("DATABASE_URL"))
 }
 
+# Caché compartida por todos los procesos de gunicorn: las invalidaciones
+# (versión de los tokens, userinfo.tokens, e índice del autocompletado de
+# pacientes) tienen que llegar a todos. Es Redis para que leerla no añada
+# consultas a la base de datos en cada petición. Sin REDIS_URL (desarrollo y
+# tests, con un solo proceso) se usa la caché en memoria.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -134,6 +159,20 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Horario laboral usado para calcular los huecos libres de los workers
+# (dias: 0 = lunes ... 6 = domingo)
+CITAS_HORARIO_LABORAL = {
+    'inicio': os.getenv('CITAS_HORA_INICIO', '09:00'),
+    'fin': os.getenv('CITAS_HORA_FIN', '21:00'),
+    'dias': [0, 1, 2, 3, 4],
+}
+
+# Recordatorios de WhatsApp (comando procesar_recordatorios)
+WHATSAPP_CLIENT = os.getenv('WHATSAPP_CLIENT', 'twilio.rest.Client')
+WHATSAPP_CONCURRENCIA = int(os.getenv('WHATSAPP_CONCURRENCIA', 8))
+WHATSAPP_MENSAJES_POR_SEGUNDO = float(os.getenv('WHATSAPP_MENSAJES_POR_SEGUNDO', 5))
+WHATSAPP_MAX_INTENTOS = int(os.getenv('WHATSAPP_MAX_INTENTOS', 5))
+
 # Envío email
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
@@ -166,6 +205,10 @@ DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Subidas por fragmentos de documentos de pacientes (patients/subidas.py)
+SUBIDAS_TAMAÑO_FRAGMENTO = int(os.getenv('SUBIDAS_TAMAÑO_FRAGMENTO', 5 * 1024 * 1024))
+SUBIDAS_TAMAÑO_MAXIMO = int(os.getenv('SUBIDAS_TAMAÑO_MAXIMO', 200 * 1024 * 1024))
+
 
 
 # Default primary key field type
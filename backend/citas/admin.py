@@ -1,4 +1,5 @@
 from django.contrib import admin
-from .models import Cita  # Asegúrate de importar tu modelo Factura
+from .models import Cita, SerieCita  # Asegúrate de importar tu modelo Factura
 
-admin.site.register(Cita)
\ No newline at end of file
+admin.site.register(Cita)
+admin.site.register(SerieCita)
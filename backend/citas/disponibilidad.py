@@ -0,0 +1,118 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from .models import Cita, SerieCita
+from .ocurrencias import ocurrencias, series_en_rango
+
+# Horario por defecto si no se define CITAS_HORARIO_LABORAL en settings
+HORARIO_LABORAL = {
+    'inicio': '09:00',
+    'fin': '21:00',
+    'dias': [0, 1, 2, 3, 4],  # lunes a viernes
+}
+
+
+def get_horario_laboral():
+    return {**HORARIO_LABORAL, **getattr(settings, 'CITAS_HORARIO_LABORAL', {})}
+
+
+def a_minutos(hora):
+    """
+    Convierte un time o una cadena 'HH:MM' en minutos desde medianoche.
+    """
+    if isinstance(hora, str):
+        horas, minutos = hora.split(':')[:2]
+        return int(horas) * 60 + int(minutos)
+    return hora.hour * 60 + hora.minute + (1 if hora.second or hora.microsecond else 0)
+
+
+def a_hora(minutos):
+    return f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+
+def fusionar_intervalos(intervalos):
+    """
+    Une los intervalos (inicio, fin) solapados o contiguos. La lista debe venir
+    ordenada por inicio, que es como la devuelve la consulta.
+    """
+    fusionados = []
+    for inicio, fin in intervalos:
+        if fusionados and inicio <= fusionados[-1][1]:
+            if fin > fusionados[-1][1]:
+                fusionados[-1][1] = fin
+        else:
+            fusionados.append([inicio, fin])
+    return fusionados
+
+
+def calcular_huecos(ocupados, inicio_jornada, fin_jornada, duracion):
+    """
+    Recorre los intervalos ocupados (ordenados y fusionados) y devuelve los
+    huecos libres dentro de la jornada en los que cabe una cita de 'duracion'.
+    """
+    huecos = []
+    cursor = inicio_jornada
+
+    for inicio, fin in ocupados:
+        if fin <= cursor:
+            continue
+        if inicio >= fin_jornada:
+            break
+        if inicio - cursor >= duracion:
+            huecos.append((cursor, inicio))
+        cursor = max(cursor, fin)
+
+    if fin_jornada - cursor >= duracion:
+        huecos.append((cursor, fin_jornada))
+    return huecos
+
+
+def calcular_disponibilidad(worker_ids, start, end, duracion, hora_inicio=None, hora_fin=None, dias=None):
+    """
+    Huecos libres por worker y día entre start y end (incluidos).
+
+    Hace una única consulta de citas para todos los workers, ordenada por
+    (worker, fecha, comenzar), de modo que cada día se resuelve con un
+    barrido lineal sobre sus intervalos ya ordenados. Las ocurrencias de las
+    series se añaden con otra consulta (dos si alguna tiene ocurrencias).
+
+    Devuelve {worker_id: {fecha: [(inicio, fin), ...]}} con horas 'HH:MM'.
+    """
+    horario = get_horario_laboral()
+    inicio_jornada = a_minutos(hora_inicio or horario['inicio'])
+    fin_jornada = a_minutos(hora_fin or horario['fin'])
+    dias_laborables = set(horario['dias'] if dias is None else dias)
+
+    ocupados = defaultdict(list)
+    citas = (
+        Cita.objects
+        .filter(worker_id__in=worker_ids, fecha__range=(start, end))
+        .order_by('worker_id', 'fecha', 'comenzar')
+        .values_list('worker_id', 'fecha', 'comenzar', 'finalizar')
+    )
+    for worker_id, fecha, comenzar, finalizar in citas:
+        ocupados[(worker_id, fecha)].append((a_minutos(comenzar), a_minutos(finalizar)))
+
+    # Las ocurrencias de las series que aún no son cita también ocupan la agenda
+    series = series_en_rango(SerieCita.objects.filter(worker_id__in=worker_ids), start, end)
+    for serie, fecha in ocurrencias(series, start, end):
+        intervalos = ocupados[(serie.worker_id, fecha)]
+        intervalos.append((a_minutos(serie.comenzar), a_minutos(serie.finalizar)))
+        intervalos.sort()
+
+    fechas = []
+    fecha = start
+    while fecha <= end:
+        if fecha.weekday() in dias_laborables:
+            fechas.append(fecha)
+        fecha += timedelta(days=1)
+
+    resultado = {}
+    for worker_id in worker_ids:
+        por_dia = {}
+        for fecha in fechas:
+            intervalos = fusionar_intervalos(ocupados.get((worker_id, fecha), []))
+            huecos = calcular_huecos(intervalos, inicio_jornada, fin_jornada, duracion)
+            por_dia[fecha.isoformat()] = [(a_hora(inicio), a_hora(fin)) for inicio, fin in huecos]
+        resultado[worker_id] = por_dia
+    return resultado
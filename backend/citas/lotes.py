@@ -0,0 +1,259 @@
+"""
+Operaciones en bloque sobre citas (crear, actualizar, mover y eliminar),
+pensadas para reorganizar un día entero en una sola petición.
+
+Todo el lote se valida antes de tocar nada: los pacientes de todas las
+operaciones se comprueban con una sola consulta, igual que las citas y los
+workers a los que se refieren. Si alguna operación no es válida no se aplica
+ninguna; si lo son todas se aplican en una transacción con bulk_create,
+bulk_update y un único delete. Las citas que quedan en el lote no pueden
+solaparse con otras del mismo worker y día (ver solapes.py).
+"""
+from functools import reduce
+from operator import or_
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from patients.models import Paciente
+from workers.models import Worker
+from .models import Cita
+from .solapes import bloquear_agendas, mensaje_solape, ocurrencias_en_agendas
+
+MAX_OPERACIONES_LOTE = 500
+
+CREAR = 'crear'
+ACTUALIZAR = 'actualizar'
+MOVER = 'mover'
+ELIMINAR = 'eliminar'
+OPERACIONES = (CREAR, ACTUALIZAR, MOVER, ELIMINAR)
+
+
+class ErrorLote(Exception):
+    pass
+
+
+class CitaLoteSerializer(serializers.ModelSerializer):
+    """
+    Datos de una cita dentro de un lote. paciente_id no se valida aquí (lo
+    hace LoteCitas para todo el lote de una vez).
+    """
+    paciente_id = serializers.IntegerField(allow_null=True, required=False)
+
+    class Meta:
+        model = Cita
+        fields = [
+            'paciente_id', 'fecha', 'comenzar', 'finalizar', 'descripcion',
+            'precio', 'cotizada', 'irpf', 'metodo_pago', 'pagado',
+        ]
+
+
+class MoverCitaSerializer(serializers.Serializer):
+    fecha = serializers.DateField()
+    comenzar = serializers.TimeField()
+    finalizar = serializers.TimeField()
+    worker = serializers.IntegerField(required=False)
+
+
+class LoteCitas:
+    """
+    Valida y aplica un lote de operaciones. `citas` son las citas visibles
+    para el usuario (get_citas_usuario) y `precio_global` se llama solo si el
+    lote crea citas sin precio.
+    """
+    def __init__(self, user, roles, citas, precio_global):
+        self.user = user
+        self.roles = roles
+        self.citas = citas
+        self.precio_global = precio_global
+        # Un serializer por tipo para todo el lote, como en la importación de pacientes
+        self.serializer_crear = CitaLoteSerializer()
+        self.serializer_actualizar = CitaLoteSerializer(partial=True)
+        self.serializer_mover = MoverCitaSerializer()
+        self.errores = []
+
+    def error(self, indice, errores):
+        self.errores.append({'indice': indice, 'errores': errores})
+
+    def leer(self, operaciones):
+        """
+        Valida el formato de cada operación y sus datos. Devuelve una lista de
+        (indice, op, id, datos) con los datos ya validados.
+        """
+        leidas = []
+        ids_vistos = set()
+        for indice, operacion in enumerate(operaciones):
+            if not isinstance(operacion, dict):
+                self.error(indice, {'op': ["Cada operación debe ser un objeto"]})
+                continue
+
+            op = operacion.get('op')
+            if op not in OPERACIONES:
+                self.error(indice, {'op': [f"Operación no válida; debe ser una de: {', '.join(OPERACIONES)}"]})
+                continue
+
+            cita_id = None
+            if op != CREAR:
+                cita_id = operacion.get('id')
+                if not isinstance(cita_id, int) or isinstance(cita_id, bool):
+                    self.error(indice, {'id': ["Se requiere el ID numérico de la cita"]})
+                    continue
+                if cita_id in ids_vistos:
+                    self.error(indice, {'id': ["La cita aparece en más de una operación del lote"]})
+                    continue
+                ids_vistos.add(cita_id)
+
+            datos = {}
+            if op != ELIMINAR:
+                serializer = {
+                    CREAR: self.serializer_crear,
+                    ACTUALIZAR: self.serializer_actualizar,
+                    MOVER: self.serializer_mover,
+                }[op]
+                try:
+                    datos = serializer.run_validation(operacion.get('datos', {}))
+                except ValidationError as e:
+                    self.error(indice, e.detail)
+                    continue
+
+            leidas.append((indice, op, cita_id, datos))
+        return leidas
+
+    def comprobar_referencias(self, leidas):
+        """
+        Comprueba pacientes, citas y workers de todo el lote con una consulta
+        por modelo y bloquea las citas afectadas hasta el final de la transacción.
+        """
+        paciente_ids = {datos['paciente_id'] for _, _, _, datos in leidas if datos.get('paciente_id')}
+        cita_ids = {cita_id for _, _, cita_id, _ in leidas if cita_id is not None}
+        worker_ids = {datos['worker'] for _, op, _, datos in leidas if op == MOVER and 'worker' in datos}
+
+        pacientes = set()
+        if paciente_ids:
+            pacientes = set(
+                Paciente.objects.filter(id__in=paciente_ids, grupo_id__in=self.roles.tenant_group_ids)
+                .values_list('id', flat=True)
+            )
+        citas = {}
+        if cita_ids:
+            citas = self.citas.filter(id__in=cita_ids).select_for_update(of=('self',)).in_bulk()
+        workers = {}
+        if worker_ids:
+            workers = Worker.visibles_para(self.user, self.roles).filter(id__in=worker_ids).in_bulk()
+
+        for indice, op, cita_id, datos in leidas:
+            errores = {}
+            if datos.get('paciente_id') and datos['paciente_id'] not in pacientes:
+                errores['paciente_id'] = ["El paciente no pertenece al mismo grupo que el usuario o no existe."]
+            if cita_id is not None and cita_id not in citas:
+                errores['id'] = ["La cita no existe o no tienes permiso para modificarla."]
+            if op == MOVER and 'worker' in datos and datos['worker'] not in workers:
+                errores['worker'] = ["El trabajador no existe o no tienes permiso para asignarle citas."]
+            if errores:
+                self.error(indice, errores)
+        return citas, workers
+
+    def comprobar_solapes(self, resultados):
+        """
+        Bloquea la agenda de cada worker y día afectados y comprueba que las
+        citas creadas o modificadas no pisan otras de ese worker, tanto
+        guardadas como del propio lote, ni ocurrencias de sus series. Las que
+        el lote modifica o elimina se comparan con su estado nuevo.
+        """
+        tocadas = [cita.pk for _, op, cita in resultados if op != CREAR]
+        tramos = [
+            (indice, cita) for indice, op, cita in resultados
+            if op != ELIMINAR and cita.worker_id and cita.finalizar > cita.comenzar
+        ]
+        if not tramos:
+            return
+
+        claves = {(cita.worker_id, cita.fecha) for _, cita in tramos}
+        bloquear_agendas(claves)
+        agenda = {}
+        guardadas = Cita.objects.filter(
+            reduce(or_, (Q(worker_id=worker_id, fecha=fecha) for worker_id, fecha in claves))
+        ).exclude(pk__in=tocadas).order_by('comenzar')
+        for cita in guardadas:
+            agenda.setdefault((cita.worker_id, cita.fecha), []).append(cita)
+        for serie, fecha in ocurrencias_en_agendas(claves):
+            agenda.setdefault((serie.worker_id, fecha), []).append(serie)
+
+        for indice, cita in tramos:
+            citas_dia = agenda.setdefault((cita.worker_id, cita.fecha), [])
+            solapada = next((
+                otra for otra in citas_dia if otra.comenzar < cita.finalizar and otra.finalizar > cita.comenzar
+            ), None)
+            if solapada:
+                self.error(indice, {'comenzar': [mensaje_solape(solapada)]})
+            citas_dia.append(cita)
+
+    def aplicar(self, operaciones):
+        if not isinstance(operaciones, list) or not operaciones:
+            raise ErrorLote("Se requiere una lista 'operaciones' con al menos una operación")
+        if len(operaciones) > MAX_OPERACIONES_LOTE:
+            raise ErrorLote(f"Un lote no puede tener más de {MAX_OPERACIONES_LOTE} operaciones")
+
+        leidas = self.leer(operaciones)
+        if self.errores:
+            return None
+
+        with transaction.atomic():
+            citas, workers = self.comprobar_referencias(leidas)
+            if self.errores:
+                return None
+
+            ahora = timezone.now()
+            crear = [datos for _, op, _, datos in leidas if op == CREAR]
+            worker_usuario = Worker.objects.filter(user=self.user).first() if crear else None
+            precio = self.precio_global() if any('precio' not in datos for datos in crear) else None
+
+            nuevas = []
+            modificadas = []
+            campos = set()
+            eliminadas = []
+            resultados = []
+            for indice, op, cita_id, datos in leidas:
+                if op == CREAR:
+                    cita = Cita(user=self.user, worker=worker_usuario, **{'precio': precio, **datos})
+                    nuevas.append(cita)
+                elif op == ELIMINAR:
+                    cita = citas[cita_id]
+                    eliminadas.append(cita_id)
+                else:
+                    cita = citas[cita_id]
+                    if 'worker' in datos:
+                        cita.worker = workers[datos.pop('worker')]
+                        campos.add('worker')
+                    for campo, valor in datos.items():
+                        setattr(cita, campo, valor)
+                        campos.add('paciente' if campo == 'paciente_id' else campo)
+                    # bulk_update no aplica auto_now; la sincronización depende de updated_at
+                    cita.updated_at = ahora
+                    modificadas.append(cita)
+                resultados.append((indice, op, cita))
+
+            self.comprobar_solapes(resultados)
+            if self.errores:
+                return None
+
+            if nuevas:
+                Cita.objects.bulk_create(nuevas)
+            if modificadas:
+                Cita.objects.bulk_update(modificadas, [*campos, 'updated_at'])
+            if eliminadas:
+                # delete() del queryset envía post_delete por cita: se registran las marcas de borrado
+                Cita.objects.filter(id__in=eliminadas).delete()
+
+        return [{'indice': indice, 'op': op, 'id': cita.pk} for indice, op, cita in resultados]
+
+
+def aplicar_lote(operaciones, user, roles, citas, precio_global):
+    """
+    Aplica el lote y devuelve (resultados, errores): los resultados por
+    operación si todo el lote es válido, o los errores por índice si no.
+    """
+    lote = LoteCitas(user, roles, citas, precio_global)
+    resultados = lote.aplicar(operaciones)
+    return resultados, lote.errores
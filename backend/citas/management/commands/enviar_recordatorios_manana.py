@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from citas.models import Cita, RecordatorioEnvio
+from citas.recordatorios import enviar_recordatorios
+from citas.whatsapp import texto_recordatorio
+from userinfo.models import UserInfo
+
+
+class Command(BaseCommand):
+    help = (
+        "Envía por WhatsApp el recordatorio de las citas de mañana de cada cuenta de Twilio. "
+        "Se puede lanzar varias veces: las citas ya avisadas se saltan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help="Fecha de las citas (YYYY-MM-DD); por defecto mañana")
+        parser.add_argument('--lote', type=int, default=200, help="Citas leídas y enviadas por lote")
+
+    def handle(self, *args, **options):
+        if options['fecha']:
+            try:
+                fecha = datetime.strptime(options['fecha'], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("La fecha debe tener formato YYYY-MM-DD")
+        else:
+            fecha = timezone.localdate() + timedelta(days=1)
+
+        cuentas = (
+            UserInfo.objects
+            .exclude(twilio_account_sid__isnull=True).exclude(twilio_account_sid='')
+            .exclude(twilio_auth_token__isnull=True).exclude(twilio_auth_token='')
+            .exclude(whatsapp_business_number__isnull=True).exclude(whatsapp_business_number='')
+            .values_list('user_id', flat=True)
+        )
+
+        # Marca de enviado: cualquier recordatorio que no haya acabado en error
+        avisada = RecordatorioEnvio.objects.filter(cita=OuterRef('pk')).exclude(estado=RecordatorioEnvio.ERROR)
+
+        total = 0
+        for user_id in list(cuentas):
+            pendientes = (
+                Cita.objects
+                .filter(user_id=user_id, fecha=fecha, paciente__eliminado_en__isnull=True)
+                .exclude(paciente__phone__isnull=True).exclude(paciente__phone='')
+                .filter(~Exists(avisada))
+            )
+            # Las citas vistas en esta ejecución no se vuelven a leer aunque su envío acabe en error
+            vistas = set()
+            while True:
+                ids, lote = self.reservar(pendientes.exclude(id__in=vistas), avisada, user_id, options['lote'])
+                if not ids:
+                    break
+                vistas.update(ids)
+                if lote:
+                    enviar_recordatorios(lote)
+                    total += len(lote)
+        self.stdout.write(self.style.SUCCESS(f"Recordatorios enviados para el {fecha}: {total}"))
+
+    def reservar(self, pendientes, avisada, user_id, tamaño):
+        """
+        Guarda la marca de enviado de un lote de citas antes de enviarlo, para
+        que otra ejecución simultánea del comando no repita el aviso. Las citas
+        se bloquean saltando las que ya tiene otra ejecución, como en
+        reservar_pendientes, y se vuelven a comprobar con el bloqueo tomado.
+        """
+        with transaction.atomic():
+            ids = list(
+                pendientes.select_for_update(skip_locked=True, of=('self',))
+                .order_by('comenzar', 'id').values_list('id', flat=True)[:tamaño]
+            )
+            if not ids:
+                return [], []
+            citas = (
+                Cita.objects.filter(id__in=ids).filter(~Exists(avisada))
+                .select_related('paciente', 'paciente__grupo').order_by('comenzar', 'id')
+            )
+            return ids, RecordatorioEnvio.objects.bulk_create([
+                RecordatorioEnvio(
+                    cita=cita,
+                    user_id=user_id,
+                    telefono=cita.paciente.phone,
+                    mensaje=texto_recordatorio(cita),
+                    estado=RecordatorioEnvio.ENVIANDO,
+                )
+                for cita in citas
+            ])
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from citas.sincronizacion import TAMAÑO_LOTE, limpiar_citas_eliminadas
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra las marcas de citas eliminadas más antiguas que SYNC_RETENCION_ELIMINADAS; "
+        "la sincronización ya no acepta cursores de esa época."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMAÑO_LOTE, help="Marcas borradas por transacción")
+
+    def handle(self, *args, **options):
+        total = limpiar_citas_eliminadas(options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"Marcas de citas eliminadas borradas: {total}"))
@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from citas.recordatorios import procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = "Envía los recordatorios de WhatsApp encolados. Con --once procesa lo pendiente y termina (para cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Procesar la cola una vez y salir")
+        parser.add_argument('--lote', type=int, default=100, help="Recordatorios reservados por iteración")
+        parser.add_argument('--intervalo', type=float, default=5, help="Segundos de espera cuando la cola está vacía")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            procesados = procesar_pendientes(limite=options['lote'])
+            total += procesados
+
+            if procesados:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['intervalo'])
+
+        self.stdout.write(self.style.SUCCESS(f"Recordatorios procesados: {total}"))
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0018_delete_citas'),
+        ('patients', '0015_alter_paciente_patologias'),
+        ('workers', '0018_pdfregistro_created_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['fecha', 'comenzar'], name='cita_fecha_comenzar_idx'),
+        ),
+    ]
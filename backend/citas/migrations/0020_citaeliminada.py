@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0019_cita_fecha_comenzar_idx'),
+        ('patients', '0015_alter_paciente_patologias'),
+        ('workers', '0018_pdfregistro_created_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CitaEliminada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cita_id', models.BigIntegerField()),
+                ('usuario_id', models.BigIntegerField(null=True)),
+                ('worker_id', models.BigIntegerField(null=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['updated_at'], name='cita_updated_at_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0020_citaeliminada'),
+        ('patients', '0015_alter_paciente_patologias'),
+        ('workers', '0018_pdfregistro_created_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['user', 'fecha', 'comenzar'], name='cita_user_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['worker', 'fecha', 'comenzar'], name='cita_worker_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['worker', 'user', 'fecha'], name='cita_worker_user_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['paciente', '-fecha', '-comenzar'], name='cita_paciente_fecha_idx'),
+        ),
+    ]
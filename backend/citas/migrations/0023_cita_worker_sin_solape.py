@@ -0,0 +1,48 @@
+from django.db import migrations
+
+
+def crear_restriccion_solape(apps, schema_editor):
+    # La restricción de exclusión solo existe en PostgreSQL; en el resto de
+    # bases de datos el solape lo evita la comprobación de citas/solapes.py
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT a.id, b.id FROM citas_cita a JOIN citas_cita b"
+            " ON a.worker_id = b.worker_id AND a.fecha = b.fecha AND a.id < b.id"
+            " AND a.comenzar < b.finalizar AND b.comenzar < a.finalizar"
+            " AND a.comenzar < a.finalizar AND b.comenzar < b.finalizar"
+            " ORDER BY a.id, b.id"
+        )
+        solapes = cursor.fetchall()
+    if solapes:
+        # La restricción no se puede crear sobre datos que ya se solapan: hay
+        # que mover o borrar esas citas y volver a lanzar la migración
+        parejas = ", ".join(f"{a}-{b}" for a, b in solapes)
+        raise RuntimeError(
+            f"No se puede crear cita_worker_sin_solape: hay {len(solapes)} parejas de citas "
+            f"solapadas del mismo worker (ids {parejas}). Corrígelas y vuelve a migrar."
+        )
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    schema_editor.execute(
+        "ALTER TABLE citas_cita ADD CONSTRAINT cita_worker_sin_solape "
+        "EXCLUDE USING gist (worker_id WITH =, tsrange(fecha + comenzar, fecha + finalizar) WITH &&) "
+        "WHERE (worker_id IS NOT NULL AND comenzar < finalizar)"
+    )
+
+
+def borrar_restriccion_solape(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("ALTER TABLE citas_cita DROP CONSTRAINT IF EXISTS cita_worker_sin_solape")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0022_recordatorioenvio'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_restriccion_solape, borrar_restriccion_solape),
+    ]
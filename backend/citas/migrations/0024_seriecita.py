@@ -0,0 +1,56 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0023_cita_worker_sin_solape'),
+        ('patients', '0022_paciente_updated_at'),
+        ('workers', '0019_alter_pdfregistro_file'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerieCita',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_inicio', models.DateField()),
+                ('fecha_fin', models.DateField(blank=True, null=True)),
+                ('intervalo_semanas', models.PositiveSmallIntegerField(default=1)),
+                ('dias_semana', models.JSONField(default=list)),
+                ('excepciones', models.JSONField(blank=True, default=list)),
+                ('comenzar', models.TimeField()),
+                ('finalizar', models.TimeField()),
+                ('descripcion', models.TextField(blank=True, null=True)),
+                ('precio', models.DecimalField(decimal_places=2, default=25, max_digits=10)),
+                ('cotizada', models.BooleanField(default=False)),
+                ('irpf', models.BooleanField(default=False)),
+                ('metodo_pago', models.CharField(choices=[('efectivo', 'Efectivo'), ('bizum', 'Bizum'), ('tarjeta', 'Tarjeta'), ('transferencia', 'Transferencia')], default='efectivo', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series_citas', to='patients.paciente')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('worker', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='series_citas', to='workers.worker')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['worker', 'fecha_inicio', 'fecha_fin'], name='serie_worker_fechas_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='cita',
+            name='serie',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='citas', to='citas.seriecita'),
+        ),
+        migrations.AddField(
+            model_name='cita',
+            name='fecha_serie',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='cita',
+            constraint=models.UniqueConstraint(fields=('serie', 'fecha_serie'), name='cita_serie_fecha_unica'),
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from patients.models import Paciente
 from workers.models import Worker
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 METODOS_PAGO = [
     ('efectivo', 'Efectivo'),
@@ -10,6 +11,45 @@ METODOS_PAGO = [
     ('transferencia', 'Transferencia'),
 ]
 
+class SerieCita(models.Model):
+    """
+    Cita que se repite cada `intervalo_semanas` semanas en los `dias_semana`
+    indicados (0 = lunes), desde fecha_inicio hasta fecha_fin (o sin fin).
+
+    Las ocurrencias no se guardan: se calculan para el rango que se consulta
+    (ver citas/ocurrencias.py). Solo cuando una ocurrencia se modifica, se cobra o
+    se factura se crea la Cita correspondiente, enlazada con `serie` y
+    `fecha_serie`, que sustituye a la ocurrencia. Las fechas de `excepciones`
+    son ocurrencias anuladas.
+    """
+    paciente = models.ForeignKey(Paciente, related_name='series_citas', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
+    worker = models.ForeignKey(Worker, on_delete=models.CASCADE, related_name='series_citas', null=True, blank=True)
+    fecha_inicio = models.DateField()
+    fecha_fin = models.DateField(null=True, blank=True)
+    intervalo_semanas = models.PositiveSmallIntegerField(default=1)
+    dias_semana = models.JSONField(default=list)
+    excepciones = models.JSONField(default=list, blank=True)
+    comenzar = models.TimeField()
+    finalizar = models.TimeField()
+    descripcion = models.TextField(blank=True, null=True)
+    precio = models.DecimalField(max_digits=10, decimal_places=2, default=25)
+    cotizada = models.BooleanField(default=False)
+    irpf = models.BooleanField(default=False)
+    metodo_pago = models.CharField(max_length=20, choices=METODOS_PAGO, default='efectivo')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Series de un worker activas en un rango (fecha_fin nula = sin fin)
+            models.Index(fields=['worker', 'fecha_inicio', 'fecha_fin'], name='serie_worker_fechas_idx'),
+        ]
+
+    def __str__(self):
+        return f"Serie de {self.paciente} desde el {self.fecha_inicio} a las {self.comenzar}"
+
+
 class Cita(models.Model):
     paciente = models.ForeignKey(Paciente, related_name='citas_pacientes', on_delete=models.CASCADE, null=True, blank=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
@@ -25,7 +65,27 @@ class Cita(models.Model):
     pagado = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Ocurrencia de una serie que se ha convertido en cita (ver SerieCita)
+    serie = models.ForeignKey(SerieCita, on_delete=models.SET_NULL, related_name='citas', null=True, blank=True)
+    fecha_serie = models.DateField(null=True, blank=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['serie', 'fecha_serie'], name='cita_serie_fecha_unica'),
+        ]
+        indexes = [
+            # Rango de fechas del calendario (semana/mes)
+            models.Index(fields=['fecha', 'comenzar'], name='cita_fecha_comenzar_idx'),
+            # Citas creadas por el usuario / asignadas a su worker en un rango
+            models.Index(fields=['user', 'fecha', 'comenzar'], name='cita_user_fecha_idx'),
+            models.Index(fields=['worker', 'fecha', 'comenzar'], name='cita_worker_fecha_idx'),
+            # Citas de un worker creadas por quien lo dio de alta, ordenadas por fecha
+            models.Index(fields=['worker', 'user', 'fecha'], name='cita_worker_user_fecha_idx'),
+            # Historial de un paciente, de la más reciente a la más antigua
+            models.Index(fields=['paciente', '-fecha', '-comenzar'], name='cita_paciente_fecha_idx'),
+            # Sincronización incremental de la agenda
+            models.Index(fields=['updated_at'], name='cita_updated_at_idx'),
+        ]
 
     def __str__(self):
         if self.paciente:
@@ -33,6 +93,59 @@ class Cita(models.Model):
         return f"Cita sin paciente el {self.fecha} a las {self.comenzar}"
 
 
+class CitaEliminada(models.Model):
+    """
+    Marca de borrado de una cita, para que la sincronización incremental de la
+    agenda pueda avisar a los clientes. Se guardan los IDs sin claves foráneas
+    porque el usuario o el worker pueden estar borrándose en la misma cascada.
+    """
+    cita_id = models.BigIntegerField()
+    usuario_id = models.BigIntegerField(null=True)
+    worker_id = models.BigIntegerField(null=True)
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Cita {self.cita_id} eliminada el {self.deleted_at}"
+
+
+class RecordatorioEnvio(models.Model):
+    """
+    Recordatorio de WhatsApp encolado para una cita. Lo envía en segundo plano
+    el comando procesar_recordatorios y la interfaz consulta su estado.
+    """
+    PENDIENTE = 'pendiente'
+    ENVIANDO = 'enviando'
+    ENVIADO = 'enviado'
+    ERROR = 'error'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (ENVIANDO, 'Enviando'),
+        (ENVIADO, 'Enviado'),
+        (ERROR, 'Error'),
+    ]
+
+    cita = models.ForeignKey(Cita, on_delete=models.CASCADE, related_name='recordatorios')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recordatorios')
+    telefono = models.CharField(max_length=15)
+    mensaje = models.TextField()
+    estado = models.CharField(max_length=10, choices=ESTADOS, default=PENDIENTE)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    message_sid = models.CharField(max_length=64, blank=True, null=True)
+    twilio_status = models.CharField(max_length=20, blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento'], name='recordatorio_cola_idx'),
+        ]
+
+    def __str__(self):
+        return f"Recordatorio de la cita {self.cita_id} ({self.estado})"
+
+
 class ConfiguracionPrecioCita(models.Model):
     precio_global = models.DecimalField(max_digits=10, decimal_places=2, default=25)
 
@@ -0,0 +1,62 @@
+"""
+Ocurrencias de las series de citas (SerieCita) en un rango de fechas.
+
+Las ocurrencias se calculan al vuelo para el rango que se consulta, así que
+una serie sin fin no ocupa filas en citas_cita. Las usan el calendario, la
+disponibilidad y la comprobación de solapes (solapes.py).
+"""
+from datetime import timedelta
+from django.db.models import Q
+from .models import Cita
+
+
+def fechas_serie(serie, start, end):
+    """
+    Fechas de las ocurrencias de la serie entre start y end (incluidos), sin
+    las anuladas. Sin dias_semana se repite el día de la semana de fecha_inicio.
+    """
+    desde = max(start, serie.fecha_inicio)
+    hasta = min(end, serie.fecha_fin) if serie.fecha_fin else end
+    dias = set(serie.dias_semana or [serie.fecha_inicio.weekday()])
+    excepciones = set(serie.excepciones or [])
+    intervalo = max(serie.intervalo_semanas, 1)
+    # Las semanas se cuentan de lunes a domingo desde la de fecha_inicio
+    primer_lunes = serie.fecha_inicio - timedelta(days=serie.fecha_inicio.weekday())
+
+    fecha = desde
+    while fecha <= hasta:
+        semana = (fecha - primer_lunes).days // 7
+        if fecha.weekday() in dias and semana % intervalo == 0 and fecha.isoformat() not in excepciones:
+            yield fecha
+        fecha += timedelta(days=1)
+
+
+def es_ocurrencia(serie, fecha):
+    return next(fechas_serie(serie, fecha, fecha), None) is not None
+
+
+def series_en_rango(queryset, start, end):
+    return queryset.filter(fecha_inicio__lte=end).filter(Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=start))
+
+
+def ocurrencias(series, start, end):
+    """
+    Ocurrencias (serie, fecha) de las series entre start y end que aún no se
+    han convertido en cita, ordenadas por fecha y hora. Las ya materializadas
+    se descartan con una sola consulta, porque la cita aparece por su cuenta.
+    """
+    series = list(series)
+    if not series:
+        return []
+    materializadas = set(
+        Cita.objects.filter(serie__in=series, fecha_serie__range=(start, end)).values_list('serie_id', 'fecha_serie')
+    )
+    return sorted(
+        (
+            (serie, fecha)
+            for serie in series
+            for fecha in fechas_serie(serie, start, end)
+            if (serie.id, fecha) not in materializadas
+        ),
+        key=lambda ocurrencia: (ocurrencia[1], ocurrencia[0].comenzar, ocurrencia[0].id),
+    )
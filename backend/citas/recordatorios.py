@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from userinfo.models import UserInfo
+from .models import RecordatorioEnvio
+from .whatsapp import enviar_mensaje_whatsapp, get_whatsapp_client
+
+logger = logging.getLogger(__name__)
+
+# Un recordatorio que lleva más de este tiempo "enviando" se considera
+# abandonado (el proceso murió) y se vuelve a procesar
+TIMEOUT_ENVIANDO = timedelta(minutes=10)
+
+
+def get_config():
+    return {
+        'concurrencia': getattr(settings, 'WHATSAPP_CONCURRENCIA', 8),
+        'por_segundo': getattr(settings, 'WHATSAPP_MENSAJES_POR_SEGUNDO', 5),
+        'max_intentos': getattr(settings, 'WHATSAPP_MAX_INTENTOS', 5),
+    }
+
+
+class LimitadorTasa:
+    """
+    Limita los envíos de una cuenta de Twilio a 'por_segundo' mensajes,
+    repartidos de forma uniforme entre todos los hilos que la usan.
+    """
+    def __init__(self, por_segundo):
+        self.intervalo = 1 / por_segundo
+        self.siguiente = 0
+        self.lock = threading.Lock()
+
+    def esperar(self):
+        with self.lock:
+            ahora = time.monotonic()
+            espera = max(0, self.siguiente - ahora)
+            self.siguiente = max(ahora, self.siguiente) + self.intervalo
+        if espera:
+            time.sleep(espera)
+
+
+def reservar_pendientes(limite):
+    """
+    Marca como 'enviando' hasta 'limite' recordatorios listos para enviar y los
+    devuelve. En PostgreSQL varios procesos pueden trabajar a la vez gracias a
+    SKIP LOCKED.
+    """
+    ahora = timezone.now()
+    listos = (
+        Q(estado=RecordatorioEnvio.PENDIENTE, proximo_intento__lte=ahora) |
+        Q(estado=RecordatorioEnvio.ENVIANDO, updated_at__lt=ahora - TIMEOUT_ENVIANDO)
+    )
+
+    with transaction.atomic():
+        ids = list(
+            RecordatorioEnvio.objects
+            .select_for_update(skip_locked=True)
+            .filter(listos)
+            .order_by('proximo_intento')
+            .values_list('id', flat=True)[:limite]
+        )
+        RecordatorioEnvio.objects.filter(id__in=ids).update(estado=RecordatorioEnvio.ENVIANDO, updated_at=ahora)
+
+    return list(RecordatorioEnvio.objects.filter(id__in=ids).order_by('proximo_intento'))
+
+
+def registrar_resultado(recordatorio, resultado, max_intentos):
+    recordatorio.intentos += 1
+
+    if "error" not in resultado:
+        recordatorio.estado = RecordatorioEnvio.ENVIADO
+        recordatorio.message_sid = resultado.get("sid")
+        recordatorio.twilio_status = resultado.get("status")
+        recordatorio.error = None
+    elif resultado.get("transitorio") and recordatorio.intentos < max_intentos:
+        # Espera exponencial: 30 s, 1 min, 2 min, 4 min...
+        recordatorio.estado = RecordatorioEnvio.PENDIENTE
+        recordatorio.proximo_intento = timezone.now() + timedelta(seconds=30 * 2 ** (recordatorio.intentos - 1))
+        recordatorio.error = resultado["error"]
+    else:
+        recordatorio.estado = RecordatorioEnvio.ERROR
+        recordatorio.error = resultado["error"]
+
+    recordatorio.save(update_fields=[
+        'estado', 'intentos', 'proximo_intento', 'message_sid', 'twilio_status', 'error', 'updated_at',
+    ])
+
+
+def enviar_recordatorios(recordatorios):
+    """
+    Envía los recordatorios (ya marcados como 'enviando') y guarda el
+    resultado de cada uno. Los mensajes salen en paralelo
+    (WHATSAPP_CONCURRENCIA hilos) respetando WHATSAPP_MENSAJES_POR_SEGUNDO por
+    cuenta de Twilio; los hilos solo hablan con Twilio y los resultados se
+    guardan desde este hilo.
+    """
+    config = get_config()
+    cuentas = {
+        info.user_id: info
+        for info in UserInfo.objects.filter(user_id__in={r.user_id for r in recordatorios})
+    }
+    clientes = {}
+    limitadores = {}
+
+    def enviar(recordatorio):
+        info = cuentas[recordatorio.user_id]
+        limitadores[info.user_id].esperar()
+        return enviar_mensaje_whatsapp(
+            clientes[info.user_id], info.whatsapp_business_number, recordatorio.telefono, recordatorio.mensaje
+        )
+
+    a_enviar = []
+    for recordatorio in recordatorios:
+        info = cuentas.get(recordatorio.user_id)
+        if not info or not all([info.twilio_account_sid, info.twilio_auth_token, info.whatsapp_business_number]):
+            registrar_resultado(recordatorio, {"error": "Faltan credenciales de Twilio"}, config['max_intentos'])
+            continue
+        if info.user_id not in clientes:
+            clientes[info.user_id] = get_whatsapp_client(info.twilio_account_sid, info.twilio_auth_token)
+            limitadores[info.user_id] = LimitadorTasa(config['por_segundo'])
+        a_enviar.append(recordatorio)
+
+    with ThreadPoolExecutor(max_workers=config['concurrencia']) as executor:
+        for recordatorio, resultado in zip(a_enviar, executor.map(enviar, a_enviar)):
+            registrar_resultado(recordatorio, resultado, config['max_intentos'])
+            if "error" in resultado:
+                logger.warning("Error enviando el recordatorio %s: %s", recordatorio.id, resultado["error"])
+
+
+def procesar_pendientes(limite=100):
+    """
+    Envía un lote de recordatorios pendientes de la cola y devuelve cuántos se
+    han procesado.
+    """
+    recordatorios = reservar_pendientes(limite)
+    if recordatorios:
+        enviar_recordatorios(recordatorios)
+    return len(recordatorios)
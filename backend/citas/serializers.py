@@ -1,7 +1,13 @@
+from copy import copy
 from rest_framework import serializers
-from .models import Cita, ConfiguracionPrecioCita
+from django.db import transaction
+from django.db.models import Case, CharField, F, Value, When
+from django.db.models.functions import Concat
+from .models import Cita, ConfiguracionPrecioCita, RecordatorioEnvio, SerieCita
 from patients.models import Paciente
-from django.contrib.auth.models import Group
+from workers.models import Worker
+from backend.roles import get_roles
+from .solapes import comprobar_solape, comprobar_solape_serie
 
 class CitaSerializer(serializers.ModelSerializer):
     paciente_id = serializers.IntegerField(write_only=True)
@@ -11,22 +17,21 @@ class CitaSerializer(serializers.ModelSerializer):
     class Meta:
         model = Cita
         fields = '__all__'
+        read_only_fields = ['serie', 'fecha_serie']
 
     def get_paciente_nombre(self, obj):
         # Obtener el nombre completo del paciente
         return f"{obj.paciente.nombre} {obj.paciente.primer_apellido} {obj.paciente.segundo_apellido}"
 
     def validate_paciente_id(self, value):
-        request = self.context['request']
-        user = request.user
-        user_groups = user.groups.exclude(name='Admin')
+        user_group_ids = get_roles(self.context['request']).tenant_group_ids
 
-        if not user_groups.exists():
+        if not user_group_ids:
             raise serializers.ValidationError("El usuario no pertenece a ningún grupo válido.")
 
         # Comprobar que el paciente existe y está en alguno de los grupos del usuario
         try:
-            paciente = Paciente.objects.get(id=value, grupo__in=user_groups)
+            paciente = Paciente.objects.get(id=value, grupo_id__in=user_group_ids)
         except Paciente.DoesNotExist:
             raise serializers.ValidationError("El paciente no pertenece al mismo grupo que el usuario o no existe.")
 
@@ -39,20 +44,36 @@ class CitaSerializer(serializers.ModelSerializer):
         if not paciente:
             # En caso que no venga del validate_paciente_id (por si acaso)
             paciente_id = validated_data.pop('paciente_id')
-            user_groups = self.context['request'].user.groups.exclude(name='Admin')
-            paciente = Paciente.objects.get(id=paciente_id, grupo__in=user_groups)
+            user_group_ids = get_roles(self.context['request']).tenant_group_ids
+            paciente = Paciente.objects.get(id=paciente_id, grupo_id__in=user_group_ids)
 
         validated_data['paciente'] = paciente
         validated_data.pop('paciente_id', None)
-        return super().create(validated_data)
+        # El bloqueo de la agenda del worker se mantiene hasta guardar la cita
+        with transaction.atomic():
+            worker = validated_data.get('worker')
+            comprobar_solape(
+                worker.id if worker else None,
+                validated_data['fecha'], validated_data['comenzar'], validated_data['finalizar'],
+            )
+            return super().create(validated_data)
 
     def update(self, instance, validated_data):
         paciente_id = validated_data.pop('paciente_id', None)
         if paciente_id:
-            user_groups = self.context['request'].user.groups.exclude(name='Admin')
-            paciente = Paciente.objects.get(id=paciente_id, grupo__in=user_groups)
+            user_group_ids = get_roles(self.context['request']).tenant_group_ids
+            paciente = Paciente.objects.get(id=paciente_id, grupo_id__in=user_group_ids)
             validated_data['paciente'] = paciente
-        return super().update(instance, validated_data)
+        with transaction.atomic():
+            worker = validated_data.get('worker', instance.worker)
+            comprobar_solape(
+                worker.id if worker else None,
+                validated_data.get('fecha', instance.fecha),
+                validated_data.get('comenzar', instance.comenzar),
+                validated_data.get('finalizar', instance.finalizar),
+                excluir=[instance.pk],
+            )
+            return super().update(instance, validated_data)
 
     def get_paciente_phone(self, obj):
         # Aquí devolvemos el teléfono del paciente asociado
@@ -62,6 +83,121 @@ class CitaSerializer(serializers.ModelSerializer):
         return None
 
 
+CAMPOS_LECTURA = (
+    'id', 'fecha', 'comenzar', 'finalizar', 'descripcion', 'precio', 'cotizada', 'irpf',
+    'metodo_pago', 'pagado', 'created_at', 'updated_at', 'fecha_serie', 'paciente', 'user', 'worker', 'serie',
+)
+
+
+def citas_para_lectura(queryset):
+    """
+    Filas (values()) de las citas con el nombre y el teléfono del paciente ya
+    resueltos en la base de datos, para CitaLecturaSerializer. Evita cargar el
+    paciente de cada cita por separado.
+    """
+    return queryset.annotate(
+        paciente_nombre=Case(
+            When(paciente__isnull=True, then=None),
+            default=Concat(
+                'paciente__nombre', Value(' '), 'paciente__primer_apellido', Value(' '), 'paciente__segundo_apellido',
+            ),
+            output_field=CharField(),
+        ),
+        paciente_phone=F('paciente__phone'),
+    ).values(*CAMPOS_LECTURA, 'paciente_nombre', 'paciente_phone')
+
+
+class CitaLecturaSerializer(serializers.Serializer):
+    """
+    Misma representación que CitaSerializer, solo de lectura, sobre las filas
+    de citas_para_lectura. La usan los listados de citas.
+    """
+    id = serializers.IntegerField()
+    fecha = serializers.DateField()
+    comenzar = serializers.TimeField()
+    finalizar = serializers.TimeField()
+    descripcion = serializers.CharField(allow_null=True)
+    precio = serializers.DecimalField(max_digits=10, decimal_places=2)
+    cotizada = serializers.BooleanField()
+    irpf = serializers.BooleanField()
+    metodo_pago = serializers.CharField()
+    pagado = serializers.BooleanField()
+    created_at = serializers.DateTimeField()
+    updated_at = serializers.DateTimeField()
+    paciente = serializers.IntegerField(allow_null=True)
+    user = serializers.IntegerField(allow_null=True)
+    worker = serializers.IntegerField(allow_null=True)
+    serie = serializers.IntegerField(allow_null=True)
+    fecha_serie = serializers.DateField(allow_null=True)
+    paciente_phone = serializers.CharField(allow_null=True)
+    paciente_nombre = serializers.CharField(allow_null=True)
+
+
+class SerieCitaSerializer(serializers.ModelSerializer):
+    paciente_id = serializers.IntegerField()
+    paciente_nombre = serializers.CharField(source='paciente', read_only=True)
+    worker_id = serializers.IntegerField(required=False, allow_null=True)
+    dias_semana = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=6), required=False, max_length=7,
+    )
+    intervalo_semanas = serializers.IntegerField(min_value=1, max_value=52, required=False)
+
+    class Meta:
+        model = SerieCita
+        fields = [
+            'id', 'paciente_id', 'paciente_nombre', 'worker_id', 'user', 'fecha_inicio', 'fecha_fin',
+            'intervalo_semanas', 'dias_semana', 'excepciones', 'comenzar', 'finalizar',
+            'descripcion', 'precio', 'cotizada', 'irpf', 'metodo_pago', 'created_at', 'updated_at',
+        ]
+        read_only_fields = ['id', 'user', 'excepciones', 'created_at', 'updated_at']
+
+    def validate_paciente_id(self, value):
+        user_group_ids = get_roles(self.context['request']).tenant_group_ids
+        if not Paciente.objects.filter(id=value, grupo_id__in=user_group_ids).exists():
+            raise serializers.ValidationError("El paciente no pertenece al mismo grupo que el usuario o no existe.")
+        return value
+
+    def validate_worker_id(self, value):
+        request = self.context['request']
+        if value is not None and not Worker.visibles_para(request.user, get_roles(request)).filter(id=value).exists():
+            raise serializers.ValidationError("El trabajador no existe o no tienes permiso para asignarle citas.")
+        return value
+
+    def validate(self, attrs):
+        def valor(campo):
+            return attrs.get(campo, getattr(self.instance, campo, None))
+
+        if valor('comenzar') and valor('finalizar') and valor('finalizar') <= valor('comenzar'):
+            raise serializers.ValidationError({'finalizar': ["Debe ser posterior a la hora de comienzo."]})
+        if valor('fecha_fin') and valor('fecha_inicio') and valor('fecha_fin') < valor('fecha_inicio'):
+            raise serializers.ValidationError({'fecha_fin': ["No puede ser anterior a fecha_inicio."]})
+        if 'dias_semana' in attrs:
+            attrs['dias_semana'] = sorted(set(attrs['dias_semana']))
+        return attrs
+
+    def create(self, validated_data):
+        # El worker puede venir de perform_create, así que se comprueba aquí y no en validate
+        with transaction.atomic():
+            comprobar_solape_serie(SerieCita(**validated_data))
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            serie = copy(instance)
+            for campo, valor in validated_data.items():
+                setattr(serie, campo, valor)
+            comprobar_solape_serie(serie)
+            return super().update(instance, validated_data)
+
+
+class OcurrenciaSerializer(serializers.ModelSerializer):
+    """
+    Cambios opcionales al convertir una ocurrencia de una serie en cita
+    (p. ej. marcarla como pagada o moverla de hora).
+    """
+    class Meta:
+        model = Cita
+        fields = ['fecha', 'comenzar', 'finalizar', 'descripcion', 'precio', 'cotizada', 'irpf', 'metodo_pago', 'pagado']
 
 
 class ConfiguracionPrecioCitaSerializer(serializers.ModelSerializer):
@@ -70,3 +206,11 @@ class ConfiguracionPrecioCitaSerializer(serializers.ModelSerializer):
     class Meta:
         model = ConfiguracionPrecioCita
         fields = ["precio_global"]
+
+
+class RecordatorioEnvioSerializer(serializers.ModelSerializer):
+    paciente = serializers.IntegerField(source='cita.paciente_id', read_only=True)
+
+    class Meta:
+        model = RecordatorioEnvio
+        fields = ['id', 'cita', 'paciente', 'telefono', 'estado', 'intentos', 'twilio_status', 'error', 'created_at', 'updated_at']
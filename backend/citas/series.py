@@ -0,0 +1,66 @@
+"""
+Series de citas (SerieCita): conversión de una ocurrencia en Cita y
+anulación de ocurrencias. El cálculo de las ocurrencias está en ocurrencias.py.
+
+Una ocurrencia pasa a ser Cita (materializar) cuando hay que guardar algo
+propio de ella: un cambio de hora, el cobro o la factura. Desde ese momento
+la cita sustituye a la ocurrencia, y si la cita se borra la ocurrencia queda
+anulada.
+"""
+from django.db import IntegrityError, transaction
+from .models import Cita, SerieCita
+from .solapes import comprobar_solape
+
+# Campos de la serie que se copian en la cita al materializar una ocurrencia
+CAMPOS_PLANTILLA = (
+    'paciente_id', 'user_id', 'worker_id', 'comenzar', 'finalizar',
+    'descripcion', 'precio', 'cotizada', 'irpf', 'metodo_pago',
+)
+
+
+def materializar(serie, fecha, **cambios):
+    """
+    Devuelve (cita, creada): la Cita de la ocurrencia `fecha` de la serie,
+    creándola con los datos de la serie y `cambios` si aún no existe. Si ya
+    existe se devuelve tal cual; los cambios posteriores van por la cita.
+    """
+    with transaction.atomic():
+        existente = Cita.objects.filter(serie=serie, fecha_serie=fecha).first()
+        if existente:
+            return existente, False
+
+        cita = Cita(
+            serie=serie, fecha_serie=fecha, fecha=fecha,
+            **{campo: getattr(serie, campo) for campo in CAMPOS_PLANTILLA},
+        )
+        for campo, valor in cambios.items():
+            setattr(cita, campo, valor)
+        # La propia ocurrencia no cuenta como solape: la cita la sustituye
+        comprobar_solape(
+            cita.worker_id, cita.fecha, cita.comenzar, cita.finalizar,
+            excluir_series=[serie.id] if cita.fecha == fecha else [],
+        )
+        try:
+            with transaction.atomic():
+                cita.save()
+        except IntegrityError:
+            # Otra petición ha materializado la misma ocurrencia entretanto
+            # (cita_serie_fecha_unica): se devuelve su cita
+            existente = Cita.objects.filter(serie=serie, fecha_serie=fecha).first()
+            if existente is None:
+                raise
+            return existente, False
+    return cita, True
+
+
+def anular_ocurrencia(serie_id, fecha):
+    """
+    Añade la fecha a las excepciones de la serie para que la ocurrencia deje
+    de aparecer. No hace nada si la serie ya no existe.
+    """
+    with transaction.atomic():
+        serie = SerieCita.objects.select_for_update().filter(pk=serie_id).first()
+        if serie is None or fecha.isoformat() in serie.excepciones:
+            return
+        serie.excepciones = [*serie.excepciones, fecha.isoformat()]
+        serie.save(update_fields=['excepciones', 'updated_at'])
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .models import Cita, CitaEliminada
+from .series import anular_ocurrencia
+
+@receiver(post_delete, sender=Cita)
+def registrar_cita_eliminada(sender, instance, **kwargs):
+    CitaEliminada.objects.create(
+        cita_id=instance.pk,
+        usuario_id=instance.user_id,
+        worker_id=instance.worker_id,
+    )
+
+@receiver(post_delete, sender=Cita)
+def anular_ocurrencia_de_serie(sender, instance, **kwargs):
+    # Si se borra la cita de una ocurrencia, la ocurrencia no debe reaparecer
+    if instance.serie_id and instance.fecha_serie:
+        anular_ocurrencia(instance.serie_id, instance.fecha_serie)
@@ -0,0 +1,40 @@
+"""
+Marcas de borrado (CitaEliminada) de la sincronización incremental de la
+agenda.
+
+Las marcas solo se guardan SYNC_RETENCION_ELIMINADAS: el comando
+limpiar_citas_eliminadas borra las más antiguas y la sincronización no
+acepta cursores anteriores a ese plazo (el cliente recibe una sincronización
+completa), así que ninguno se pierde un borrado.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import CitaEliminada
+
+TAMAÑO_LOTE = 5000
+
+
+def get_retencion():
+    return getattr(settings, 'SYNC_RETENCION_ELIMINADAS', timedelta(days=30))
+
+
+def cursor_minimo():
+    """Cursor más antiguo que acepta la sincronización incremental."""
+    return timezone.now() - get_retencion()
+
+
+def limpiar_citas_eliminadas(tamaño_lote=TAMAÑO_LOTE):
+    """
+    Borra las marcas anteriores al cursor mínimo, por lotes y cada lote en su
+    transacción. Devuelve cuántas se han borrado.
+    """
+    antiguas = CitaEliminada.objects.filter(deleted_at__lt=cursor_minimo())
+    total = 0
+    while True:
+        with transaction.atomic():
+            ids = list(antiguas.order_by('pk').values_list('pk', flat=True)[:tamaño_lote])
+            if not ids:
+                return total
+            total += CitaEliminada.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,141 @@
+"""
+Evita que un worker tenga dos citas solapadas el mismo día.
+
+Antes de buscar solapes se toma un bloqueo por worker y día, de modo que dos
+reservas simultáneas para el mismo worker se hacen una detrás de otra y las
+de otros workers o días no esperan. En PostgreSQL es un advisory lock de
+transacción; en el resto de bases de datos se bloquea la fila del worker.
+Además, en PostgreSQL la restricción de exclusión cita_worker_sin_solape
+(migración 0023) impide el solape aunque se escriba por otro camino.
+
+Las ocurrencias de las series que aún no son cita ocupan la agenda igual que
+las citas. Una serie puede tener ocurrencias en cualquier día, así que al
+crearla o cambiarla se bloquea la agenda entera del worker
+(bloquear_series); las reservas de un día toman ese mismo bloqueo en modo
+compartido para no cruzarse con ella.
+
+Todas las funciones deben llamarse dentro de transaction.atomic(): el bloqueo
+dura hasta el final de la transacción.
+"""
+from datetime import date, timedelta
+from django.db import connection
+from rest_framework.exceptions import ValidationError
+from workers.models import Worker
+from .models import Cita, SerieCita
+from .ocurrencias import es_ocurrencia, fechas_serie, ocurrencias, series_en_rango
+
+# Días en los que se buscan coincidencias entre dos series: más allá el patrón
+# semanal se repite
+HORIZONTE_SERIES = 366
+
+
+def bloquear_worker(worker_id):
+    list(Worker.objects.select_for_update().filter(pk=worker_id).values_list('pk', flat=True))
+
+
+def bloquear_agenda(worker_id, fecha):
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock_shared(%s)", [worker_id])
+            cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [worker_id, fecha.toordinal()])
+    else:
+        bloquear_worker(worker_id)
+
+
+def bloquear_agendas(claves):
+    # Siempre en el mismo orden para que dos lotes no se esperen mutuamente
+    for worker_id, fecha in sorted(set(claves)):
+        bloquear_agenda(worker_id, fecha)
+
+
+def bloquear_series(worker_id):
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [worker_id])
+    else:
+        bloquear_worker(worker_id)
+
+
+def citas_solapadas(worker_id, fecha, comenzar, finalizar, excluir=()):
+    return Cita.objects.filter(
+        worker_id=worker_id, fecha=fecha, comenzar__lt=finalizar, finalizar__gt=comenzar,
+    ).exclude(pk__in=excluir)
+
+
+def ocurrencias_en_agendas(claves, excluir_series=()):
+    """
+    Ocurrencias (serie, fecha) que aún no son cita de las series de los
+    workers en los días de `claves` ({(worker_id, fecha)}).
+    """
+    claves = set(claves)
+    fechas = [fecha for _, fecha in claves]
+    series = series_en_rango(
+        SerieCita.objects.filter(worker_id__in={worker_id for worker_id, _ in claves}), min(fechas), max(fechas),
+    ).exclude(pk__in=excluir_series)
+    return [
+        (serie, fecha) for serie, fecha in ocurrencias(series, min(fechas), max(fechas))
+        if (serie.worker_id, fecha) in claves
+    ]
+
+
+def mensaje_solape(cita):
+    if isinstance(cita, SerieCita):
+        return f"El trabajador ya tiene una cita periódica de {cita.comenzar:%H:%M} a {cita.finalizar:%H:%M} ese día."
+    return f"El trabajador ya tiene una cita de {cita.comenzar:%H:%M} a {cita.finalizar:%H:%M} ese día."
+
+
+def comprobar_solape(worker_id, fecha, comenzar, finalizar, excluir=(), excluir_series=()):
+    """
+    Bloquea la agenda del worker ese día y lanza ValidationError si el tramo
+    [comenzar, finalizar) pisa alguna de sus citas o de las ocurrencias de sus
+    series. Sin worker o con un tramo vacío no hay nada que comprobar.
+    """
+    if worker_id is None or finalizar <= comenzar:
+        return
+    bloquear_agenda(worker_id, fecha)
+    solapada = citas_solapadas(worker_id, fecha, comenzar, finalizar, excluir).order_by('comenzar').first()
+    if solapada is None:
+        solapada = next((
+            serie for serie, _ in ocurrencias_en_agendas({(worker_id, fecha)}, excluir_series)
+            if serie.comenzar < finalizar and serie.finalizar > comenzar
+        ), None)
+    if solapada:
+        raise ValidationError({'comenzar': [mensaje_solape(solapada)]})
+
+
+def comprobar_solape_serie(serie):
+    """
+    Bloquea la agenda del worker y lanza ValidationError si alguna ocurrencia
+    de la serie (con los datos aún sin guardar) pisa una cita del worker o una
+    ocurrencia de otra de sus series.
+    """
+    if serie.worker_id is None or serie.finalizar <= serie.comenzar:
+        return
+    bloquear_series(serie.worker_id)
+    hasta = serie.fecha_fin or date.max
+    citas = Cita.objects.filter(
+        worker_id=serie.worker_id, fecha__range=(serie.fecha_inicio, hasta),
+        comenzar__lt=serie.finalizar, finalizar__gt=serie.comenzar,
+    )
+    otras = series_en_rango(
+        SerieCita.objects.filter(worker_id=serie.worker_id, comenzar__lt=serie.finalizar, finalizar__gt=serie.comenzar),
+        serie.fecha_inicio, hasta,
+    )
+    # Las ocurrencias que ya son cita se comprueban como citas
+    materializadas = set()
+    if serie.pk:
+        materializadas = set(Cita.objects.filter(serie_id=serie.pk).values_list('fecha_serie', flat=True))
+        citas = citas.exclude(serie_id=serie.pk)
+        otras = otras.exclude(pk=serie.pk)
+
+    for cita in citas.order_by('fecha', 'comenzar').iterator():
+        if cita.fecha not in materializadas and es_ocurrencia(serie, cita.fecha):
+            raise ValidationError({'comenzar': [f"{cita.fecha:%d/%m/%Y}: {mensaje_solape(cita)}"]})
+
+    for otra in otras:
+        desde = max(serie.fecha_inicio, otra.fecha_inicio)
+        limite = min(fecha for fecha in (hasta, otra.fecha_fin, desde + timedelta(days=HORIZONTE_SERIES)) if fecha)
+        propias = set(fechas_serie(serie, desde, limite)) - materializadas
+        comunes = sorted(propias & {fecha for _, fecha in ocurrencias([otra], desde, limite)})
+        if comunes:
+            raise ValidationError({'comenzar': [f"{comunes[0]:%d/%m/%Y}: {mensaje_solape(otra)}"]})
@@ -1,14 +1,27 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from io import StringIO
+import json
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from unittest import mock, skipUnless
 from django.contrib.auth.models import User, Group
 from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import RefreshToken
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as datetime_timezone
 from django.urls import reverse
+from django.utils import timezone
 from patients.models import Paciente
 from workers.models import Worker
 from userinfo.models import UserInfo
-from citas.models import Cita, ConfiguracionPrecioCita
-from citas.serializers import CitaSerializer
+from citas.models import Cita, CitaEliminada, ConfiguracionPrecioCita, RecordatorioEnvio, SerieCita
+from citas.recordatorios import procesar_pendientes
+from citas.whatsapp import FakeWhatsAppClient
+from twilio.base.exceptions import TwilioRestException
+from citas.serializers import CitaSerializer, CitaLecturaSerializer, citas_para_lectura
+from citas.views import get_citas_usuario
+from citas.disponibilidad import calcular_huecos, calcular_disponibilidad, fusionar_intervalos
+from citas.ocurrencias import fechas_serie
 
 
 class CitaSerializerTest(TestCase):
@@ -174,3 +187,704 @@ class CitasAPITest(TestCase):
             "citas_ids": [self.cita.id]
         }, format="json")
         self.assertIn(response.status_code, [200, 400])  # Puede fallar por el fake token
+
+
+class CitasCalendarioAPITest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.grupo = Group.objects.create(name="Fisioterapia")
+
+        self.user = User.objects.create_user(username="recepcion", password="pass")
+        self.user.groups.add(self.grupo)
+        self.otro_user = User.objects.create_user(username="otro", password="pass")
+
+        self.worker_user = User.objects.create_user(username="fisio", password="pass")
+        self.worker = Worker.objects.create(user=self.worker_user, first_name="Fisio", created_by=self.user)
+
+        self.paciente = Paciente.objects.create(
+            nombre="Lucía", primer_apellido="Gil", segundo_apellido="Mora",
+            email="lucia@example.com", fecha_nacimiento="1991-03-03",
+            dni="11223344C", address="Calle 2", city="Ciudad", code_postal="28003",
+            country="España", grupo=self.grupo
+        )
+
+        for dia, hora in [(2, 10), (2, 9), (4, 12), (40, 10)]:
+            Cita.objects.create(
+                paciente=self.paciente, user=self.user, worker=self.worker,
+                fecha=datetime(2025, 6, 1).date() + timedelta(days=dia),
+                comenzar=f"{hora:02d}:00", finalizar=f"{hora + 1:02d}:00",
+            )
+        Cita.objects.create(
+            paciente=self.paciente, user=self.otro_user,
+            fecha="2025-06-03", comenzar="11:00", finalizar="12:00",
+        )
+
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.url = reverse("citas:citas-calendario")
+
+    def test_agrupa_por_dia_dentro_del_rango(self):
+        response = self.client.get(self.url, {"start": "2025-06-01", "end": "2025-06-07"})
+        self.assertEqual(response.status_code, 200)
+
+        dias = response.data["dias"]
+        self.assertEqual(list(dias.keys()), ["2025-06-03", "2025-06-05"])
+        self.assertEqual([c["comenzar"] for c in dias["2025-06-03"]], ["09:00:00", "10:00:00"])
+        self.assertEqual(dias["2025-06-03"][0]["paciente_nombre"], "Lucía Gil Mora")
+
+    def test_filtra_por_worker(self):
+        otro_worker = Worker.objects.create(user=self.otro_user, first_name="Otro", created_by=self.user)
+        response = self.client.get(self.url, {"start": "2025-06-01", "end": "2025-06-07", "worker": otro_worker.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["dias"], {})
+
+    def test_rango_invalido(self):
+        self.assertEqual(self.client.get(self.url, {"start": "2025-06-01"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"start": "2025-06-07", "end": "2025-06-01"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"start": "2025-01-01", "end": "2025-12-31"}).status_code, 400)
+
+    def test_exportar_citas_ndjson(self):
+        response = self.client.get(reverse("citas:citas-exportar"), {"formato": "ndjson", "end": "2025-06-30"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+
+        filas = [json.loads(linea) for linea in b"".join(response.streaming_content).decode().splitlines()]
+        # Las citas del otro usuario no salen y end deja fuera la del 11 de julio
+        self.assertEqual([(f["fecha"], f["comenzar"]) for f in filas],
+                         [("2025-06-03", "09:00:00"), ("2025-06-03", "10:00:00"), ("2025-06-05", "12:00:00")])
+        self.assertEqual(filas[0]["paciente_nombre"], "Lucía")
+        self.assertEqual(filas[0]["precio"], "25.00")
+
+
+class CitasSyncAPITest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.grupo = Group.objects.create(name="Psicología")
+        self.user = User.objects.create_user(username="recepcion", password="pass")
+        self.user.groups.add(self.grupo)
+        self.otro_user = User.objects.create_user(username="otro", password="pass")
+
+        self.paciente = Paciente.objects.create(
+            nombre="Mario", primer_apellido="Ruiz", segundo_apellido="Sanz",
+            email="mario@example.com", fecha_nacimiento="1988-08-08",
+            dni="55667788D", address="Calle 3", city="Ciudad", code_postal="28004",
+            country="España", grupo=self.grupo
+        )
+        self.cita = self._crear_cita(self.user)
+        self.cita_ajena = self._crear_cita(self.otro_user)
+
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.url = reverse("citas:citas-sync")
+
+    def _crear_cita(self, user):
+        return Cita.objects.create(
+            paciente=self.paciente, user=user,
+            fecha="2025-06-10", comenzar="10:00", finalizar="11:00",
+        )
+
+    def test_sincronizacion_completa_y_sin_cambios(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["completa"])
+        self.assertEqual([c["id"] for c in response.data["citas"]], [self.cita.id])
+
+        Cita.objects.filter(id=self.cita.id).update(updated_at=datetime(2020, 1, 1, tzinfo=datetime_timezone.utc))
+        response = self.client.get(self.url, {"cursor": response.data["cursor"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data["completa"])
+        self.assertEqual(response.data["citas"], [])
+        self.assertEqual(response.data["eliminadas"], [])
+
+    def test_devuelve_cambios_y_borrados_desde_el_cursor(self):
+        cursor = self.client.get(self.url).data["cursor"]
+
+        nueva = self._crear_cita(self.user)
+        borrada_id = self.cita.id
+        self.cita.delete()
+        self.cita_ajena.delete()
+
+        response = self.client.get(self.url, {"cursor": cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c["id"] for c in response.data["citas"]], [nueva.id])
+        self.assertEqual(response.data["eliminadas"], [borrada_id])
+
+    def test_cursor_invalido(self):
+        response = self.client.get(self.url, {"cursor": "ayer"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_marcas_antiguas_se_limpian_y_su_cursor_da_sincronizacion_completa(self):
+        self.cita_ajena.delete()
+        hace_un_año = timezone.now() - timedelta(days=365)
+        CitaEliminada.objects.update(deleted_at=hace_un_año)
+        self.cita.delete()
+
+        call_command("limpiar_citas_eliminadas", stdout=StringIO())
+        self.assertEqual(list(CitaEliminada.objects.values_list("cita_id", flat=True)), [self.cita.id])
+
+        response = self.client.get(self.url, {"cursor": hace_un_año.isoformat()})
+        self.assertTrue(response.data["completa"])
+        self.assertEqual(response.data["eliminadas"], [])
+
+
+class DisponibilidadTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_group = Group.objects.create(name="Admin")
+        self.fisio_group = Group.objects.create(name="Fisioterapia")
+
+        self.admin = User.objects.create_user(username="admin", password="pass")
+        self.admin.groups.add(self.admin_group, self.fisio_group)
+
+        self.worker_a = Worker.objects.create(
+            user=User.objects.create_user(username="a", password="pass"), first_name="Ana", last_name="A", created_by=self.admin
+        )
+        self.worker_b = Worker.objects.create(
+            user=User.objects.create_user(username="b", password="pass"), first_name="Bea", last_name="B", created_by=self.admin
+        )
+
+        # Lunes 2 de junio de 2025
+        # Citas contiguas (un worker ya no puede tener citas solapadas); se fusionan en 09:00-11:00
+        for comenzar, finalizar in [("09:00", "10:00"), ("10:00", "11:00"), ("12:00", "12:30"), ("20:30", "21:30")]:
+            Cita.objects.create(worker=self.worker_a, user=self.admin, fecha="2025-06-02",
+                                comenzar=comenzar, finalizar=finalizar)
+
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.url = reverse("citas:citas-disponibilidad")
+
+    def test_fusionar_y_calcular_huecos(self):
+        ocupados = fusionar_intervalos([(540, 600), (570, 660), (660, 690), (720, 750)])
+        self.assertEqual(ocupados, [[540, 690], [720, 750]])
+        self.assertEqual(calcular_huecos(ocupados, 540, 780, 30), [(690, 720), (750, 780)])
+        self.assertEqual(calcular_huecos(ocupados, 540, 780, 45), [])
+
+    def test_una_consulta_para_todos_los_workers(self):
+        # Una para las citas y otra para las series
+        with self.assertNumQueries(2):
+            huecos = calcular_disponibilidad(
+                [self.worker_a.id, self.worker_b.id],
+                datetime(2025, 6, 1).date(), datetime(2025, 6, 30).date(), 45,
+            )
+        self.assertEqual(huecos[self.worker_a.id]["2025-06-02"], [("11:00", "12:00"), ("12:30", "20:30")])
+        self.assertEqual(huecos[self.worker_b.id]["2025-06-02"], [("09:00", "21:00")])
+        self.assertNotIn("2025-06-07", huecos[self.worker_a.id])  # sábado
+
+    def test_endpoint_filtra_por_worker_y_horario(self):
+        response = self.client.get(self.url, {
+            "start": "2025-06-02", "end": "2025-06-02", "duracion": 45,
+            "worker": self.worker_a.id, "hora_inicio": "10:00", "hora_fin": "14:00",
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["workers"]), 1)
+        self.assertEqual(response.data["workers"][0]["huecos"]["2025-06-02"], [("11:00", "12:00"), ("12:30", "14:00")])
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get(self.url, {"start": "2025-06-02"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"start": "2025-06-02", "end": "2025-06-03", "duracion": "x"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"start": "2025-06-02", "end": "2025-06-03", "duracion": 0}).status_code, 400)
+
+
+@skipUnless(connection.vendor in ("sqlite", "postgresql"), "Planes de ejecución solo comprobados en SQLite y PostgreSQL")
+class CitaQueryPlanTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        grupo = Group.objects.create(name="Fisioterapia")
+        cls.user = User.objects.create_user(username="recepcion", password="pass")
+        cls.worker = Worker.objects.create(
+            user=User.objects.create_user(username="fisio", password="pass"), first_name="Fisio", created_by=cls.user
+        )
+        cls.paciente = Paciente.objects.create(
+            nombre="Eva", primer_apellido="Sol", segundo_apellido="Mar",
+            email="eva@example.com", fecha_nacimiento="1990-01-01", dni="99887766E",
+            address="Calle 4", city="Ciudad", code_postal="28005", country="España", grupo=grupo
+        )
+        inicio = datetime(2024, 1, 1).date()
+        Cita.objects.bulk_create([
+            Cita(
+                paciente=cls.paciente, user=cls.user, worker=cls.worker if i % 2 else None,
+                fecha=inicio + timedelta(days=i % 365), comenzar="10:00", finalizar="11:00",
+            )
+            for i in range(500)
+        ])
+
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            # Con pocas filas PostgreSQL prefiere un seq scan; se desactiva para ver el índice elegible
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsaIndice(self, queryset, indice):
+        plan = queryset.explain()
+        self.assertIn(indice, plan)
+        return plan
+
+    def assertSinOrdenacion(self, plan):
+        self.assertNotIn("TEMP B-TREE FOR ORDER BY", plan)
+        self.assertNotIn("Sort Key", plan)
+
+    def test_lista_de_citas_usa_union_de_indices(self):
+        queryset = get_citas_usuario(self.user, fecha__range=("2024-03-01", "2024-03-31"))
+        self.assertIn("UNION", str(queryset.query))
+        plan = self.assertUsaIndice(queryset, "cita_user_fecha_idx")
+        self.assertIn("cita_worker_fecha_idx", plan)
+
+    def test_citas_por_paciente_usa_indice_ordenado(self):
+        queryset = Cita.objects.filter(paciente_id=self.paciente.id).order_by('-fecha', '-comenzar')
+        plan = self.assertUsaIndice(queryset, "cita_paciente_fecha_idx")
+        self.assertSinOrdenacion(plan)
+
+    def test_citas_de_worker_creadas_por_usuario_usan_indice_ordenado(self):
+        queryset = Cita.objects.filter(worker=self.worker, user=self.user).order_by('fecha')
+        plan = self.assertUsaIndice(queryset, "cita_worker_user_fecha_idx")
+        self.assertSinOrdenacion(plan)
+
+
+class CitaLecturaTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.grupo = Group.objects.create(name="Fisioterapia")
+        self.user = User.objects.create_user(username="recepcion", password="pass")
+        self.user.groups.add(self.grupo)
+        self.paciente = Paciente.objects.create(
+            nombre="Lucía", primer_apellido="Gil", segundo_apellido="Mora", phone="600111222",
+            email="lucia@example.com", fecha_nacimiento="1992-02-02", dni="11223344F",
+            address="Calle 5", city="Ciudad", code_postal="28006", country="España", grupo=self.grupo
+        )
+        self.crear_citas(1)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def crear_citas(self, cantidad):
+        Cita.objects.bulk_create([
+            Cita(paciente=self.paciente, user=self.user, fecha="2025-06-10", comenzar="10:00", finalizar="11:00")
+            for _ in range(cantidad)
+        ])
+
+    def assertConsultasConstantes(self, url):
+        with CaptureQueriesContext(connection) as una:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.crear_citas(5)
+        with CaptureQueriesContext(connection) as seis:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(seis), len(una))
+
+    def test_misma_representacion_que_cita_serializer(self):
+        citas = Cita.objects.order_by('id')
+        lectura = [dict(cita) for cita in CitaLecturaSerializer(citas_para_lectura(citas), many=True).data]
+        self.assertEqual(lectura, [dict(cita) for cita in CitaSerializer(citas, many=True).data])
+        self.assertEqual(lectura[0]["paciente_nombre"], "Lucía Gil Mora")
+        self.assertEqual(lectura[0]["paciente_phone"], "600111222")
+
+        sin_paciente = Cita.objects.create(user=self.user, fecha="2025-06-11", comenzar="09:00", finalizar="10:00")
+        fila = CitaLecturaSerializer(citas_para_lectura(Cita.objects.filter(id=sin_paciente.id)), many=True).data[0]
+        self.assertIsNone(fila["paciente_nombre"])
+        self.assertIsNone(fila["paciente"])
+
+    def test_lista_de_citas_sin_consulta_por_cita(self):
+        self.assertConsultasConstantes("/citas/")
+
+    def test_sync_sin_consulta_por_cita(self):
+        self.assertConsultasConstantes(reverse("citas:citas-sync"))
+
+    def test_citas_por_paciente_sin_consulta_por_cita(self):
+        self.assertConsultasConstantes(reverse("citas:citas_por_paciente", args=[self.paciente.id]))
+
+
+class CitasLoteTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.grupo = Group.objects.create(name="Fisioterapia")
+        self.user = User.objects.create_user(username="recepcion", password="pass")
+        self.user.groups.add(self.grupo)
+        self.worker = Worker.objects.create(
+            user=User.objects.create_user(username="fisio", password="pass"), first_name="Fisio", created_by=self.user
+        )
+        self.paciente = Paciente.objects.create(
+            nombre="Rosa", primer_apellido="Vega", segundo_apellido="Luz",
+            email="rosa@example.com", fecha_nacimiento="1980-03-03", dni="22334455G",
+            address="Calle 6", city="Ciudad", code_postal="28007", country="España", grupo=self.grupo
+        )
+        self.ajeno = Paciente.objects.create(
+            nombre="Otro", primer_apellido="Grupo", segundo_apellido="Ajeno",
+            email="otro@example.com", fecha_nacimiento="1980-03-03", grupo=Group.objects.create(name="Psicología")
+        )
+        self.citas = [
+            Cita.objects.create(paciente=self.paciente, user=self.user, worker=self.worker,
+                                fecha="2025-06-10", comenzar=f"{hora}:00", finalizar=f"{hora}:45")
+            for hora in (9, 10, 11)
+        ]
+        ConfiguracionPrecioCita.objects.create(precio_global=40)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        self.url = reverse("citas:citas-lote")
+
+    def test_aplica_todas_las_operaciones(self):
+        operaciones = [
+            {"op": "crear", "datos": {"paciente_id": self.paciente.id, "fecha": "2025-06-12",
+                                      "comenzar": "09:00", "finalizar": "09:45"}},
+            {"op": "actualizar", "id": self.citas[0].id, "datos": {"pagado": True}},
+            {"op": "mover", "id": self.citas[1].id,
+             "datos": {"fecha": "2025-06-11", "comenzar": "12:00", "finalizar": "12:45"}},
+            {"op": "eliminar", "id": self.citas[2].id},
+        ]
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.post(self.url, {"operaciones": operaciones}, format="json")
+        self.assertEqual(response.status_code, 200)
+        resultados = response.data["resultados"]
+        self.assertEqual([r["op"] for r in resultados], ["crear", "actualizar", "mover", "eliminar"])
+        # Una sola consulta de pacientes para todo el lote
+        self.assertEqual(sum('FROM "patients_paciente"' in q['sql'] for q in consultas.captured_queries), 1)
+
+        nueva = Cita.objects.get(id=resultados[0]["id"])
+        self.assertEqual(nueva.precio, 40)
+        self.assertEqual(nueva.user, self.user)
+        self.citas[0].refresh_from_db()
+        self.assertTrue(self.citas[0].pagado)
+        self.citas[1].refresh_from_db()
+        self.assertEqual(str(self.citas[1].fecha), "2025-06-11")
+        self.assertGreater(self.citas[1].updated_at, self.citas[1].created_at)
+        self.assertFalse(Cita.objects.filter(id=self.citas[2].id).exists())
+        self.assertTrue(CitaEliminada.objects.filter(cita_id=self.citas[2].id).exists())
+
+    def test_si_una_falla_no_se_aplica_ninguna(self):
+        operaciones = [
+            {"op": "eliminar", "id": self.citas[0].id},
+            {"op": "crear", "datos": {"paciente_id": self.ajeno.id, "fecha": "2025-06-12",
+                                      "comenzar": "09:00", "finalizar": "09:45"}},
+            {"op": "mover", "id": self.citas[1].id, "datos": {"fecha": "no-es-fecha"}},
+            {"op": "actualizar", "id": self.citas[0].id, "datos": {}},
+        ]
+        response = self.client.post(self.url, {"operaciones": operaciones}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e["indice"] for e in response.data["errores"]], [2, 3])
+
+        response = self.client.post(self.url, {"operaciones": operaciones[:2]}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e["indice"] for e in response.data["errores"]], [1])
+        self.assertIn("paciente_id", response.data["errores"][0]["errores"])
+        self.assertTrue(Cita.objects.filter(id=self.citas[0].id).exists())
+
+    def test_citas_ajenas_y_lote_vacio(self):
+        otra = Cita.objects.create(user=User.objects.create_user(username="otro", password="pass"),
+                                   fecha="2025-06-10", comenzar="09:00", finalizar="09:45")
+        response = self.client.post(self.url, {"operaciones": [{"op": "eliminar", "id": otra.id}]}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Cita.objects.filter(id=otra.id).exists())
+
+        response = self.client.post(self.url, {"operaciones": []}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("error", response.data)
+
+
+class CitaSolapeTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.grupo = Group.objects.create(name="Fisioterapia")
+        self.user = User.objects.create_user(username="fisio", password="pass")
+        self.user.groups.add(self.grupo)
+        self.worker = Worker.objects.create(user=self.user, first_name="Fisio", created_by=self.user)
+        self.paciente = Paciente.objects.create(
+            nombre="Pablo", primer_apellido="Ríos", segundo_apellido="Cano",
+            email="pablo@example.com", fecha_nacimiento="1975-04-04", dni="33445566H",
+            address="Calle 7", city="Ciudad", code_postal="28008", country="España", grupo=self.grupo
+        )
+        self.cita = Cita.objects.create(paciente=self.paciente, user=self.user, worker=self.worker,
+                                        fecha="2025-06-10", comenzar="10:00", finalizar="11:00")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def datos(self, comenzar, finalizar, fecha="2025-06-10"):
+        return {"paciente_id": self.paciente.id, "fecha": fecha, "comenzar": comenzar, "finalizar": finalizar}
+
+    def test_crear_cita_solapada(self):
+        response = self.client.post("/citas/", self.datos("10:30", "11:30"), format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("comenzar", response.data)
+
+        # Contigua o en otro día sí se puede
+        self.assertEqual(self.client.post("/citas/", self.datos("11:00", "12:00"), format="json").status_code, 201)
+        self.assertEqual(
+            self.client.post("/citas/", self.datos("10:30", "11:30", "2025-06-11"), format="json").status_code, 201
+        )
+
+    def test_actualizar_cita_solapada(self):
+        otra = Cita.objects.create(paciente=self.paciente, user=self.user, worker=self.worker,
+                                   fecha="2025-06-10", comenzar="12:00", finalizar="13:00")
+        response = self.client.patch(f"/citas/{otra.id}/", {"comenzar": "10:45"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        # La propia cita no cuenta como solape
+        response = self.client.patch(f"/citas/{self.cita.id}/", {"finalizar": "11:30"}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_crear_cita_de_worker_solapada(self):
+        url = reverse("worker-appointments-create", args=[self.worker.id])
+        response = self.client.post(url, self.datos("09:30", "10:15"), format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Cita.objects.filter(worker=self.worker).count(), 1)
+
+    def test_lote_comprueba_solapes_con_guardadas_y_entre_si(self):
+        operaciones = [
+            {"op": "crear", "datos": self.datos("12:00", "13:00")},
+            {"op": "crear", "datos": self.datos("12:30", "13:30")},
+            {"op": "mover", "id": self.cita.id,
+             "datos": {"fecha": "2025-06-10", "comenzar": "14:00", "finalizar": "15:00"}},
+            {"op": "crear", "datos": self.datos("10:00", "11:00")},
+        ]
+        response = self.client.post(reverse("citas:citas-lote"), {"operaciones": operaciones}, format="json")
+        self.assertEqual(response.status_code, 400)
+        # El hueco que deja la cita movida queda libre dentro del mismo lote
+        self.assertEqual([e["indice"] for e in response.data["errores"]], [1])
+        self.assertEqual(Cita.objects.count(), 1)
+
+
+class SerieCitaTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.grupo = Group.objects.create(name="Psicología")
+        self.user = User.objects.create_user(username="psico", password="pass")
+        self.user.groups.add(self.grupo)
+        self.worker = Worker.objects.create(user=self.user, first_name="Psico", created_by=self.user)
+        self.paciente = Paciente.objects.create(
+            nombre="Irene", primer_apellido="Soto", segundo_apellido="Paz",
+            email="irene@example.com", fecha_nacimiento="1991-05-05", dni="44556677J",
+            address="Calle 8", city="Ciudad", code_postal="28009", country="España", grupo=self.grupo
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        # Martes 3 de junio de 2025, cada semana
+        response = self.client.post(reverse("citas:series-citas"), {
+            "paciente_id": self.paciente.id, "fecha_inicio": "2025-06-03",
+            "comenzar": "17:00", "finalizar": "18:00", "precio": "45.00",
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.serie = SerieCita.objects.get(id=response.data["id"])
+
+    def calendario(self):
+        response = self.client.get(reverse("citas:citas-calendario"), {"start": "2025-06-01", "end": "2025-06-30"})
+        self.assertEqual(response.status_code, 200)
+        return response.data["dias"]
+
+    def ocurrencia(self, fecha):
+        return reverse("citas:series-citas-ocurrencia", args=[self.serie.id, fecha])
+
+    def test_fechas_de_la_serie(self):
+        serie = SerieCita(fecha_inicio=datetime(2025, 6, 3).date(), fecha_fin=datetime(2025, 7, 15).date(),
+                          intervalo_semanas=2, dias_semana=[1, 3], excepciones=["2025-06-17"])
+        fechas = [f.isoformat() for f in fechas_serie(serie, datetime(2025, 6, 1).date(), datetime(2025, 12, 31).date())]
+        self.assertEqual(fechas, ["2025-06-03", "2025-06-05", "2025-06-19", "2025-07-01", "2025-07-03", "2025-07-15"])
+
+    def test_calendario_expande_sin_crear_citas(self):
+        dias = self.calendario()
+        self.assertEqual(sorted(dias), ["2025-06-03", "2025-06-10", "2025-06-17", "2025-06-24"])
+        ocurrencia = dias["2025-06-10"][0]
+        self.assertIsNone(ocurrencia["id"])
+        self.assertEqual(ocurrencia["serie"], self.serie.id)
+        self.assertEqual(ocurrencia["paciente_nombre"], "Irene Soto Paz")
+        self.assertEqual(ocurrencia["worker"], self.worker.id)
+        self.assertFalse(Cita.objects.exists())
+
+    def test_materializar_al_cobrar(self):
+        response = self.client.post(self.ocurrencia("2025-06-10"), {"pagado": True}, format="json")
+        self.assertEqual(response.status_code, 201)
+        cita = Cita.objects.get()
+        self.assertTrue(cita.pagado)
+        self.assertEqual((cita.serie_id, str(cita.fecha_serie), cita.precio), (self.serie.id, "2025-06-10", 45))
+        self.assertEqual(self.client.post(self.ocurrencia("2025-06-10"), {}, format="json").status_code, 200)
+
+        # La cita sustituye a la ocurrencia, aunque se mueva de día
+        self.client.patch(f"/citas/{cita.id}/", {"fecha": "2025-06-11"}, format="json")
+        dias = self.calendario()
+        self.assertNotIn("2025-06-10", dias)
+        self.assertEqual([c["id"] for c in dias["2025-06-11"]], [cita.id])
+
+        # Si se borra la cita, la ocurrencia queda anulada
+        self.client.delete(f"/citas/{cita.id}/")
+        self.serie.refresh_from_db()
+        self.assertEqual(self.serie.excepciones, ["2025-06-10"])
+        self.assertNotIn("2025-06-10", self.calendario())
+
+    def test_materializar_a_la_vez_devuelve_la_misma_cita(self):
+        def otra_peticion(*args, **kwargs):
+            # La otra petición guarda la cita entre la búsqueda y el save
+            Cita.objects.create(
+                serie=self.serie, fecha_serie="2025-06-10", fecha="2025-06-10", paciente=self.paciente,
+                user=self.user, comenzar="17:00", finalizar="18:00",
+            )
+
+        with mock.patch("citas.series.comprobar_solape", side_effect=otra_peticion):
+            response = self.client.post(self.ocurrencia("2025-06-10"), {"pagado": True}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["id"], Cita.objects.get().id)
+
+    def test_anular_ocurrencia(self):
+        self.assertEqual(self.client.delete(self.ocurrencia("2025-06-17")).status_code, 204)
+        self.assertNotIn("2025-06-17", self.calendario())
+        # Fuera de la regla de la serie no hay ocurrencia
+        self.assertEqual(self.client.post(self.ocurrencia("2025-06-18"), {}, format="json").status_code, 404)
+        self.assertEqual(self.client.post(self.ocurrencia("2025-06-17"), {}, format="json").status_code, 404)
+
+    def test_citas_y_series_no_se_solapan_con_ocurrencias(self):
+        cita = {"paciente_id": self.paciente.id, "fecha": "2025-06-10", "comenzar": "17:30", "finalizar": "18:30"}
+        response = self.client.post("/citas/", cita, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("comenzar", response.data)
+        operaciones = [{"op": "crear", "datos": cita}]
+        self.assertEqual(
+            self.client.post(reverse("citas:citas-lote"), {"operaciones": operaciones}, format="json").status_code, 400
+        )
+        # Otro día de la semana sí
+        self.assertEqual(self.client.post("/citas/", {**cita, "fecha": "2025-06-11"}, format="json").status_code, 201)
+
+        # Ni otra serie ni una cita ya guardada pueden quedar debajo de una serie nueva
+        otra_serie = {"paciente_id": self.paciente.id, "fecha_inicio": "2025-06-10", "comenzar": "17:30", "finalizar": "18:30"}
+        self.assertEqual(self.client.post(reverse("citas:series-citas"), otra_serie, format="json").status_code, 400)
+        response = self.client.post(reverse("citas:series-citas"), {**otra_serie, "dias_semana": [2]}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("11/06/2025", response.data["comenzar"][0])
+        response = self.client.patch(
+            reverse("citas:series-citas-detalle", args=[self.serie.id]), {"dias_semana": [1, 2]}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+        # La ocurrencia sigue pudiendo convertirse en cita
+        self.assertEqual(self.client.post(self.ocurrencia("2025-06-10"), {"pagado": True}, format="json").status_code, 201)
+
+    def test_disponibilidad_cuenta_las_ocurrencias(self):
+        huecos = calcular_disponibilidad(
+            [self.worker.id], datetime(2025, 6, 9).date(), datetime(2025, 6, 11).date(), 60,
+        )[self.worker.id]
+        self.assertEqual(huecos["2025-06-10"], [("09:00", "17:00"), ("18:00", "21:00")])
+        self.assertEqual(huecos["2025-06-11"], [("09:00", "21:00")])
+
+    def test_valida_paciente_y_horas(self):
+        otro = Paciente.objects.create(
+            nombre="Ajeno", primer_apellido="A", segundo_apellido="B", email="ajeno@example.com",
+            fecha_nacimiento="1990-01-01", grupo=Group.objects.create(name="Otro")
+        )
+        response = self.client.post(reverse("citas:series-citas"), {
+            "paciente_id": otro.id, "fecha_inicio": "2025-06-03", "comenzar": "18:00", "finalizar": "17:00",
+        }, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("paciente_id", response.data)
+
+
+@override_settings(WHATSAPP_CLIENT="citas.whatsapp.FakeWhatsAppClient", WHATSAPP_MENSAJES_POR_SEGUNDO=1000)
+class RecordatoriosWhatsAppTest(TestCase):
+    def setUp(self):
+        FakeWhatsAppClient.outbox = []
+        FakeWhatsAppClient.fallos = {}
+        self.client = APIClient()
+        self.grupo = Group.objects.create(name="Fisioterapia")
+        self.user = User.objects.create_user(username="recepcion", password="pass")
+        self.user.groups.add(self.grupo)
+        UserInfo.objects.filter(user=self.user).update(
+            twilio_account_sid="AC123", twilio_auth_token="token", whatsapp_business_number="+14155238886"
+        )
+
+        self.citas = []
+        for i, phone in enumerate(["+34600000001", "+34600000002", None]):
+            paciente = Paciente.objects.create(
+                nombre=f"Paciente{i}", primer_apellido="Test", segundo_apellido="Test",
+                email=f"p{i}@example.com", phone=phone, fecha_nacimiento="1990-01-01",
+                dni=f"0000000{i}X", address="Calle", city="Ciudad", code_postal="28001",
+                country="España", grupo=self.grupo
+            )
+            self.citas.append(Cita.objects.create(
+                paciente=paciente, user=self.user, fecha="2025-03-14", comenzar="09:30", finalizar="10:30"
+            ))
+
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def encolar(self):
+        return self.client.post(reverse("citas:enviar-whatsapp"), {"citas_ids": [c.id for c in self.citas]}, format="json")
+
+    def test_encola_sin_enviar_y_consulta_estado(self):
+        response = self.encolar()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(response.data["recordatorios"]), 2)
+        self.assertEqual(response.data["omitidas"], [self.citas[2].id])
+        self.assertEqual(FakeWhatsAppClient.outbox, [])
+
+        ids = ",".join(str(r["id"]) for r in response.data["recordatorios"])
+        estado = self.client.get(reverse("citas:recordatorios"), {"ids": ids})
+        self.assertEqual({r["estado"] for r in estado.data}, {RecordatorioEnvio.PENDIENTE})
+
+    def test_procesa_la_cola_y_guarda_el_estado(self):
+        self.encolar()
+        self.assertEqual(procesar_pendientes(), 2)
+
+        self.assertEqual(len(FakeWhatsAppClient.outbox), 2)
+        self.assertIn("14 de marzo", FakeWhatsAppClient.outbox[0]["body"])
+        self.assertIn("09:30 h", FakeWhatsAppClient.outbox[0]["body"])
+        self.assertEqual(RecordatorioEnvio.objects.filter(estado=RecordatorioEnvio.ENVIADO).count(), 2)
+        self.assertEqual(procesar_pendientes(), 0)
+
+    def test_reintenta_errores_transitorios(self):
+        FakeWhatsAppClient.fallos = {
+            "+34600000001": TwilioRestException(503, "/Messages", "Service unavailable"),
+            "+34600000002": TwilioRestException(400, "/Messages", "Invalid number"),
+        }
+        self.encolar()
+        procesar_pendientes()
+
+        transitorio = RecordatorioEnvio.objects.get(telefono="+34600000001")
+        self.assertEqual(transitorio.estado, RecordatorioEnvio.PENDIENTE)
+        self.assertEqual(transitorio.intentos, 1)
+        self.assertGreater(transitorio.proximo_intento, transitorio.updated_at)
+        self.assertEqual(RecordatorioEnvio.objects.get(telefono="+34600000002").estado, RecordatorioEnvio.ERROR)
+
+        # Aún no toca reintentar; cuando llega la hora se envía
+        self.assertEqual(procesar_pendientes(), 0)
+        FakeWhatsAppClient.fallos = {}
+        RecordatorioEnvio.objects.filter(id=transitorio.id).update(proximo_intento=transitorio.updated_at)
+        self.assertEqual(procesar_pendientes(), 1)
+        self.assertEqual(RecordatorioEnvio.objects.get(id=transitorio.id).estado, RecordatorioEnvio.ENVIADO)
+
+
+@override_settings(WHATSAPP_CLIENT="citas.whatsapp.FakeWhatsAppClient", WHATSAPP_MENSAJES_POR_SEGUNDO=1000)
+class EnviarRecordatoriosMananaCommandTest(TestCase):
+    def setUp(self):
+        FakeWhatsAppClient.outbox = []
+        FakeWhatsAppClient.fallos = {}
+        grupo = Group.objects.create(name="Psicología")
+        self.user = User.objects.create_user(username="psico", password="pass")
+        UserInfo.objects.filter(user=self.user).update(
+            twilio_account_sid="AC456", twilio_auth_token="token", whatsapp_business_number="+14155238886"
+        )
+        sin_cuenta = User.objects.create_user(username="sin_twilio", password="pass")
+
+        self.paciente = Paciente.objects.create(
+            nombre="Irene", primer_apellido="Paz", segundo_apellido="Luz",
+            email="irene@example.com", phone="+34611111111", fecha_nacimiento="1990-01-01",
+            dni="12312312F", address="Calle", city="Ciudad", code_postal="28001",
+            country="España", grupo=grupo
+        )
+        for i in range(5):
+            Cita.objects.create(paciente=self.paciente, user=self.user, fecha="2025-09-10",
+                                comenzar=f"{9 + i:02d}:00", finalizar=f"{10 + i:02d}:00")
+        Cita.objects.create(paciente=self.paciente, user=self.user, fecha="2025-09-11", comenzar="09:00", finalizar="10:00")
+        Cita.objects.create(paciente=self.paciente, user=sin_cuenta, fecha="2025-09-10", comenzar="09:00", finalizar="10:00")
+
+    def ejecutar(self):
+        call_command("enviar_recordatorios_manana", fecha="2025-09-10", lote=2, stdout=StringIO())
+
+    def test_envia_por_lotes_y_es_idempotente(self):
+        self.ejecutar()
+        self.assertEqual(len(FakeWhatsAppClient.outbox), 5)
+        self.assertTrue(all(m["account_sid"] == "AC456" for m in FakeWhatsAppClient.outbox))
+        self.assertEqual(RecordatorioEnvio.objects.filter(estado=RecordatorioEnvio.ENVIADO).count(), 5)
+
+        self.ejecutar()
+        self.assertEqual(len(FakeWhatsAppClient.outbox), 5)
+
+    def test_no_repite_las_citas_ya_reservadas(self):
+        cita = Cita.objects.filter(user=self.user, fecha="2025-09-10").order_by("comenzar").first()
+        RecordatorioEnvio.objects.create(cita=cita, user=self.user, telefono="+34611111111",
+                                         mensaje="Recordatorio", estado=RecordatorioEnvio.ENVIANDO)
+        self.ejecutar()
+        self.assertEqual(len(FakeWhatsAppClient.outbox), 4)
+        self.assertEqual(RecordatorioEnvio.objects.filter(cita=cita).count(), 1)
+
+    def test_un_envio_fallido_no_se_reintenta_en_la_misma_ejecucion(self):
+        FakeWhatsAppClient.fallos = {"+34611111111": TwilioRestException(400, "/Messages", "Invalid number")}
+        self.ejecutar()
+        self.assertEqual(RecordatorioEnvio.objects.filter(estado=RecordatorioEnvio.ERROR).count(), 5)
@@ -1,12 +1,21 @@
 from django.urls import path
-from .views import CitasDetailAPIView, CitasListCreateAPIView, EnviarRecordatorioWhatsAppAPIView, ConfiguracionPrecioGlobal, CitasPorPacienteAPIView
+from .views import CitasDetailAPIView, CitasListCreateAPIView, EnviarRecordatorioWhatsAppAPIView, ConfiguracionPrecioGlobal, CitasPorPacienteAPIView, CitasCalendarioAPIView, CitasSyncAPIView, CitasExportAPIView, CitasLoteAPIView, DisponibilidadAPIView, RecordatorioEnvioListAPIView, SerieCitaListCreateAPIView, SerieCitaDetailAPIView, SerieOcurrenciaAPIView
 
 app_name = "citas"
 
 urlpatterns = [
     path("", CitasListCreateAPIView.as_view(), name='lista-crear-citas'),
     path("<int:pk>/", CitasDetailAPIView.as_view(), name='citas-detalle'),
+    path("calendario/", CitasCalendarioAPIView.as_view(), name='citas-calendario'),
+    path("sync/", CitasSyncAPIView.as_view(), name='citas-sync'),
+    path("exportar/", CitasExportAPIView.as_view(), name='citas-exportar'),
+    path("lote/", CitasLoteAPIView.as_view(), name='citas-lote'),
+    path("series/", SerieCitaListCreateAPIView.as_view(), name='series-citas'),
+    path("series/<int:pk>/", SerieCitaDetailAPIView.as_view(), name='series-citas-detalle'),
+    path("series/<int:pk>/ocurrencias/<str:fecha>/", SerieOcurrenciaAPIView.as_view(), name='series-citas-ocurrencia'),
+    path("disponibilidad/", DisponibilidadAPIView.as_view(), name='citas-disponibilidad'),
     path("enviar-whatsapp/", EnviarRecordatorioWhatsAppAPIView.as_view(), name='enviar-whatsapp'),
+    path("recordatorios/", RecordatorioEnvioListAPIView.as_view(), name='recordatorios'),
     path("configurar-precio/", ConfiguracionPrecioGlobal.as_view(), name='configuracion-precio'),
     path('pacientes/<int:paciente_id>/citas/', CitasPorPacienteAPIView.as_view(), name='citas_por_paciente'),  # <- nueva ruta
 ]
@@ -1,17 +1,26 @@
 from datetime import datetime, timedelta
 from django.db.models import Q
-from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.generics import ListAPIView, ListCreateAPIView, RetrieveUpdateDestroyAPIView
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import Cita, ConfiguracionPrecioCita
+from .models import Cita, CitaEliminada, ConfiguracionPrecioCita, RecordatorioEnvio, SerieCita
 from workers.models import Worker
-from .serializers import CitaSerializer, ConfiguracionPrecioCitaSerializer
+from backend.roles import RoleContext, get_roles
+from backend.exportacion import FORMATOS, respuesta_exportacion
+from .serializers import CitaSerializer, CitaLecturaSerializer, ConfiguracionPrecioCitaSerializer, OcurrenciaSerializer, RecordatorioEnvioSerializer, SerieCitaSerializer, citas_para_lectura
+from .disponibilidad import calcular_disponibilidad
+from .lotes import ErrorLote, aplicar_lote
+from .sincronizacion import cursor_minimo
+from .ocurrencias import es_ocurrencia, ocurrencias, series_en_rango
+from .series import anular_ocurrencia, materializar
+from .whatsapp import texto_recordatorio
 from userinfo.models import UserInfo
-from twilio.rest import Client
 from django.utils.dateformat import format as dj_format
 from rest_framework import status
-import locale
 
 
 def get_precio_global():
@@ -46,6 +55,69 @@ def get_fecha_range(filter_type):
     return start, end
 
 
+# Máximo de días que puede abarcar una consulta de calendario (un mes con margen)
+MAX_DIAS_CALENDARIO = 62
+
+# Máximo de días para el cálculo de huecos libres
+MAX_DIAS_DISPONIBILIDAD = 62
+
+# Recordatorios devueltos como máximo cuando no se filtra por IDs
+MAX_RECORDATORIOS_LISTADO = 100
+
+# Solape entre sincronizaciones consecutivas de la agenda
+MARGEN_SYNC = timedelta(seconds=5)
+
+CAMPOS_CALENDARIO = (
+    'id', 'fecha', 'comenzar', 'finalizar', 'descripcion', 'precio', 'metodo_pago',
+    'pagado', 'cotizada', 'irpf', 'worker_id', 'paciente_id', 'serie_id',
+    'paciente__nombre', 'paciente__primer_apellido', 'paciente__segundo_apellido',
+)
+
+
+def parse_fecha(valor):
+    """
+    Convierte un parámetro 'YYYY-MM-DD' en date. Devuelve None si no es válido.
+    """
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+
+def get_citas_usuario(user, roles=None, **filtros):
+    """
+    Citas visibles para el usuario: los workers solo ven las suyas, el resto
+    las que han creado o las asignadas a su worker.
+
+    Los filtros se aplican dentro de cada rama y las dos ramas se combinan con
+    UNION, de modo que cada una puede usar su índice compuesto
+    (user, fecha) / (worker, fecha); con un OR la base de datos acaba
+    recorriendo toda la tabla.
+
+    Las vistas pasan el RoleContext de la petición para no repetir la
+    consulta de grupos.
+    """
+    roles = roles or RoleContext(user)
+    asignadas = Cita.objects.filter(worker__user=user, **filtros)
+
+    if roles.is_worker:
+        return asignadas
+
+    creadas = Cita.objects.filter(user=user, **filtros)
+    return Cita.objects.filter(pk__in=creadas.values('pk').union(asignadas.values('pk')))
+
+
+def get_series_usuario(user, roles=None):
+    """
+    Series visibles para el usuario, con el mismo criterio que
+    get_citas_usuario. Son pocas filas, así que basta con un OR.
+    """
+    roles = roles or RoleContext(user)
+    if roles.is_worker:
+        return SerieCita.objects.filter(worker__user=user)
+    return SerieCita.objects.filter(Q(user=user) | Q(worker__user=user))
+
+
 class CitasListCreateAPIView(ListCreateAPIView):
     serializer_class = CitaSerializer
     permission_classes = [IsAuthenticated]
@@ -55,18 +127,20 @@ class CitasListCreateAPIView(ListCreateAPIView):
         user = self.request.user
         filter_type = self.request.query_params.get('filter_type')
 
-        queryset = Cita.objects.select_related('paciente', 'worker', 'user')
-
-        if user.groups.filter(name='worker').exists():
-            queryset = queryset.filter(worker__user=user)
-        else:
-            queryset = queryset.filter(Q(user=user) | Q(worker__user=user))
-
+        filtros = {}
         if filter_type and filter_type != 'todos':
             start_date, end_date = get_fecha_range(filter_type)
-            queryset = queryset.filter(fecha__range=(start_date, end_date))
+            filtros['fecha__range'] = (start_date, end_date)
+
+        queryset = get_citas_usuario(user, get_roles(self.request), **filtros)
+        if self.request.method == 'GET':
+            return citas_para_lectura(queryset)
+        return queryset
 
-        return queryset.distinct()
+    def get_serializer_class(self):
+        if self.request.method == 'GET':
+            return CitaLecturaSerializer
+        return CitaSerializer
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -85,24 +159,362 @@ class CitasDetailAPIView(RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        queryset = Cita.objects.select_related('paciente', 'worker', 'user')
+        return get_citas_usuario(self.request.user, get_roles(self.request)).select_related('paciente', 'worker', 'user')
 
-        if user.groups.filter(name='worker').exists():
-            return queryset.filter(worker__user=user)
-        return queryset.filter(Q(user=user) | Q(worker__user=user))
 
+class CitasLoteAPIView(APIView):
+    """
+    Aplica en bloque operaciones sobre citas ({"operaciones": [...]}), por
+    ejemplo para reorganizar el día de un worker de baja. Cada operación es
+    {"op": "crear", "datos": {...}}, {"op": "actualizar", "id": 1, "datos": {...}},
+    {"op": "mover", "id": 1, "datos": {"fecha", "comenzar", "finalizar", "worker"}}
+    o {"op": "eliminar", "id": 1}.
 
-def enviar_mensaje_whatsapp(client, from_number, to_number, mensaje):
-    try:
-        message = client.messages.create(
-            from_=f"whatsapp:{from_number}",
-            to=f"whatsapp:{to_number}",
-            body=mensaje
+    Se aplican todas o ninguna: si alguna falla se devuelven los errores por
+    índice y no se guarda nada.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        roles = get_roles(request)
+        operaciones = request.data.get('operaciones') if isinstance(request.data, dict) else None
+        try:
+            resultados, errores = aplicar_lote(
+                operaciones, request.user, roles,
+                get_citas_usuario(request.user, roles), get_precio_global,
+            )
+        except ErrorLote as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if errores:
+            return Response({"errores": errores}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"resultados": resultados}, status=status.HTTP_200_OK)
+
+
+COLUMNAS_EXPORTACION_CITAS = [
+    ('id', 'id'),
+    ('fecha', 'fecha'),
+    ('comenzar', 'comenzar'),
+    ('finalizar', 'finalizar'),
+    ('paciente_id', 'paciente_id'),
+    ('paciente__nombre', 'paciente_nombre'),
+    ('paciente__primer_apellido', 'paciente_primer_apellido'),
+    ('paciente__segundo_apellido', 'paciente_segundo_apellido'),
+    ('worker_id', 'worker_id'),
+    ('descripcion', 'descripcion'),
+    ('precio', 'precio'),
+    ('cotizada', 'cotizada'),
+    ('irpf', 'irpf'),
+    ('metodo_pago', 'metodo_pago'),
+    ('pagado', 'pagado'),
+]
+
+
+class CitasExportAPIView(APIView):
+    """
+    Exporta en streaming (CSV o NDJSON con ?formato=) las citas visibles para
+    el usuario. Admite start y end (YYYY-MM-DD, incluidos) para acotar fechas.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATOS:
+            return Response({"error": "formato debe ser csv o ndjson"}, status=status.HTTP_400_BAD_REQUEST)
+
+        filtros = {}
+        for parametro, lookup in (('start', 'fecha__gte'), ('end', 'fecha__lte')):
+            valor = request.query_params.get(parametro)
+            if valor:
+                fecha = parse_fecha(valor)
+                if not fecha:
+                    return Response({"error": f"{parametro} debe tener formato YYYY-MM-DD"},
+                                    status=status.HTTP_400_BAD_REQUEST)
+                filtros[lookup] = fecha
+
+        queryset = get_citas_usuario(request.user, get_roles(request), **filtros).order_by('fecha', 'comenzar', 'id')
+        return respuesta_exportacion(queryset, COLUMNAS_EXPORTACION_CITAS, 'citas', formato)
+
+
+class CitasCalendarioAPIView(APIView):
+    """
+    Citas de un rango de fechas agrupadas por día, para las vistas de agenda.
+
+    Parámetros: start y end (YYYY-MM-DD, ambos incluidos) y opcionalmente worker.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        start = parse_fecha(request.query_params.get('start'))
+        end = parse_fecha(request.query_params.get('end'))
+
+        if not start or not end:
+            return Response({"error": "Se requieren las fechas start y end con formato YYYY-MM-DD"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if end < start:
+            return Response({"error": "La fecha end no puede ser anterior a start"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if (end - start).days >= MAX_DIAS_CALENDARIO:
+            return Response({"error": f"El rango no puede superar {MAX_DIAS_CALENDARIO} días"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        filtros = {'fecha__range': (start, end)}
+
+        worker_id = request.query_params.get('worker')
+        if worker_id:
+            if not worker_id.isdigit():
+                return Response({"error": "El parámetro worker debe ser un ID numérico"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            filtros['worker_id'] = worker_id
+
+        roles = get_roles(request)
+        queryset = get_citas_usuario(request.user, roles, **filtros)
+
+        dias = {}
+        for cita in queryset.order_by('fecha', 'comenzar').values(*CAMPOS_CALENDARIO):
+            dia = cita['fecha'].isoformat()
+            nombre = " ".join(filter(None, [
+                cita['paciente__nombre'],
+                cita['paciente__primer_apellido'],
+                cita['paciente__segundo_apellido'],
+            ]))
+            dias.setdefault(dia, []).append({
+                "id": cita['id'],
+                "comenzar": cita['comenzar'].strftime('%H:%M:%S'),
+                "finalizar": cita['finalizar'].strftime('%H:%M:%S'),
+                "descripcion": cita['descripcion'],
+                "paciente": cita['paciente_id'],
+                "paciente_nombre": nombre or None,
+                "worker": cita['worker_id'],
+                "precio": str(cita['precio']),
+                "metodo_pago": cita['metodo_pago'],
+                "pagado": cita['pagado'],
+                "cotizada": cita['cotizada'],
+                "irpf": cita['irpf'],
+                "serie": cita['serie_id'],
+            })
+
+        # Ocurrencias de las series que aún no son cita: sin id, con su serie
+        series = series_en_rango(get_series_usuario(request.user, roles), start, end).select_related('paciente')
+        if worker_id:
+            series = series.filter(worker_id=worker_id)
+        for serie, fecha in ocurrencias(series, start, end):
+            dias.setdefault(fecha.isoformat(), []).append({
+                "id": None,
+                "comenzar": serie.comenzar.strftime('%H:%M:%S'),
+                "finalizar": serie.finalizar.strftime('%H:%M:%S'),
+                "descripcion": serie.descripcion,
+                "paciente": serie.paciente_id,
+                "paciente_nombre": str(serie.paciente),
+                "worker": serie.worker_id,
+                "precio": str(serie.precio),
+                "metodo_pago": serie.metodo_pago,
+                "pagado": False,
+                "cotizada": serie.cotizada,
+                "irpf": serie.irpf,
+                "serie": serie.id,
+            })
+        for citas_dia in dias.values():
+            citas_dia.sort(key=lambda cita: cita["comenzar"])
+
+        return Response({
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "dias": dias,
+        }, status=status.HTTP_200_OK)
+
+
+class CitasSyncAPIView(APIView):
+    """
+    Sincronización incremental de la agenda.
+
+    Sin cursor devuelve todas las citas visibles; con ?cursor=<valor devuelto
+    en la llamada anterior> solo las creadas/modificadas después y los IDs de
+    las eliminadas, junto con el cursor para la siguiente llamada. Un cursor
+    anterior a la retención de las marcas de borrado (ver sincronizacion.py)
+    se trata como si no hubiera cursor.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        cursor_param = request.query_params.get('cursor')
+        cursor = None
+
+        if cursor_param:
+            cursor = parse_datetime(cursor_param)
+            if cursor is None:
+                return Response({"error": "Cursor inválido"}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(cursor):
+                cursor = timezone.make_aware(cursor)
+            if cursor < cursor_minimo():
+                cursor = None
+
+        nuevo_cursor = timezone.now()
+        filtros = {}
+        eliminadas = []
+
+        if cursor:
+            # Margen para no perder cambios de transacciones que confirmaron tarde;
+            # el cliente recibe algunas citas repetidas y las sobrescribe por ID.
+            desde = cursor - MARGEN_SYNC
+            filtros['updated_at__gt'] = desde
+
+            worker_ids = Worker.objects.filter(user=user).values('id')
+            if get_roles(request).is_worker:
+                visibles = Q(worker_id__in=worker_ids)
+            else:
+                visibles = Q(usuario_id=user.id) | Q(worker_id__in=worker_ids)
+
+            eliminadas = list(
+                CitaEliminada.objects
+                .filter(visibles, deleted_at__gt=desde)
+                .values_list('cita_id', flat=True)
+                .distinct()
+            )
+
+        citas = citas_para_lectura(get_citas_usuario(user, get_roles(request), **filtros).order_by('updated_at'))
+        serializer = CitaLecturaSerializer(citas, many=True)
+        return Response({
+            "cursor": nuevo_cursor.isoformat(),
+            "completa": cursor is None,
+            "citas": serializer.data,
+            "eliminadas": eliminadas,
+        }, status=status.HTTP_200_OK)
+
+
+class DisponibilidadAPIView(APIView):
+    """
+    Huecos libres de uno o varios workers en un rango de fechas.
+
+    Parámetros: start, end (YYYY-MM-DD), duracion (minutos, por defecto 60),
+    worker (repetible; por defecto todos los visibles) y opcionalmente
+    hora_inicio / hora_fin (HH:MM) para sustituir el horario laboral.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        start = parse_fecha(params.get('start'))
+        end = parse_fecha(params.get('end'))
+
+        if not start or not end or end < start:
+            return Response({"error": "Se requiere un rango start/end válido con formato YYYY-MM-DD"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if (end - start).days >= MAX_DIAS_DISPONIBILIDAD:
+            return Response({"error": f"El rango no puede superar {MAX_DIAS_DISPONIBILIDAD} días"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            duracion = int(params.get('duracion', 60))
+            hora_inicio = params.get('hora_inicio')
+            hora_fin = params.get('hora_fin')
+            for hora in filter(None, [hora_inicio, hora_fin]):
+                datetime.strptime(hora, "%H:%M")
+        except ValueError:
+            return Response({"error": "duracion debe ser un número de minutos y las horas tener formato HH:MM"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if duracion <= 0:
+            return Response({"error": "La duración debe ser mayor que cero"}, status=status.HTTP_400_BAD_REQUEST)
+
+        workers = Worker.visibles_para(request.user, get_roles(request)).order_by('id')
+        worker_ids = params.getlist('worker')
+        if worker_ids:
+            if not all(worker_id.isdigit() for worker_id in worker_ids):
+                return Response({"error": "El parámetro worker debe ser un ID numérico"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            workers = workers.filter(id__in=worker_ids)
+
+        workers = list(workers.values('id', 'first_name', 'last_name'))
+        huecos = calcular_disponibilidad(
+            [worker['id'] for worker in workers], start, end, duracion,
+            hora_inicio=hora_inicio, hora_fin=hora_fin,
         )
-        return {"telefono": to_number, "status": message.status}
-    except Exception as e:
-        return {"telefono": to_number, "error": str(e)}
+
+        return Response({
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "duracion": duracion,
+            "workers": [
+                {
+                    "worker": worker['id'],
+                    "nombre": f"{worker['first_name']} {worker['last_name']}",
+                    "huecos": huecos[worker['id']],
+                }
+                for worker in workers
+            ],
+        }, status=status.HTTP_200_OK)
+
+
+class SerieCitaListCreateAPIView(ListCreateAPIView):
+    """
+    Series de citas visibles para el usuario. Si al crearla no se indica
+    worker, se asigna el del usuario, como en las citas sueltas.
+    """
+    serializer_class = SerieCitaSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+
+    def get_queryset(self):
+        return get_series_usuario(self.request.user, get_roles(self.request)).select_related('paciente').order_by('id')
+
+    def perform_create(self, serializer):
+        user = self.request.user
+        if 'worker_id' not in serializer.validated_data:
+            worker = Worker.objects.filter(user=user).first()
+            serializer.save(user=user, worker_id=worker.id if worker else None)
+        else:
+            serializer.save(user=user)
+
+
+class SerieCitaDetailAPIView(RetrieveUpdateDestroyAPIView):
+    """
+    Los cambios en la serie se aplican a las ocurrencias que aún no son cita;
+    las ya convertidas se conservan (al borrar la serie quedan como citas sueltas).
+    """
+    serializer_class = SerieCitaSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return get_series_usuario(self.request.user, get_roles(self.request)).select_related('paciente')
+
+
+class SerieOcurrenciaAPIView(APIView):
+    """
+    Una ocurrencia de una serie (series/<pk>/ocurrencias/<YYYY-MM-DD>/).
+
+    POST la convierte en cita, con los cambios opcionales del cuerpo (pagado,
+    hora, precio...); es lo que hay que hacer antes de cobrarla o facturarla.
+    Si ya era cita la devuelve sin cambios. DELETE la anula.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_ocurrencia(self, request, pk, fecha):
+        serie = get_object_or_404(get_series_usuario(request.user, get_roles(request)), pk=pk)
+        fecha = parse_fecha(fecha)
+        if not fecha or not es_ocurrencia(serie, fecha):
+            return serie, None
+        return serie, fecha
+
+    def post(self, request, pk, fecha):
+        serie, fecha_ocurrencia = self.get_ocurrencia(request, pk, fecha)
+        if fecha_ocurrencia is None:
+            return Response({"error": "La serie no tiene una ocurrencia en esa fecha"}, status=status.HTTP_404_NOT_FOUND)
+
+        cambios = OcurrenciaSerializer(data=request.data, partial=True)
+        cambios.is_valid(raise_exception=True)
+        cita, creada = materializar(serie, fecha_ocurrencia, **cambios.validated_data)
+        return Response(CitaSerializer(cita).data, status=status.HTTP_201_CREATED if creada else status.HTTP_200_OK)
+
+    def delete(self, request, pk, fecha):
+        serie, fecha_ocurrencia = self.get_ocurrencia(request, pk, fecha)
+        if fecha_ocurrencia is None:
+            return Response({"error": "La serie no tiene una ocurrencia en esa fecha"}, status=status.HTTP_404_NOT_FOUND)
+        if Cita.objects.filter(serie=serie, fecha_serie=fecha_ocurrencia).exists():
+            return Response({"error": "La ocurrencia ya es una cita; elimina la cita"}, status=status.HTTP_409_CONFLICT)
+        anular_ocurrencia(serie.id, fecha_ocurrencia)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 class CitasPorPacienteAPIView(APIView):
     permission_classes = [IsAuthenticated]
@@ -111,12 +523,17 @@ class CitasPorPacienteAPIView(APIView):
         """
         Devuelve todas las citas asociadas a un paciente específico
         """
-        citas = Cita.objects.filter(paciente_id=paciente_id).order_by('-fecha', '-comenzar')
-        serializer = CitaSerializer(citas, many=True, context={'request': request})
+        citas = citas_para_lectura(Cita.objects.filter(paciente_id=paciente_id).order_by('-fecha', '-comenzar'))
+        serializer = CitaLecturaSerializer(citas, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 class EnviarRecordatorioWhatsAppAPIView(APIView):
+    """
+    Encola un recordatorio de WhatsApp por cada cita indicada. El envío lo hace
+    en segundo plano el comando procesar_recordatorios; el estado se consulta
+    en RecordatorioEnvioListAPIView.
+    """
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -131,50 +548,53 @@ class EnviarRecordatorioWhatsAppAPIView(APIView):
             return Response({"error": "Faltan credenciales de Twilio"}, status=400)
 
         citas_ids = request.data.get("citas_ids", [])
-        print(f"Citas IDs recibidos: {citas_ids}")
         if not isinstance(citas_ids, list):
             return Response({"error": "Se requiere una lista de IDs de citas"}, status=400)
 
         if not citas_ids:
             return Response({"error": "Se requiere al menos un ID de cita"}, status=400)
 
-        citas = Cita.objects.select_related("paciente").filter(id__in=citas_ids, user=user)
-        print(f"Citas encontradas: {citas}")
-        if not citas.exists():
+        citas = list(Cita.objects.select_related("paciente", "paciente__grupo").filter(id__in=citas_ids, user=user))
+        if not citas:
             return Response({"message": "No hay citas encontradas con esos IDs"}, status=404)
 
-        client = Client(user_info.twilio_account_sid, user_info.twilio_auth_token)
-        resultados = []
-
-        try:
-            locale.setlocale(locale.LC_TIME, 'es_ES.UTF-8')
-        except locale.Error:
-            locale.setlocale(locale.LC_TIME, 'es_ES')
-
+        recordatorios = []
+        omitidas = []
         for cita in citas:
             paciente = cita.paciente
-            print(f"Cita {cita.id} tiene worker: {cita.worker}")
-            if not paciente.phone:
+            if not paciente or not paciente.phone:
+                omitidas.append(cita.id)
                 continue
 
-            fecha = cita.fecha
-            comenzar = cita.comenzar
+            recordatorios.append(RecordatorioEnvio(
+                cita=cita,
+                user=user,
+                telefono=paciente.phone,
+                mensaje=texto_recordatorio(cita),
+            ))
+
+        recordatorios = RecordatorioEnvio.objects.bulk_create(recordatorios)
+        serializer = RecordatorioEnvioSerializer(recordatorios, many=True)
+        return Response({"recordatorios": serializer.data, "omitidas": omitidas}, status=status.HTTP_202_ACCEPTED)
 
-            dia = fecha.day
-            mes = fecha.strftime('%B').lower()  # mes en minúsculas
-            hora = comenzar.strftime('%H:%M') + " h"
 
-            texto = (
-                        f"Buenos días! Te recuerdo que mañana {dia} de {mes} tienes cita de {paciente.grupo} "
-                        f"con nosotras en la clínica Actúa a las {hora}. Agradecemos que confirméis vuestra "
-                        f"cita lo antes posible para así, en caso de ser necesario, poder hacer las modificaciones necesarias. "
-                        "Un abrazo, equipo Actúa."
-                    )
-            resultado = enviar_mensaje_whatsapp(client, user_info.whatsapp_business_number, paciente.phone, texto)
-            resultado["paciente"] = paciente.nombre
-            resultados.append(resultado)
+class RecordatorioEnvioListAPIView(ListAPIView):
+    """
+    Estado de los recordatorios del usuario. Admite ?ids=1,2,3 para consultar
+    los devueltos al encolar; sin filtro devuelve los más recientes.
+    """
+    serializer_class = RecordatorioEnvioSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+
+    def get_queryset(self):
+        queryset = RecordatorioEnvio.objects.filter(user=self.request.user).order_by('-created_at')
 
-        return Response({"mensajes_enviados": resultados}, status=200)
+        ids = self.request.query_params.get('ids')
+        if ids:
+            ids = [valor for valor in ids.split(',') if valor.strip().isdigit()]
+            return queryset.filter(id__in=ids)
+        return queryset[:MAX_RECORDATORIOS_LISTADO]
 
 
 class ConfiguracionPrecioGlobal(RetrieveUpdateDestroyAPIView):
@@ -0,0 +1,88 @@
+import itertools
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+MESES = (
+    'enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio',
+    'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre',
+)
+
+# Códigos HTTP de Twilio que merece la pena reintentar
+ESTADOS_TRANSITORIOS = {429, 500, 502, 503, 504}
+
+
+def get_whatsapp_client(account_sid, auth_token):
+    """
+    Crea el cliente configurado en WHATSAPP_CLIENT (por defecto el de Twilio).
+    Los tests y el desarrollo local usan FakeWhatsAppClient.
+    """
+    client_class = import_string(getattr(settings, 'WHATSAPP_CLIENT', 'twilio.rest.Client'))
+    return client_class(account_sid, auth_token)
+
+
+def texto_recordatorio(cita):
+    """
+    Mensaje de recordatorio de la cita. El mes se escribe en castellano sin
+    depender del locale del proceso.
+    """
+    paciente = cita.paciente
+    dia = cita.fecha.day
+    mes = MESES[cita.fecha.month - 1]
+    hora = cita.comenzar.strftime('%H:%M') + " h"
+
+    return (
+        f"Buenos días! Te recuerdo que mañana {dia} de {mes} tienes cita de {paciente.grupo} "
+        f"con nosotras en la clínica Actúa a las {hora}. Agradecemos que confirméis vuestra "
+        f"cita lo antes posible para así, en caso de ser necesario, poder hacer las modificaciones necesarias. "
+        "Un abrazo, equipo Actúa."
+    )
+
+
+def es_error_transitorio(error):
+    status = getattr(error, 'status', None)
+    if status is not None:
+        return status in ESTADOS_TRANSITORIOS
+    # Errores de red (timeouts, conexiones cortadas): las excepciones de
+    # requests heredan de OSError
+    return isinstance(error, OSError)
+
+
+def enviar_mensaje_whatsapp(client, from_number, to_number, mensaje):
+    try:
+        message = client.messages.create(
+            from_=f"whatsapp:{from_number}",
+            to=f"whatsapp:{to_number}",
+            body=mensaje
+        )
+        return {"telefono": to_number, "status": message.status, "sid": message.sid}
+    except Exception as e:
+        return {"telefono": to_number, "error": str(e), "transitorio": es_error_transitorio(e)}
+
+
+class FakeMessage:
+    def __init__(self, sid, status='queued'):
+        self.sid = sid
+        self.status = status
+
+
+class FakeWhatsAppClient:
+    """
+    Cliente local con la misma interfaz que twilio.rest.Client para los
+    mensajes. Guarda lo enviado en FakeWhatsAppClient.outbox; los números de
+    FakeWhatsAppClient.fallos lanzan la excepción indicada.
+    """
+    outbox = []
+    fallos = {}
+    _contador = itertools.count(1)
+
+    def __init__(self, account_sid=None, auth_token=None):
+        self.account_sid = account_sid
+        self.messages = self
+
+    def create(self, from_, to, body):
+        error = self.fallos.get(to.removeprefix('whatsapp:'))
+        if error is not None:
+            raise error
+        mensaje = FakeMessage(f"SM{next(self._contador):032d}")
+        self.outbox.append({"account_sid": self.account_sid, "from": from_, "to": to, "body": body, "sid": mensaje.sid})
+        return mensaje
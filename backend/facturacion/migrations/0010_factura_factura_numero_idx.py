@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0022_recordatorioenvio'),
+        ('facturacion', '0009_alter_factura_cita'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['-numero_factura', '-id'], name='factura_numero_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:51
+
+import almacenamiento.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0010_factura_factura_numero_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='factura',
+            name='pdf',
+            field=models.FileField(blank=True, null=True, storage=almacenamiento.storage.AlmacenamientoPorContenido(), upload_to='facturas/'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0011_alter_factura_pdf'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factura',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
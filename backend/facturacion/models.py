@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from citas.models import Cita
+from almacenamiento.storage import almacenamiento_por_contenido
 
 def get_default_user():
     default_user = User.objects.filter(is_superuser=True).first() or User.objects.first()
@@ -11,9 +12,16 @@ class Factura(models.Model):
     numero_factura = models.IntegerField()
     total = models.DecimalField(max_digits=10, decimal_places=2, default=25)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
-    pdf = models.FileField(upload_to='facturas/', blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    pdf = models.FileField(upload_to='facturas/', storage=almacenamiento_por_contenido, blank=True, null=True)
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, default=get_default_user)
 
+    class Meta:
+        indexes = [
+            # Listado de facturas y paginación por cursor (-numero_factura, -id)
+            models.Index(fields=['-numero_factura', '-id'], name='factura_numero_idx'),
+        ]
+
     def __str__(self):
         paciente = getattr(self.cita, 'paciente', None)
         nombre_paciente = paciente.nombre if paciente else "Desconocido"
@@ -59,6 +59,7 @@ class FacturaAPITestCase(APITestCase):
             city="Ciudad",
             code_postal="28080",
             country="España",
+            grupo=self.group_fisio,
         )
 
         # Usuarios para el worker
@@ -101,6 +102,54 @@ class FacturaAPITestCase(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_list_facturas_por_cursor(self):
+        for numero in (1003, 1001, 1002):
+            cita = Cita.objects.create(
+                paciente=self.paciente, user=self.user_fisio, fecha=date.today(),
+                comenzar=time(12, 0), finalizar=time(13, 0), cotizada=True,
+            )
+            Factura.objects.create(cita=cita, numero_factura=numero, usuario=self.user_fisio)
+
+        url = reverse("factura-list-create")
+        response = self.client.get(url, {"cursor": "", "page_size": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", response.data)
+        self.assertEqual([f["numero_factura"] for f in response.data["results"]], [1003, 1002])
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual([f["numero_factura"] for f in response.data["results"]], [1001])
+        self.assertIsNone(response.data["next"])
+
+    def test_exportar_facturas(self):
+        Factura.objects.create(cita=self.cita, numero_factura=1000, usuario=self.user_fisio)
+
+        response = self.client.get(reverse("factura-exportar"), {"formato": "ndjson", "filtro": "hoy"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lineas = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lineas), 1)
+        self.assertIn('"paciente_dni": "12345678A"', lineas[0])
+
+    def test_exportar_facturas_solo_de_sus_grupos(self):
+        Factura.objects.create(cita=self.cita, numero_factura=1000, usuario=self.user_fisio)
+        otro_grupo = Group.objects.create(name="Psicología")
+        otro_paciente = Paciente.objects.create(
+            nombre="Paciente2", primer_apellido="Apellido1", segundo_apellido="Apellido2",
+            email="paciente2@example.com", phone="987654321", fecha_nacimiento=date(1990, 1, 1),
+            dni="87654321B", address="Calle Falsa 123", city="Ciudad", code_postal="28080",
+            country="España", grupo=otro_grupo,
+        )
+        otra_cita = Cita.objects.create(
+            paciente=otro_paciente, user=self.user_fisio, fecha=date.today(),
+            comenzar=time(12, 0), finalizar=time(13, 0), cotizada=True,
+        )
+        Factura.objects.create(cita=otra_cita, numero_factura=1001, usuario=self.user_fisio)
+
+        response = self.client.get(reverse("factura-exportar"), {"formato": "ndjson"})
+        lineas = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lineas), 1)
+        self.assertIn('"numero_factura": 1000', lineas[0])
+        self.assertNotIn("87654321B", lineas[0])
+
     def test_create_factura_sin_cita(self):
         url = reverse("factura-list-create")
         data = {}  # No paso cita
@@ -1,10 +1,13 @@
 from django.urls import path
-from .views import FacturaViewSet, FacturaPDFView, FacturasPorPacienteView, ConfiguracionFacturaView
+from .views import FacturaViewSet, FacturaExportView, FacturaPDFView, FacturasPorPacienteView, ConfiguracionFacturaView
 
 urlpatterns = [
     # Endpoint para listar y crear facturas con paginación y filtros
     path("", FacturaViewSet.as_view(), name="factura-list-create"),
 
+    # Endpoint para exportar las facturas (CSV o NDJSON)
+    path("exportar/", FacturaExportView.as_view(), name="factura-exportar"),
+
     # Endpoint para obtener/eliminar una factura en PDF por su ID
     path("<int:pk>/pdf/", FacturaPDFView.as_view(), name="factura-pdf"),
 
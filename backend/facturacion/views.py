@@ -1,4 +1,5 @@
 from rest_framework import generics, status
+from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
@@ -14,12 +15,47 @@ from .models import Factura, ConfiguracionFactura
 from citas.models import Cita
 from .serializers import FacturaSerializer, ConfiguracionFacturaSerializer
 from .utils import generar_pdf_factura, generar_pdf_factura_irpf
+from backend.roles import get_roles
+from backend.pagination import KeysetPaginationMixin
+from backend.exportacion import FORMATOS, respuesta_exportacion
 
-class FacturaPagination(PageNumberPagination):
+class FacturaPagination(KeysetPaginationMixin, PageNumberPagination):
     page_size = 10  # Cantidad de facturas por página
+    keyset_ordering = ('-numero_factura', '-id')  # Con ?cursor= se pagina por cursor
     page_size_query_param = "page_size"  # Permitir que el usuario cambie el tamaño de página
     max_page_size = 50  # Máximo de facturas por página
 
+def filtrar_facturas(queryset, params):
+    """
+    Filtros del listado de facturas (?filtro=hoy|semana|mes|año o ?fecha=YYYY-MM-DD),
+    compartidos con la exportación.
+    """
+    filtro = params.get("filtro", None)
+    fecha = params.get("fecha", None)  # Recibe una fecha en formato 'YYYY-MM-DD'
+
+    if filtro == "hoy":
+        queryset = queryset.filter(fecha_creacion__date=now().date())
+
+    elif filtro == "semana":
+        semana_inicio = now() - timedelta(days=now().weekday())  # Inicio de la semana
+        queryset = queryset.filter(fecha_creacion__date__gte=semana_inicio)
+
+    elif filtro == "mes":
+        queryset = queryset.filter(fecha_creacion__year=now().year, fecha_creacion__month=now().month)
+
+    elif filtro == "año":
+        queryset = queryset.filter(fecha_creacion__year=now().year)
+
+    elif fecha:
+        try:
+            from datetime import datetime
+            fecha_obj = datetime.strptime(fecha, "%Y-%m-%d").date()
+            queryset = queryset.filter(fecha_creacion__date=fecha_obj)
+        except ValueError:
+            pass  # Si el formato es incorrecto, no aplica el filtro
+
+    return queryset
+
 # Listar y crear Factura
 class FacturaViewSet(generics.ListCreateAPIView):
     queryset = Factura.objects.all()
@@ -28,32 +64,8 @@ class FacturaViewSet(generics.ListCreateAPIView):
     pagination_class = FacturaPagination
 
     def get_queryset(self):
-        queryset = Factura.objects.all().order_by("-numero_factura")
-        filtro = self.request.query_params.get("filtro", None)
-        fecha = self.request.query_params.get("fecha", None)  # Recibe una fecha en formato 'YYYY-MM-DD'
-
-        if filtro == "hoy":
-            queryset = queryset.filter(fecha_creacion__date=now().date())
-
-        elif filtro == "semana":
-            semana_inicio = now() - timedelta(days=now().weekday())  # Inicio de la semana
-            queryset = queryset.filter(fecha_creacion__date__gte=semana_inicio)
-
-        elif filtro == "mes":
-            queryset = queryset.filter(fecha_creacion__year=now().year, fecha_creacion__month=now().month)
-
-        elif filtro == "año":
-            queryset = queryset.filter(fecha_creacion__year=now().year)
-
-        elif fecha:
-            try:
-                from datetime import datetime
-                fecha_obj = datetime.strptime(fecha, "%Y-%m-%d").date()
-                queryset = queryset.filter(fecha_creacion__date=fecha_obj)
-            except ValueError:
-                pass  # Si el formato es incorrecto, no aplica el filtro
-
-        return queryset
+        queryset = Factura.objects.all().order_by("-numero_factura", "-id")
+        return filtrar_facturas(queryset, self.request.query_params)
 
     def post(self, request, *args, **kwargs):
         cita_id = request.data.get("cita")
@@ -74,7 +86,7 @@ class FacturaViewSet(generics.ListCreateAPIView):
 
         usuario_actual = request.user
 
-        if usuario_actual.groups.filter(name="Fisioterapia").exists():
+        if get_roles(request).is_fisio:
             usuario_admin_fisio = User.objects.filter(groups__name="Admin").filter(groups__name="Fisioterapia").first()
             if not usuario_admin_fisio:
                 return Response({"error": "No se encontró ningún usuario Admin en Fisioterapia"}, status=status.HTTP_400_BAD_REQUEST)
@@ -156,14 +168,47 @@ class FacturaPDFView(generics.RetrieveDestroyAPIView):
 
     def delete(self, request, *args, **kwargs):
         factura = self.get_object()
-        if factura.pdf and os.path.exists(factura.pdf.path):
-            os.remove(factura.pdf.path)
+        if factura.pdf:
+            factura.pdf.delete(save=False)
         factura.delete()
         return Response({"message": "Factura eliminada"}, status=status.HTTP_204_NO_CONTENT)
 
+COLUMNAS_EXPORTACION_FACTURAS = [
+    ("id", "id"),
+    ("numero_factura", "numero_factura"),
+    ("fecha_creacion", "fecha_creacion"),
+    ("total", "total"),
+    ("cita_id", "cita_id"),
+    ("cita__fecha", "cita_fecha"),
+    ("cita__metodo_pago", "metodo_pago"),
+    ("cita__pagado", "pagado"),
+    ("cita__irpf", "irpf"),
+    ("cita__paciente__nombre", "paciente_nombre"),
+    ("cita__paciente__primer_apellido", "paciente_primer_apellido"),
+    ("cita__paciente__segundo_apellido", "paciente_segundo_apellido"),
+    ("cita__paciente__dni", "paciente_dni"),
+]
+
+# Exportar facturas (CSV o NDJSON) con los mismos filtros que el listado
+class FacturaExportView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        formato = request.query_params.get("formato", "csv")
+        if formato not in FORMATOS:
+            return Response({"error": "formato debe ser csv o ndjson"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Solo las facturas de pacientes de los grupos del usuario
+        queryset = Factura.objects.filter(
+            cita__paciente__grupo_id__in=get_roles(request).tenant_group_ids
+        ).order_by("-numero_factura", "-id")
+        queryset = filtrar_facturas(queryset, request.query_params)
+        return respuesta_exportacion(queryset, COLUMNAS_EXPORTACION_FACTURAS, "facturas", formato)
+
 # Paginación para los pacientes
-class FacturaPacientePagination(PageNumberPagination):
+class FacturaPacientePagination(KeysetPaginationMixin, PageNumberPagination):
     page_size = 10  # Cantidad de facturas por página
+    keyset_ordering = ('-fecha_creacion', '-id')  # Con ?cursor= se pagina por cursor
     page_size_query_param = "page_size"
     max_page_size = 50  # Máximo de facturas por página
 
@@ -179,7 +224,7 @@ class FacturasPorPacienteView(generics.ListAPIView):
         if not paciente_id:
             return Factura.objects.none()
 
-        queryset = Factura.objects.filter(cita__paciente_id=paciente_id).order_by("-fecha_creacion")
+        queryset = Factura.objects.filter(cita__paciente_id=paciente_id).order_by("-fecha_creacion", "-id")
 
         # Filtros
         mes = self.request.query_params.get("mes", None)
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:37
+
+import datetime
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0002_alter_note_created_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(models.OrderBy(models.F('is_important'), descending=True), django.db.models.functions.comparison.Coalesce('reminder_date', models.Value(datetime.date(9999, 12, 31), output_field=models.DateField())), models.F('created_at'), models.F('id'), name='note_orden_idx'),
+        ),
+    ]
@@ -1,4 +1,14 @@
+from datetime import date
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+
+# Las notas sin recordatorio se ordenan después de todas las que tienen
+FECHA_SIN_RECORDATORIO = date(9999, 12, 31)
+
+
+def recordatorio_orden():
+    return Coalesce('reminder_date', Value(FECHA_SIN_RECORDATORIO, output_field=models.DateField()))
 
 class Note(models.Model):
     titulo = models.CharField(max_length=255)
@@ -8,5 +18,14 @@ class Note(models.Model):
     color = models.CharField(max_length=20, default='#FFEE8C')
     is_important = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Mismo orden que get_sorted_notes (notes/views.py)
+            models.Index(
+                F('is_important').desc(), recordatorio_orden(), 'created_at', 'id',
+                name='note_orden_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.titulo
@@ -1,3 +1,43 @@
+from datetime import date, timedelta
+from django.contrib.auth.models import User
 from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from .models import Note
 
-# Create your tests here.
+
+class NotesPaginacionTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='notas', password='testpass')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+        manana = date.today() + timedelta(days=1)
+        self.sin_recordatorio = Note.objects.create(titulo="Sin recordatorio", contenido="-")
+        self.con_recordatorio = Note.objects.create(titulo="Con recordatorio", contenido="-", reminder_date=manana)
+        self.importante = Note.objects.create(titulo="Importante", contenido="-", is_important=True)
+        self.otra = Note.objects.create(titulo="Otra", contenido="-")
+        # Más notas que el tamaño de página (5) para que haya que seguir 'next'
+        self.resto = [Note.objects.create(titulo=f"Resto {i}", contenido="-") for i in range(4)]
+
+    def test_orden_por_cursor_igual_que_por_pagina(self):
+        # Importantes primero, luego por recordatorio (sin recordatorio al final) y por antigüedad
+        esperados = [self.importante.id, self.con_recordatorio.id, self.sin_recordatorio.id, self.otra.id]
+        esperados += [nota.id for nota in self.resto]
+
+        paginas = []
+        url = '/notas/'
+        while url:
+            response = self.client.get(url)
+            paginas.append([n['id'] for n in response.data['results']])
+            url = response.data['next']
+        self.assertEqual(paginas, [esperados[:5], esperados[5:]])
+        self.assertEqual(response.data['count'], 8)
+
+        paginas = []
+        url = '/notas/?cursor='
+        while url:
+            response = self.client.get(url)
+            paginas.append([n['id'] for n in response.data['results']])
+            url = response.data['next']
+        self.assertEqual(paginas, [esperados[:5], esperados[5:]])
@@ -5,16 +5,18 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 from django.utils.timezone import now
 from datetime import date, datetime
-from .models import Note
+from .models import Note, recordatorio_orden
 from .serializers import NoteSerializer
-from django.db.models import Case, When, Value, IntegerField, ExpressionWrapper, F
-from django.db.models.functions import Abs
+from backend.pagination import KeysetPaginationMixin
 
-# Paginación de las notas
-class CustomPagination(PageNumberPagination):
+# Paginación de las notas (con ?cursor= se pagina por cursor)
+class CustomPagination(KeysetPaginationMixin, PageNumberPagination):
     page_size = 5
+    keyset_ordering = ('-is_important', 'recordatorio_orden', 'created_at', 'id')
 
     def get_paginated_response(self, data):
+        if self.keyset:
+            return super().get_paginated_response(data)
         return Response({
             'total_pages': self.page.paginator.num_pages,
             'count': self.page.paginator.count,
@@ -28,25 +30,21 @@ class CustomPagination(PageNumberPagination):
 # 1. Primero, notas importantes
 # 2. Luego, notas con recordatorio en la fecha actual
 # 3. Finalmente, las demás notas ordenadas por fecha de creación
+# Las notas sin recordatorio van al final y el id desempata, igual en
+# PostgreSQL que en SQLite (note_orden_idx cubre este orden)
 
 
 def get_sorted_notes(queryset=None):
     if queryset is None:
         queryset = Note.objects.all()
 
-    today = date.today()
-
     return queryset.annotate(
-        # 1. Asigna prioridad a las notas importantes
-        importancia_orden=Case(
-            When(is_important=True, then=Value(1)),  # Prioridad 0 para importantes
-            default=Value(2),  # Prioridad 1 para las demás
-            output_field=IntegerField()
-        ),
+        recordatorio_orden=recordatorio_orden(),
     ).order_by(
-        'importancia_orden',  # Primero las importantes
-        'reminder_date',       # Luego por fecha de recordatorio
-        'created_at'           # Finalmente, por fecha de creación
+        '-is_important',       # Primero las importantes
+        'recordatorio_orden',  # Luego por fecha de recordatorio
+        'created_at',          # Finalmente, por fecha de creación
+        'id'
     )
 
 # Función para validar y convertir fecha de recordatorio
@@ -0,0 +1,126 @@
+import threading
+import uuid
+from bisect import bisect_left
+from django.core.cache import cache
+from django.db import transaction
+from .busqueda import normalizar_texto
+from .models import Paciente
+from .serializers_simple import PacienteCitaSerializer
+
+CAMPOS = PacienteCitaSerializer.Meta.fields
+
+
+def cache_key_version(grupo_id):
+    return f"pacientes:autocompletar:version:{grupo_id}"
+
+
+def get_version(grupo_id):
+    """
+    Versión del índice del grupo. Vive en la caché de Django para que todos
+    los procesos se enteren de las invalidaciones; si la caché se vacía se
+    genera una versión nueva y los índices en memoria se reconstruyen.
+    """
+    key = cache_key_version(grupo_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidar_autocompletado(grupo_id):
+    if grupo_id is None:
+        return
+    key = cache_key_version(grupo_id)
+    cache.set(key, uuid.uuid4().hex, None)
+    # Se vuelve a cambiar al confirmar por si otro proceso reconstruyó el
+    # índice con los datos anteriores antes del commit
+    transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, None))
+
+
+class IndicePrefijos:
+    """
+    Pacientes de un grupo con sus palabras de búsqueda ordenadas, de modo que
+    los que tienen alguna palabra que empieza por un prefijo se encuentran con
+    una búsqueda binaria.
+    """
+    def __init__(self, filas):
+        self.pacientes = {}
+        self.busqueda = {}
+        palabras = []
+        for fila in filas:
+            paciente = {campo: fila[campo] for campo in CAMPOS}
+            self.pacientes[paciente['id']] = paciente
+            self.busqueda[paciente['id']] = fila['busqueda']
+            palabras.extend((palabra, paciente['id']) for palabra in set(fila['busqueda'].split()))
+        palabras.sort()
+        self.palabras = [palabra for palabra, _ in palabras]
+        self.ids = [paciente_id for _, paciente_id in palabras]
+
+    def con_prefijo(self, prefijo):
+        ids = set()
+        i = bisect_left(self.palabras, prefijo)
+        while i < len(self.palabras) and self.palabras[i].startswith(prefijo):
+            ids.add(self.ids[i])
+            i += 1
+        return ids
+
+    def buscar(self, palabras):
+        """
+        (relevancia, paciente) de los pacientes en los que cada palabra del
+        término es el principio de alguna de sus palabras.
+        """
+        candidatos = self.con_prefijo(palabras[0])
+        for palabra in palabras[1:]:
+            if not candidatos:
+                break
+            candidatos &= self.con_prefijo(palabra)
+
+        termino = " ".join(palabras)
+        return [
+            (0 if self.busqueda[paciente_id].startswith(termino) else 1, self.pacientes[paciente_id])
+            for paciente_id in candidatos
+        ]
+
+
+_indices = {}
+_lock = threading.Lock()
+
+
+def get_indice(grupo_id):
+    version = get_version(grupo_id)
+    actual = _indices.get(grupo_id)
+    if actual and actual[0] == version:
+        return actual[1]
+
+    with _lock:
+        actual = _indices.get(grupo_id)
+        if actual and actual[0] == version:
+            return actual[1]
+        filas = Paciente.objects.filter(grupo_id=grupo_id).values(*CAMPOS, 'busqueda')
+        indice = IndicePrefijos(filas)
+        _indices[grupo_id] = (version, indice)
+        return indice
+
+
+def autocompletar(grupo_ids, termino, limite=10):
+    """
+    Pacientes de los grupos indicados que encajan con lo tecleado, con los
+    campos de PacienteCitaSerializer. Primero los que empiezan por el término
+    y después el resto, cada bloque en orden alfabético.
+    """
+    palabras = normalizar_texto(termino).split()
+    if not palabras:
+        return []
+
+    resultados = []
+    for grupo_id in grupo_ids:
+        resultados.extend(get_indice(grupo_id).buscar(palabras))
+
+    def orden(resultado):
+        relevancia, paciente = resultado
+        nombre = f"{paciente['nombre']} {paciente['primer_apellido']} {paciente['segundo_apellido']}"
+        return relevancia, normalizar_texto(nombre), paciente['id']
+
+    resultados.sort(key=orden)
+    return [paciente for _, paciente in resultados[:limite]]
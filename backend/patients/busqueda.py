@@ -0,0 +1,57 @@
+import re
+import unicodedata
+from django.db.models import Case, IntegerField, Value, When
+
+# Campos del paciente que forman la columna de búsqueda
+CAMPOS_BUSQUEDA = ('nombre', 'primer_apellido', 'segundo_apellido', 'dni', 'phone')
+
+
+def normalizar_texto(texto):
+    """
+    Minúsculas, sin tildes ni diéresis y con los espacios colapsados:
+    "José  Núñez" -> "jose nunez".
+    """
+    if not texto:
+        return ""
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", texto).strip().lower()
+
+
+def texto_busqueda(paciente):
+    """
+    Valor de Paciente.busqueda: nombre completo, DNI y teléfono normalizados.
+    El teléfono se guarda sin espacios para poder buscarlo tal como se teclea.
+    """
+    partes = [
+        paciente.nombre,
+        paciente.primer_apellido,
+        paciente.segundo_apellido,
+        paciente.dni,
+        (paciente.phone or "").replace(" ", ""),
+    ]
+    return normalizar_texto(" ".join(p for p in partes if p))
+
+
+def buscar_pacientes(queryset, termino):
+    """
+    Filtra por Paciente.busqueda: cada palabra del término tiene que aparecer
+    en la columna (en PostgreSQL lo resuelve el índice trigram). Los
+    resultados se ordenan por relevancia: primero los que empiezan por el
+    término, luego los que tienen una palabra que empieza por él y al final el
+    resto.
+    """
+    termino = normalizar_texto(termino)
+    if not termino:
+        return queryset
+
+    for palabra in termino.split(" "):
+        queryset = queryset.filter(busqueda__contains=palabra)
+
+    relevancia = Case(
+        When(busqueda__startswith=termino, then=Value(0)),
+        When(busqueda__contains=f" {termino}", then=Value(1)),
+        default=Value(2),
+        output_field=IntegerField(),
+    )
+    return queryset.annotate(relevancia=relevancia).order_by('relevancia', *queryset.model._meta.ordering, 'id')
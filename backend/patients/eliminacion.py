@@ -0,0 +1,104 @@
+"""
+Eliminación de pacientes en dos pasos.
+
+Al eliminar un paciente desde la API se marca 'eliminado_en': deja de
+aparecer en listados, búsquedas y autocompletado sin esperar a borrar su
+historial. En ese momento solo se borra su agenda pendiente (citas desde hoy,
+series y recordatorios sin enviar) para que no ocupe huecos ni reciba avisos.
+El comando purgar_pacientes borra después, por lotes y cada lote en
+su propia transacción, las citas (con sus facturas y recordatorios), los
+documentos y las subidas, y al final el propio paciente y su directorio
+pacientes/<uuid>/ del storage. Los ficheros de las filas (PDFs de facturas,
+documentos, miniaturas, PDFs firmados) los sueltan las señales de
+almacenamiento al borrarse cada fila.
+"""
+import logging
+import shutil
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from citas.models import Cita, RecordatorioEnvio, SerieCita
+from .models import Paciente, PacienteDocumentacion
+from .subidas import borrar_fragmentos
+
+logger = logging.getLogger(__name__)
+
+TAMAÑO_LOTE = 200
+
+
+def marcar_eliminado(paciente):
+    with transaction.atomic():
+        paciente.eliminado_en = timezone.now()
+        paciente.save(update_fields=['eliminado_en'])
+        # Las series primero: así borrar sus citas no anula ocurrencias una a una
+        SerieCita.objects.filter(paciente_id=paciente.pk).delete()
+        # delete() envía post_delete por cita: la sincronización y el feed de
+        # calendario reciben la marca de borrado
+        Cita.objects.filter(paciente_id=paciente.pk, fecha__gte=timezone.localdate()).delete()
+        RecordatorioEnvio.objects.filter(
+            cita__paciente_id=paciente.pk, estado=RecordatorioEnvio.PENDIENTE
+        ).delete()
+
+
+def borrar_por_lotes(queryset, tamaño_lote):
+    """
+    Borra las filas del queryset en lotes de 'tamaño_lote', cada uno en su
+    transacción para no bloquear las tablas durante toda la purga.
+    """
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:tamaño_lote])
+            if not ids:
+                return
+            queryset.model._base_manager.filter(pk__in=ids).delete()
+
+
+def borrar_directorio(ruta):
+    try:
+        directorio = default_storage.path(ruta)
+    except NotImplementedError:
+        # Storage remoto: ahí no hay directorios que limpiar
+        return
+    shutil.rmtree(directorio, ignore_errors=True)
+
+
+def purgar_paciente(paciente_id, tamaño_lote=TAMAÑO_LOTE):
+    """
+    Borra un paciente marcado como eliminado y todo lo que depende de él.
+    Si se interrumpe se puede volver a lanzar: continúa donde lo dejó.
+    """
+    paciente = Paciente.todos.filter(pk=paciente_id, eliminado_en__isnull=False).first()
+    if paciente is None:
+        return False
+
+    borrar_por_lotes(Cita.objects.filter(paciente_id=paciente.pk), tamaño_lote)
+    borrar_por_lotes(PacienteDocumentacion.objects.filter(paciente_id=paciente.pk), tamaño_lote)
+    for subida in paciente.subidas.all():
+        borrar_fragmentos(subida)
+        subida.delete()
+
+    with transaction.atomic():
+        paciente.delete()
+        # Después de que las señales hayan soltado los ficheros de las filas,
+        # lo que quede en el directorio del paciente ya no lo usa nadie
+        transaction.on_commit(lambda: borrar_directorio(f"pacientes/{paciente.uuid}"))
+    return True
+
+
+def purgar_pacientes_eliminados(limite=10, tamaño_lote=TAMAÑO_LOTE):
+    """
+    Purga hasta 'limite' pacientes eliminados, los más antiguos primero.
+    Devuelve cuántos se han purgado.
+    """
+    ids = list(
+        Paciente.todos.filter(eliminado_en__isnull=False)
+        .order_by('eliminado_en')
+        .values_list('id', flat=True)[:limite]
+    )
+    purgados = 0
+    for paciente_id in ids:
+        try:
+            purgados += purgar_paciente(paciente_id, tamaño_lote)
+        except Exception:
+            logger.exception("No se ha podido purgar el paciente %s", paciente_id)
+    return purgados
@@ -0,0 +1,203 @@
+import codecs
+import csv
+from datetime import date, datetime
+from zipfile import BadZipFile
+from django.db import IntegrityError, transaction
+from rest_framework.exceptions import ValidationError
+from .autocompletar import invalidar_autocompletado
+from .busqueda import texto_busqueda
+from .models import Paciente
+from .serializers import PacienteImportacionSerializer
+
+TAMAÑO_LOTE = 1000
+# El informe guarda como mucho este número de filas con error (el total se cuenta siempre)
+MAX_ERRORES_INFORME = 500
+VALORES_SI = {'si', 'sí', 's', 'true', '1', 'x', 'yes'}
+
+
+class ErrorImportacion(Exception):
+    pass
+
+
+def decodificar_lineas(fichero):
+    """
+    Líneas del fichero como texto. Se lee UTF-8, con o sin BOM; las líneas
+    que no lo son se leen como Windows-1252, que es lo que guarda Excel en
+    castellano.
+    """
+    for numero, linea in enumerate(fichero):
+        if numero == 0 and linea.startswith(codecs.BOM_UTF8):
+            linea = linea[len(codecs.BOM_UTF8):]
+        try:
+            yield linea.decode('utf-8')
+        except UnicodeDecodeError:
+            try:
+                yield linea.decode('cp1252')
+            except UnicodeDecodeError:
+                raise ErrorImportacion(
+                    f"No se puede leer la línea {numero + 1}: el fichero debe estar en UTF-8 o Windows-1252"
+                )
+
+
+def leer_csv(fichero):
+    """
+    Lee el CSV fila a fila. Acepta ',' o ';' como separador (Excel en
+    castellano exporta con ';') y UTF-8 o Windows-1252 (ver decodificar_lineas).
+    """
+    texto = decodificar_lineas(fichero)
+    muestra = next(texto, '')
+    delimitador = ';' if muestra.count(';') > muestra.count(',') else ','
+    lector = csv.reader(texto, delimiter=delimitador)
+    cabecera = next(csv.reader([muestra], delimiter=delimitador), [])
+    for valores in lector:
+        yield dict(zip(cabecera, valores))
+
+
+def leer_xlsx(fichero):
+    try:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        raise ErrorImportacion("Para importar ficheros .xlsx hace falta instalar openpyxl")
+
+    # read_only recorre la hoja sin cargarla entera en memoria
+    try:
+        libro = load_workbook(fichero, read_only=True, data_only=True)
+    except (BadZipFile, InvalidFileException, KeyError):
+        raise ErrorImportacion("El fichero .xlsx está dañado o no es un libro de Excel")
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        cabecera = [str(c) if c is not None else '' for c in next(filas, [])]
+        for valores in filas:
+            yield dict(zip(cabecera, valores))
+    finally:
+        libro.close()
+
+
+def leer_filas(fichero, nombre):
+    nombre = nombre.lower()
+    if nombre.endswith('.csv'):
+        return leer_csv(fichero)
+    if nombre.endswith('.xlsx'):
+        return leer_xlsx(fichero)
+    raise ErrorImportacion("Formato no soportado: el fichero debe ser .csv o .xlsx")
+
+
+def normalizar_fila(fila):
+    """
+    Adapta una fila leída del fichero a lo que espera el serializer: cabeceras
+    en minúsculas, celdas vacías fuera, números y fechas de Excel a texto o
+    date, 'sí'/'no' en alergias y patologías separadas por comas.
+    """
+    datos = {}
+    for campo, valor in fila.items():
+        campo = (campo or '').strip().lower()
+        if not campo or valor is None:
+            continue
+        if isinstance(valor, datetime):
+            valor = valor.date()
+        elif isinstance(valor, float) and valor.is_integer():
+            valor = str(int(valor))
+        elif not isinstance(valor, date):
+            valor = str(valor).strip()
+            if valor == '':
+                continue
+        datos[campo] = valor
+
+    if 'alergias' in datos:
+        datos['alergias'] = str(datos['alergias']).lower() in VALORES_SI
+    if isinstance(datos.get('patologias'), str):
+        datos['patologias'] = [p.strip() for p in datos['patologias'].split(',') if p.strip()]
+    return datos
+
+
+class Importacion:
+    """
+    Importa pacientes en un grupo. Las filas se leen y validan de una en una
+    y se insertan con bulk_create en lotes de TAMAÑO_LOTE, así que la memoria
+    no depende del tamaño del fichero (salvo el conjunto de emails del grupo).
+    Los duplicados por (grupo, email), tanto con pacientes existentes como
+    dentro del propio fichero, se saltan y se cuentan.
+    """
+    def __init__(self, grupo, tamaño_lote=TAMAÑO_LOTE):
+        self.grupo = grupo
+        self.tamaño_lote = tamaño_lote
+        self.emails = set(Paciente.objects.filter(grupo=grupo).values_list('email', flat=True))
+        # Un solo serializer para todas las filas: construir los campos de un
+        # ModelSerializer en cada fila es lo más caro de la importación
+        self.serializer = PacienteImportacionSerializer()
+        self.lote = []
+        self.filas = 0
+        self.creados = 0
+        self.duplicados = 0
+        self.total_errores = 0
+        self.errores = []
+
+    def error(self, fila, errores):
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES_INFORME:
+            self.errores.append({'fila': fila, 'errores': errores})
+
+    def procesar(self, filas):
+        # La fila 1 es la cabecera
+        for numero, fila in enumerate(filas, start=2):
+            datos = normalizar_fila(fila)
+            if not datos:
+                continue
+            self.filas += 1
+
+            try:
+                validated_data = self.serializer.run_validation(datos)
+            except ValidationError as e:
+                self.error(numero, e.detail)
+                continue
+
+            email = validated_data['email']
+            if email in self.emails:
+                self.duplicados += 1
+                continue
+            self.emails.add(email)
+
+            paciente = Paciente(grupo=self.grupo, **validated_data)
+            # bulk_create no llama a save(): la columna de búsqueda se rellena aquí
+            paciente.busqueda = texto_busqueda(paciente)
+            self.lote.append((numero, paciente))
+            if len(self.lote) >= self.tamaño_lote:
+                self.guardar_lote()
+
+        self.guardar_lote()
+        if self.creados:
+            invalidar_autocompletado(self.grupo.id)
+        return self.informe()
+
+    def guardar_lote(self):
+        if not self.lote:
+            return
+        try:
+            with transaction.atomic():
+                Paciente.objects.bulk_create([paciente for _, paciente in self.lote])
+            self.creados += len(self.lote)
+        except IntegrityError:
+            # Alguien ha creado a la vez un paciente con el mismo email: se
+            # guarda el lote fila a fila para saber cuáles fallan
+            for numero, paciente in self.lote:
+                try:
+                    with transaction.atomic():
+                        paciente.save()
+                    self.creados += 1
+                except IntegrityError:
+                    self.duplicados += 1
+        self.lote = []
+
+    def informe(self):
+        return {
+            'filas': self.filas,
+            'creados': self.creados,
+            'duplicados': self.duplicados,
+            'total_errores': self.total_errores,
+            'errores': self.errores,
+        }
+
+
+def importar_pacientes(fichero, nombre, grupo, tamaño_lote=TAMAÑO_LOTE):
+    return Importacion(grupo, tamaño_lote).procesar(leer_filas(fichero, nombre))
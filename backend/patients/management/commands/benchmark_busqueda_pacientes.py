@@ -0,0 +1,98 @@
+import random
+import statistics
+import time
+from datetime import date
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from patients.busqueda import buscar_pacientes, texto_busqueda
+from patients.models import Paciente
+
+NOMBRES = ['José', 'María', 'Iñaki', 'Lucía', 'Andrés', 'Begoña', 'Raúl', 'Inés', 'Óscar', 'Sofía', 'Jesús', 'Ángela']
+APELLIDOS = [
+    'García', 'Martínez', 'López', 'Sánchez', 'Pérez', 'Gómez', 'Martín', 'Jiménez', 'Ruiz', 'Hernández',
+    'Díaz', 'Moreno', 'Muñoz', 'Álvarez', 'Romero', 'Alonso', 'Gutiérrez', 'Navarro', 'Torres', 'Domínguez',
+    'Vázquez', 'Ramos', 'Gil', 'Ramírez', 'Serrano', 'Blanco', 'Molina', 'Morales', 'Suárez', 'Ortega',
+    'Delgado', 'Castro', 'Ortiz', 'Rubio', 'Marín', 'Sanz', 'Núñez', 'Iglesias', 'Medina', 'Garrido',
+]
+TERMINOS = ['jose', 'Núñez', 'maria lopez', 'garcia', 'ortega', 'inaki', '12345', 'dominguez ramos', 'sof', 'zzz']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la búsqueda de pacientes sobre datos sintéticos. Los pacientes se crean "
+        "dentro de una transacción que se deshace al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pacientes', type=int, default=100_000, help="Pacientes sintéticos a crear")
+        parser.add_argument('--repeticiones', type=int, default=20, help="Veces que se lanza cada búsqueda")
+        parser.add_argument('--umbral', type=float, default=50, help="Tiempo máximo aceptable (ms, p95)")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.medir(options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def medir(self, options):
+        rng = random.Random(42)
+        grupo = Group.objects.create(name=f"benchmark-busqueda-{time.time_ns()}")
+
+        lote = []
+        for i in range(options['pacientes']):
+            paciente = Paciente(
+                nombre=rng.choice(NOMBRES),
+                primer_apellido=rng.choice(APELLIDOS),
+                segundo_apellido=rng.choice(APELLIDOS),
+                email=f"paciente{i}@benchmark.local",
+                phone=f"6{rng.randrange(10**8):08d}",
+                fecha_nacimiento=date(1950 + i % 60, 1 + i % 12, 1 + i % 28),
+                dni=f"{rng.randrange(10**8):08d}X",
+                address="", city="", code_postal="", country="",
+                grupo=grupo,
+            )
+            # bulk_create no pasa por save(), así que la columna se rellena aquí
+            paciente.busqueda = texto_busqueda(paciente)
+            lote.append(paciente)
+            if len(lote) == 5000:
+                Paciente.objects.bulk_create(lote)
+                lote = []
+        if lote:
+            Paciente.objects.bulk_create(lote)
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE patients_paciente")
+
+        self.stdout.write(f"{options['pacientes']} pacientes creados ({connection.vendor})")
+
+        peor = 0
+        queryset = Paciente.objects.filter(grupo=grupo)
+        for termino in TERMINOS:
+            tiempos = []
+            for _ in range(options['repeticiones']):
+                inicio = time.perf_counter()
+                resultados = buscar_pacientes(queryset, termino)
+                # Lo mismo que hace el listado paginado: contar y leer la primera página
+                total = resultados.count()
+                list(resultados[:8])
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+
+            tiempos.sort()
+            p95 = tiempos[max(0, int(len(tiempos) * 0.95) - 1)]
+            peor = max(peor, p95)
+            self.stdout.write(
+                f"{termino!r:20} {total:7d} resultados  mediana {statistics.median(tiempos):7.2f} ms  p95 {p95:7.2f} ms"
+            )
+
+        if peor <= options['umbral']:
+            self.stdout.write(self.style.SUCCESS(f"p95 máximo {peor:.2f} ms (umbral {options['umbral']} ms)"))
+        else:
+            self.stdout.write(self.style.WARNING(f"p95 máximo {peor:.2f} ms supera el umbral de {options['umbral']} ms"))
@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from patients.miniaturas import procesar_miniaturas_pendientes
+
+
+class Command(BaseCommand):
+    help = "Genera las miniaturas pendientes de los documentos de pacientes. Con --once procesa lo pendiente y termina (para cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Procesar las pendientes una vez y salir")
+        parser.add_argument('--lote', type=int, default=50, help="Documentos por iteración")
+        parser.add_argument('--intervalo', type=float, default=10, help="Segundos de espera cuando no hay pendientes")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            procesados = procesar_miniaturas_pendientes(limite=options['lote'])
+            total += procesados
+
+            if procesados:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['intervalo'])
+
+        self.stdout.write(self.style.SUCCESS(f"Miniaturas procesadas: {total}"))
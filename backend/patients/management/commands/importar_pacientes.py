@@ -0,0 +1,37 @@
+import time
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand, CommandError
+from patients.importacion import TAMAÑO_LOTE, ErrorImportacion, importar_pacientes
+
+
+class Command(BaseCommand):
+    help = "Importa pacientes desde un fichero CSV o XLSX en el grupo indicado."
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichero', help="Ruta del fichero .csv o .xlsx")
+        parser.add_argument('--grupo', required=True, help="Nombre del grupo (p. ej. Fisioterapia)")
+        parser.add_argument('--lote', type=int, default=TAMAÑO_LOTE, help="Pacientes insertados por lote")
+
+    def handle(self, *args, **options):
+        try:
+            grupo = Group.objects.get(name=options['grupo'])
+        except Group.DoesNotExist:
+            raise CommandError(f"No existe el grupo {options['grupo']}")
+
+        inicio = time.perf_counter()
+        try:
+            with open(options['fichero'], 'rb') as fichero:
+                informe = importar_pacientes(fichero, options['fichero'], grupo, options['lote'])
+        except (OSError, ErrorImportacion) as e:
+            raise CommandError(str(e))
+        segundos = time.perf_counter() - inicio
+
+        for error in informe['errores']:
+            self.stderr.write(f"Fila {error['fila']}: {error['errores']}")
+        if informe['total_errores'] > len(informe['errores']):
+            self.stderr.write(f"... y {informe['total_errores'] - len(informe['errores'])} filas más con errores")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{informe['filas']} filas en {segundos:.1f} s: {informe['creados']} creados, "
+            f"{informe['duplicados']} duplicados, {informe['total_errores']} con errores"
+        ))
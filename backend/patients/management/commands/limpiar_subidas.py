@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from patients.subidas import limpiar_subidas_caducadas
+
+
+class Command(BaseCommand):
+    help = "Borra las subidas por fragmentos que no se han finalizado a tiempo (SUBIDAS_CADUCIDAD) y sus fragmentos."
+
+    def handle(self, *args, **options):
+        total = limpiar_subidas_caducadas()
+        self.stdout.write(self.style.SUCCESS(f"Subidas caducadas borradas: {total}"))
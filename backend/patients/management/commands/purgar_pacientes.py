@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from patients.eliminacion import TAMAÑO_LOTE, purgar_pacientes_eliminados
+
+
+class Command(BaseCommand):
+    help = "Borra los datos y ficheros de los pacientes eliminados. Con --once purga lo pendiente y termina (para cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Purgar los pendientes una vez y salir")
+        parser.add_argument('--lote', type=int, default=TAMAÑO_LOTE, help="Filas borradas por transacción")
+        parser.add_argument('--intervalo', type=float, default=60, help="Segundos de espera cuando no hay pendientes")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            purgados = purgar_pacientes_eliminados(tamaño_lote=options['lote'])
+            total += purgados
+
+            if purgados:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['intervalo'])
+
+        self.stdout.write(self.style.SUCCESS(f"Pacientes purgados: {total}"))
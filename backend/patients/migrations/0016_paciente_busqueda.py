@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:32
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+def texto_busqueda(paciente):
+    # Copia de patients.busqueda.texto_busqueda tal como estaba al crear la
+    # migración, para que cambios posteriores no alteren su resultado
+    partes = [
+        paciente.nombre,
+        paciente.primer_apellido,
+        paciente.segundo_apellido,
+        paciente.dni,
+        (paciente.phone or "").replace(" ", ""),
+    ]
+    texto = unicodedata.normalize('NFKD', " ".join(p for p in partes if p))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", texto).strip().lower()
+
+
+def rellenar_busqueda(apps, schema_editor):
+    Paciente = apps.get_model('patients', 'Paciente')
+    lote = []
+    for paciente in Paciente.objects.only(
+        'id', 'nombre', 'primer_apellido', 'segundo_apellido', 'dni', 'phone'
+    ).iterator(chunk_size=2000):
+        paciente.busqueda = texto_busqueda(paciente)
+        lote.append(paciente)
+        if len(lote) >= 2000:
+            Paciente.objects.bulk_update(lote, ['busqueda'])
+            lote = []
+    if lote:
+        Paciente.objects.bulk_update(lote, ['busqueda'])
+
+
+def crear_indice_trigram(apps, schema_editor):
+    # El índice trigram solo existe en PostgreSQL; en SQLite la búsqueda
+    # funciona igual recorriendo la tabla
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS paciente_busqueda_trgm_idx "
+        "ON patients_paciente USING gin (busqueda gin_trgm_ops)"
+    )
+
+
+def borrar_indice_trigram(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS paciente_busqueda_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0015_alter_paciente_patologias'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paciente',
+            name='busqueda',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(rellenar_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice_trigram, borrar_indice_trigram),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('patients', '0016_paciente_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['grupo', '-created_at', '-id'], name='paciente_grupo_created_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:46
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0017_paciente_paciente_grupo_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubidaFragmentada',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('destino', models.CharField(choices=[('documento', 'Documentación del paciente'), ('pdf_firmado_general', 'PDF firmado general'), ('pdf_firmado_menor', 'PDF firmado menor'), ('pdf_firmado_inyecciones', 'PDF firmado inyecciones')], max_length=30)),
+                ('nombre', models.CharField(max_length=255)),
+                ('tamaño', models.BigIntegerField()),
+                ('tamaño_fragmento', models.PositiveIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('completada', 'Completada')], default='pendiente', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('documento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='patients.pacientedocumentacion')),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subidas', to='patients.paciente')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subidas_pacientes', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FragmentoSubida',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('indice', models.PositiveIntegerField()),
+                ('archivo', models.CharField(max_length=255)),
+                ('subida', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fragmentos', to='patients.subidafragmentada')),
+            ],
+            options={
+                'unique_together': {('subida', 'indice')},
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:51
+
+import almacenamiento.storage
+import django.core.validators
+import patients.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0018_subidafragmentada'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paciente',
+            name='pdf_firmado_general',
+            field=models.FileField(blank=True, null=True, storage=almacenamiento.storage.AlmacenamientoPorContenido(), upload_to=patients.models.upload_pdf_firmado_general, validators=[django.core.validators.FileExtensionValidator(['pdf'])]),
+        ),
+        migrations.AlterField(
+            model_name='paciente',
+            name='pdf_firmado_inyecciones',
+            field=models.FileField(blank=True, null=True, storage=almacenamiento.storage.AlmacenamientoPorContenido(), upload_to=patients.models.upload_pdf_firmado_inyecciones, validators=[django.core.validators.FileExtensionValidator(['pdf'])]),
+        ),
+        migrations.AlterField(
+            model_name='paciente',
+            name='pdf_firmado_menor',
+            field=models.FileField(blank=True, null=True, storage=almacenamiento.storage.AlmacenamientoPorContenido(), upload_to=patients.models.upload_pdf_firmado_menor, validators=[django.core.validators.FileExtensionValidator(['pdf'])]),
+        ),
+        migrations.AlterField(
+            model_name='pacientedocumentacion',
+            name='archivo',
+            field=models.FileField(storage=almacenamiento.storage.AlmacenamientoPorContenido(), upload_to=patients.models.patient_doc_path, validators=[django.core.validators.FileExtensionValidator(['pdf', 'jpg', 'png'])]),
+        ),
+    ]
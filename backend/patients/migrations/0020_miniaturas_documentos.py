@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:56
+
+import almacenamiento.storage
+import patients.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0019_almacenamiento_por_contenido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pacientedocumentacion',
+            name='miniatura',
+            field=models.FileField(blank=True, editable=False, null=True, storage=almacenamiento.storage.AlmacenamientoPorContenido(), upload_to=patients.models.patient_doc_miniatura_path),
+        ),
+        migrations.AddField(
+            model_name='pacientedocumentacion',
+            name='miniatura_estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('generada', 'Generada'), ('error', 'Error')], default='pendiente', editable=False, max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='pacientedocumentacion',
+            index=models.Index(fields=['miniatura_estado'], name='documento_miniatura_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('patients', '0020_miniaturas_documentos'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='paciente',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='paciente',
+            name='eliminado_en',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(condition=models.Q(('eliminado_en__isnull', False)), fields=['eliminado_en'], name='paciente_eliminado_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='paciente',
+            constraint=models.UniqueConstraint(condition=models.Q(('eliminado_en__isnull', True)), fields=('grupo', 'email'), name='paciente_grupo_email_unico'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0021_eliminacion_pacientes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paciente',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,139 @@
+"""
+Miniaturas de los documentos de pacientes.
+
+Cada PacienteDocumentacion nace con la miniatura 'pendiente'. El comando
+generar_miniaturas las va generando en segundo plano y, si alguien pide una
+antes, la vista de la miniatura la genera en ese momento. Las imágenes se
+reducen con Pillow y de los PDFs se renderiza la primera página con
+pypdfium2. El resultado es un JPEG pequeño que se guarda en el campo
+'miniatura' y ya no se vuelve a calcular.
+"""
+import io
+import logging
+import os
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from .models import PacienteDocumentacion
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONES_IMAGEN = ('.jpg', '.jpeg', '.png')
+
+
+class ErrorMiniatura(Exception):
+    pass
+
+
+def get_tamaño():
+    # Lado mayor de la miniatura, en píxeles
+    return getattr(settings, 'MINIATURAS_TAMAÑO', 320)
+
+
+def imagen_desde_pdf(archivo, tamaño):
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        raise ErrorMiniatura("Para las miniaturas de PDF hace falta instalar pypdfium2")
+
+    pdf = pdfium.PdfDocument(archivo)
+    try:
+        if len(pdf) == 0:
+            raise ErrorMiniatura("El PDF no tiene páginas")
+        pagina = pdf[0]
+        ancho, alto = pagina.get_size()
+        return pagina.render(scale=min(tamaño / ancho, tamaño / alto)).to_pil()
+    finally:
+        pdf.close()
+
+
+def imagen_desde_imagen(archivo, tamaño):
+    from PIL import Image, ImageOps
+
+    imagen = Image.open(archivo)
+    # En los JPEG decodifica directamente a una resolución reducida
+    imagen.draft('RGB', (tamaño, tamaño))
+    imagen = ImageOps.exif_transpose(imagen)
+    imagen.thumbnail((tamaño, tamaño))
+    return imagen
+
+
+def renderizar_miniatura(documento):
+    """
+    Devuelve los bytes del JPEG de la miniatura del documento.
+    """
+    from PIL import Image
+
+    tamaño = get_tamaño()
+    extension = os.path.splitext(documento.archivo.name)[1].lower()
+    with documento.archivo.open('rb') as archivo:
+        if extension == '.pdf':
+            imagen = imagen_desde_pdf(archivo, tamaño)
+        elif extension in EXTENSIONES_IMAGEN:
+            imagen = imagen_desde_imagen(archivo, tamaño)
+        else:
+            raise ErrorMiniatura(f"No hay miniatura para ficheros {extension or 'sin extensión'}")
+
+        if imagen.mode in ('RGBA', 'LA', 'P'):
+            # Transparencias sobre fondo blanco
+            imagen = imagen.convert('RGBA')
+            fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+            fondo.paste(imagen, mask=imagen.getchannel('A'))
+            imagen = fondo
+        elif imagen.mode != 'RGB':
+            imagen = imagen.convert('RGB')
+
+        salida = io.BytesIO()
+        imagen.save(salida, 'JPEG', quality=80, optimize=True)
+    return salida.getvalue()
+
+
+def generar_miniatura(documento_id, saltar_bloqueados=False):
+    """
+    Genera la miniatura del documento si está pendiente y devuelve el
+    documento (None si no existe o, con saltar_bloqueados, si otro proceso lo
+    está generando). Si no se puede generar queda en 'error' y no se reintenta.
+    """
+    with transaction.atomic():
+        documento = (
+            PacienteDocumentacion.objects
+            .select_for_update(skip_locked=saltar_bloqueados)
+            .select_related('paciente')
+            .filter(id=documento_id)
+            .first()
+        )
+        if documento is None or documento.miniatura_estado != PacienteDocumentacion.MINIATURA_PENDIENTE:
+            return documento
+
+        try:
+            contenido = renderizar_miniatura(documento)
+        except Exception:
+            logger.exception("No se ha podido generar la miniatura del documento %s", documento.id)
+            documento.miniatura_estado = PacienteDocumentacion.MINIATURA_ERROR
+            documento.save(update_fields=['miniatura_estado'])
+            return documento
+
+        nombre = os.path.splitext(os.path.basename(documento.archivo.name))[0] + '.jpg'
+        documento.miniatura.save(nombre, ContentFile(contenido), save=False)
+        documento.miniatura_estado = PacienteDocumentacion.MINIATURA_GENERADA
+        documento.save(update_fields=['miniatura', 'miniatura_estado'])
+    return documento
+
+
+def procesar_miniaturas_pendientes(limite=50):
+    """
+    Genera hasta 'limite' miniaturas pendientes. Devuelve cuántos documentos
+    se han procesado (con miniatura o con error).
+    """
+    ids = list(
+        PacienteDocumentacion.objects
+        .filter(miniatura_estado=PacienteDocumentacion.MINIATURA_PENDIENTE)
+        .order_by('id')
+        .values_list('id', flat=True)[:limite]
+    )
+    procesados = 0
+    for documento_id in ids:
+        documento = generar_miniatura(documento_id, saltar_bloqueados=True)
+        if documento is not None and documento.miniatura_estado != PacienteDocumentacion.MINIATURA_PENDIENTE:
+            procesados += 1
+    return procesados
@@ -2,12 +2,25 @@ from django.db import models
 from django.contrib.auth.models import Group
 from django.core.exceptions import ValidationError
 from django.core.validators import FileExtensionValidator
+from almacenamiento.storage import almacenamiento_por_contenido
 import uuid
+from .busqueda import CAMPOS_BUSQUEDA, texto_busqueda
 
 def validate_pdf(file):
     if not file.name.endswith('.pdf'):
         raise ValidationError("Solo se permiten archivos PDF.")
 
+def tiene_cabecera_pdf(file):
+    """
+    Comprueba que el fichero empieza como un PDF (%PDF- en el primer KB, como
+    admiten los lectores). Solo lee ese bloque y deja el fichero al principio
+    para que el storage lo copie después por trozos.
+    """
+    file.seek(0)
+    cabecera = file.read(1024)
+    file.seek(0)
+    return b'%PDF-' in cabecera
+
 def pdf_path(instance, filename, suffix):
     # Usa UUID para que funcione tanto antes como después de guardar
     return f"pacientes/{instance.uuid}/{suffix}/{filename}"
@@ -21,9 +34,23 @@ def upload_pdf_firmado_menor(instance, filename):
 def upload_pdf_firmado_inyecciones(instance, filename):
     return pdf_path(instance, filename, "pdf_MI_firmados")
 
+CAMPOS_PDF_FIRMADO = ('pdf_firmado_general', 'pdf_firmado_menor', 'pdf_firmado_inyecciones')
+
 def patient_doc_path(instance, filename):
     return f"pacientes/{instance.paciente.uuid}/documentos/{filename}"
 
+def patient_doc_miniatura_path(instance, filename):
+    return f"pacientes/{instance.paciente.uuid}/miniaturas/{filename}"
+
+class PacientesActivosManager(models.Manager):
+    """
+    Pacientes no eliminados. Los eliminados siguen en la tabla hasta que el
+    comando purgar_pacientes borra sus datos (ver patients/eliminacion.py);
+    para verlos hay que usar Paciente.todos.
+    """
+    def get_queryset(self):
+        return super().get_queryset().filter(eliminado_en__isnull=True)
+
 class Paciente(models.Model):
     uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     nombre = models.CharField(max_length=100)
@@ -42,6 +69,7 @@ class Paciente(models.Model):
     code_postal = models.CharField(max_length=6)
     country = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     alergias = models.BooleanField(default=False)
     patologias = models.JSONField(default=list, blank=True, null=True)
     notas = models.TextField(blank=True, null=True)
@@ -49,16 +77,19 @@ class Paciente(models.Model):
     pdf_firmado_general = models.FileField(
         upload_to=upload_pdf_firmado_general,
         blank=True, null=True,
+        storage=almacenamiento_por_contenido,
         validators=[FileExtensionValidator(['pdf'])]
     )
     pdf_firmado_menor = models.FileField(
         upload_to=upload_pdf_firmado_menor,
         blank=True, null=True,
+        storage=almacenamiento_por_contenido,
         validators=[FileExtensionValidator(['pdf'])]
     )
     pdf_firmado_inyecciones = models.FileField(
         upload_to=upload_pdf_firmado_inyecciones,
         blank=True, null=True,
+        storage=almacenamiento_por_contenido,
         validators=[FileExtensionValidator(['pdf'])]
     )
 
@@ -67,14 +98,59 @@ class Paciente(models.Model):
         related_name="pacientes", null=True
     )
 
+    # Nombre completo, DNI y teléfono normalizados (ver patients.busqueda).
+    # Se recalcula en save(); en PostgreSQL tiene un índice GIN trigram.
+    busqueda = models.TextField(blank=True, default='', editable=False)
+
+    # Fecha en que se eliminó; desde ese momento no aparece en ningún listado
+    # y queda pendiente de purgar
+    eliminado_en = models.DateTimeField(blank=True, null=True, editable=False)
+
+    objects = PacientesActivosManager()
+    todos = models.Manager()
+
     class Meta:
         ordering = ['-created_at']
-        unique_together = ('grupo', 'email')  # evita duplicados dentro del mismo grupo
+        constraints = [
+            # Evita duplicados dentro del mismo grupo; un paciente eliminado
+            # no impide volver a darlo de alta antes de que se purgue
+            models.UniqueConstraint(
+                fields=['grupo', 'email'], condition=models.Q(eliminado_en__isnull=True),
+                name='paciente_grupo_email_unico',
+            ),
+        ]
+        indexes = [
+            # Pacientes pendientes de purgar
+            models.Index(fields=['eliminado_en'], name='paciente_eliminado_idx',
+                         condition=models.Q(eliminado_en__isnull=False)),
+            # Listado por grupo y paginación por cursor (-created_at, -id)
+            models.Index(fields=['grupo', '-created_at', '-id'], name='paciente_grupo_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nombre} {self.primer_apellido} {self.segundo_apellido}"
 
+    def save(self, *args, **kwargs):
+        self.busqueda = texto_busqueda(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            # updated_at (ETag del resumen) cambia con cualquier guardado
+            extra = {'updated_at'}
+            if set(update_fields) & set(CAMPOS_BUSQUEDA):
+                extra.add('busqueda')
+            kwargs['update_fields'] = {*update_fields, *extra}
+        super().save(*args, **kwargs)
+
 class PacienteDocumentacion(models.Model):
+    MINIATURA_PENDIENTE = 'pendiente'
+    MINIATURA_GENERADA = 'generada'
+    MINIATURA_ERROR = 'error'
+    ESTADOS_MINIATURA = [
+        (MINIATURA_PENDIENTE, 'Pendiente'),
+        (MINIATURA_GENERADA, 'Generada'),
+        (MINIATURA_ERROR, 'Error'),
+    ]
+
     paciente = models.ForeignKey(
         Paciente,
         on_delete=models.CASCADE,
@@ -84,12 +160,87 @@ class PacienteDocumentacion(models.Model):
     )
     archivo = models.FileField(
         upload_to=patient_doc_path,
+        storage=almacenamiento_por_contenido,
         validators=[FileExtensionValidator(['pdf', 'jpg', 'png'])]
     )
     upload_at = models.DateTimeField(auto_now_add=True)
 
+    # Miniatura JPEG (primera página en los PDFs) para los listados; la genera
+    # el comando generar_miniaturas o la vista de la miniatura la primera vez
+    # que se pide (ver patients/miniaturas.py)
+    miniatura = models.FileField(
+        upload_to=patient_doc_miniatura_path,
+        storage=almacenamiento_por_contenido,
+        blank=True, null=True, editable=False,
+    )
+    miniatura_estado = models.CharField(
+        max_length=10, choices=ESTADOS_MINIATURA, default=MINIATURA_PENDIENTE, editable=False,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['miniatura_estado'], name='documento_miniatura_idx'),
+        ]
+
     def __str__(self):
         if self.paciente:
             return f"Documento de {self.paciente.nombre} {self.paciente.primer_apellido}"
         else:
             return "Documento sin paciente asignado"
+
+
+class SubidaFragmentada(models.Model):
+    """
+    Subida de un fichero grande por fragmentos (ver patients/subidas.py). Se
+    crea al iniciar la subida y guarda lo necesario para reanudarla y, al
+    finalizar, adjuntar el fichero a PacienteDocumentacion o a un pdf_firmado_*.
+    """
+    DOCUMENTO = 'documento'
+    DESTINOS = [
+        (DOCUMENTO, 'Documentación del paciente'),
+        ('pdf_firmado_general', 'PDF firmado general'),
+        ('pdf_firmado_menor', 'PDF firmado menor'),
+        ('pdf_firmado_inyecciones', 'PDF firmado inyecciones'),
+    ]
+
+    PENDIENTE = 'pendiente'
+    COMPLETADA = 'completada'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (COMPLETADA, 'Completada'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE, related_name='subidas')
+    user = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='subidas_pacientes')
+    destino = models.CharField(max_length=30, choices=DESTINOS)
+    nombre = models.CharField(max_length=255)
+    tamaño = models.BigIntegerField()
+    tamaño_fragmento = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE)
+    documento = models.ForeignKey(
+        PacienteDocumentacion, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def total_fragmentos(self):
+        return max(1, -(-self.tamaño // self.tamaño_fragmento))
+
+    def tamaño_esperado(self, indice):
+        if indice == self.total_fragmentos - 1:
+            return self.tamaño - indice * self.tamaño_fragmento
+        return self.tamaño_fragmento
+
+    def __str__(self):
+        return f"Subida {self.nombre} ({self.get_estado_display()})"
+
+
+class FragmentoSubida(models.Model):
+    subida = models.ForeignKey(SubidaFragmentada, on_delete=models.CASCADE, related_name='fragmentos')
+    indice = models.PositiveIntegerField()
+    archivo = models.CharField(max_length=255)  # nombre en el storage
+
+    class Meta:
+        unique_together = ('subida', 'indice')
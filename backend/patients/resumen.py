@@ -0,0 +1,99 @@
+"""
+Resumen completo de un paciente (ficha, citas, facturas y documentos) para
+la pantalla de detalle, en una sola petición.
+
+Primero se lee el paciente con los totales de cada relación calculados en
+subconsultas (una sola consulta). Con esos totales se construye el ETag: si el
+cliente ya tiene esa versión se responde 304 sin leer nada más. Si no, se
+cargan los tramos recientes de cada relación (TAMAÑO_TRAMO filas como mucho)
+y se serializa todo.
+"""
+import hashlib
+from django.db.models import Count, DecimalField, Max, OuterRef, Prefetch, Q, Subquery, Sum, Value, prefetch_related_objects
+from django.db.models.functions import Coalesce
+from citas.models import Cita
+from facturacion.models import Factura
+from .models import PacienteDocumentacion
+
+TAMAÑO_TRAMO = 10
+
+CERO = Value(0, output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def agregado(queryset, expresion, campo='paciente_id'):
+    """Subconsulta con un único agregado sobre las filas de cada paciente."""
+    return Subquery(queryset.order_by().values(campo).annotate(valor=expresion).values('valor'))
+
+
+def cita_pasada(ahora):
+    # fecha y hora de las citas son hora local sin zona
+    return Q(fecha__lt=ahora.date()) | Q(fecha=ahora.date(), comenzar__lte=ahora.time())
+
+
+def con_totales(queryset, ahora):
+    """
+    Anota en cada paciente los totales del resumen: citas, visitas (citas ya
+    pasadas), importe pendiente de las visitas sin pagar, facturas y
+    documentos, y la última modificación de cada relación.
+    """
+    citas = Cita.objects.filter(paciente_id=OuterRef('pk'))
+    facturas = Factura.objects.filter(cita__paciente_id=OuterRef('pk'))
+    documentos = PacienteDocumentacion.objects.filter(paciente_id=OuterRef('pk'))
+    pasada = cita_pasada(ahora)
+    miniatura_generada = Q(miniatura_estado=PacienteDocumentacion.MINIATURA_GENERADA)
+
+    return queryset.annotate(
+        total_citas=Coalesce(agregado(citas, Count('id')), 0),
+        total_visitas=Coalesce(agregado(citas, Count('id', filter=pasada)), 0),
+        pendiente_pago=Coalesce(agregado(citas, Sum('precio', filter=pasada & Q(pagado=False))), CERO),
+        citas_actualizadas=agregado(citas, Max('updated_at')),
+        total_facturas=Coalesce(agregado(facturas, Count('id'), 'cita__paciente_id'), 0),
+        total_facturado=Coalesce(agregado(facturas, Sum('total'), 'cita__paciente_id'), CERO),
+        facturas_actualizadas=agregado(facturas, Max('updated_at'), 'cita__paciente_id'),
+        total_documentos=Coalesce(agregado(documentos, Count('id')), 0),
+        documentos_actualizados=agregado(documentos, Max('upload_at')),
+        total_miniaturas=Coalesce(agregado(documentos, Count('id', filter=miniatura_generada)), 0),
+    )
+
+
+def etag_resumen(paciente):
+    """
+    ETag a partir de la última modificación y los totales de cada parte. Los
+    totales recogen también los borrados y el paso de citas de próximas a
+    pasadas, que no cambian ningún updated_at.
+    """
+    partes = (
+        paciente.pk, paciente.updated_at,
+        paciente.total_citas, paciente.total_visitas, paciente.pendiente_pago, paciente.citas_actualizadas,
+        paciente.total_facturas, paciente.total_facturado, paciente.facturas_actualizadas,
+        paciente.total_documentos, paciente.documentos_actualizados, paciente.total_miniaturas,
+    )
+    return '"%s"' % hashlib.sha1(repr(partes).encode()).hexdigest()
+
+
+def cargar_tramos(paciente, ahora):
+    """
+    Carga en el paciente las próximas citas, las últimas visitas y los
+    documentos más recientes (prefetch con LIMIT por paciente) y devuelve las
+    últimas facturas, que cuelgan de las citas y se leen aparte.
+    """
+    pasada = cita_pasada(ahora)
+    prefetch_related_objects(
+        [paciente],
+        Prefetch(
+            'citas_pacientes',
+            queryset=Cita.objects.exclude(pasada).order_by('fecha', 'comenzar', 'id')[:TAMAÑO_TRAMO],
+            to_attr='proximas_citas',
+        ),
+        Prefetch(
+            'citas_pacientes',
+            queryset=Cita.objects.filter(pasada).order_by('-fecha', '-comenzar', '-id')[:TAMAÑO_TRAMO],
+            to_attr='ultimas_visitas',
+        ),
+        Prefetch(
+            'documentos',
+            queryset=PacienteDocumentacion.objects.order_by('-upload_at', '-id')[:TAMAÑO_TRAMO],
+            to_attr='ultimos_documentos',
+        ),
+    )
+    return list(Factura.objects.filter(cita__paciente_id=paciente.pk).order_by('-fecha_creacion', '-id')[:TAMAÑO_TRAMO])
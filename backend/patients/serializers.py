@@ -5,8 +5,8 @@ from citas.serializers import CitaSerializer
 class PacienteDocumentoSerializer(serializers.ModelSerializer):
     class Meta:
         model = PacienteDocumentacion
-        fields = ['id', 'archivo', 'upload_at']
-        read_only_fields = ['id', 'upload_at']
+        fields = ['id', 'archivo', 'miniatura', 'upload_at']
+        read_only_fields = ['id', 'miniatura', 'upload_at']
 
 
 class PacienteSerializer(serializers.ModelSerializer):
@@ -76,3 +76,86 @@ class PacienteSerializer(serializers.ModelSerializer):
 
     def get_group_name(self, obj):
         return obj.grupo.name if obj.grupo else None
+
+
+class PacienteListSerializer(serializers.ModelSerializer):
+    """
+    Representación para el listado de pacientes: solo los campos propios del
+    paciente más el nombre del grupo y los contadores anotados por la vista,
+    sin documentos, citas ni URLs de ficheros. El detalle sigue usando
+    PacienteSerializer.
+    """
+    group_name = serializers.CharField(source='grupo.name', read_only=True, default=None)
+    created_at_formatted = serializers.SerializerMethodField()
+    num_documentos = serializers.IntegerField(read_only=True)
+    num_citas = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Paciente
+        fields = [
+            'id',
+            'uuid',
+            'nombre',
+            'primer_apellido',
+            'segundo_apellido',
+            'email',
+            'phone',
+            'fecha_nacimiento',
+            'dni',
+            'address',
+            'city',
+            'code_postal',
+            'country',
+            'alergias',
+            'patologias',
+            'notas',
+            'grupo',
+            'group_name',
+            'created_at',
+            'created_at_formatted',
+            'num_documentos',
+            'num_citas',
+        ]
+        read_only_fields = fields
+
+    def get_created_at_formatted(self, obj):
+        return obj.created_at.strftime('%d/%m/%Y')
+
+
+class PacienteFichaSerializer(PacienteSerializer):
+    """
+    Datos propios del paciente para el resumen (pacientes/<pk>/resumen/), sin
+    las listas completas de citas y documentos: el resumen trae tramos de
+    ellas aparte.
+    """
+    class Meta(PacienteSerializer.Meta):
+        fields = [f for f in PacienteSerializer.Meta.fields if f not in ('citas', 'documents')] + ['updated_at']
+        read_only_fields = fields
+
+
+class PacienteImportacionSerializer(serializers.ModelSerializer):
+    """
+    Valida cada fila de una importación masiva con las mismas reglas del
+    modelo que PacienteSerializer, sin los campos de solo lectura ni los PDFs.
+    Acepta además fechas en formato dd/mm/aaaa, habitual en las hojas de cálculo.
+    """
+    fecha_nacimiento = serializers.DateField(input_formats=['iso-8601', '%d/%m/%Y'])
+
+    class Meta:
+        model = Paciente
+        fields = [
+            'nombre',
+            'primer_apellido',
+            'segundo_apellido',
+            'email',
+            'phone',
+            'fecha_nacimiento',
+            'dni',
+            'address',
+            'city',
+            'code_postal',
+            'country',
+            'alergias',
+            'patologias',
+            'notas',
+        ]
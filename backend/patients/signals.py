@@ -0,0 +1,9 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .autocompletar import invalidar_autocompletado
+from .models import Paciente
+
+@receiver(post_save, sender=Paciente)
+@receiver(post_delete, sender=Paciente)
+def invalidar_indice_autocompletado(sender, instance, **kwargs):
+    invalidar_autocompletado(instance.grupo_id)
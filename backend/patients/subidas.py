@@ -0,0 +1,217 @@
+"""
+Subidas por fragmentos para documentos y PDFs firmados de pacientes.
+
+Protocolo:
+  1. POST pacientes/<pk>/subidas/ con destino, nombre, tamaño y sha256 del
+     fichero completo. Devuelve el id de la subida y el tamaño de fragmento.
+  2. PUT pacientes/subidas/<id>/fragmentos/<indice>/ con los bytes de cada
+     fragmento como cuerpo. Se pueden reenviar y mandar en cualquier orden;
+     GET pacientes/subidas/<id>/ indica cuáles faltan para reanudar.
+  3. POST pacientes/subidas/<id>/finalizar/ une los fragmentos en el destino
+     final comprobando el sha256 y adjunta el fichero al paciente.
+
+Cada fragmento se guarda en el storage según llega, así que el servidor no
+mantiene en memoria ni en disco local más de un fragmento por petición.
+"""
+import hashlib
+import io
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from .models import FragmentoSubida, Paciente, PacienteDocumentacion, SubidaFragmentada
+
+EXTENSIONES_DOCUMENTO = ('.pdf', '.jpg', '.png')
+
+
+class ErrorSubida(Exception):
+    pass
+
+
+def get_config():
+    return {
+        'tamaño_fragmento': getattr(settings, 'SUBIDAS_TAMAÑO_FRAGMENTO', 5 * 1024 * 1024),
+        'tamaño_maximo': getattr(settings, 'SUBIDAS_TAMAÑO_MAXIMO', 200 * 1024 * 1024),
+        'caducidad': getattr(settings, 'SUBIDAS_CADUCIDAD', timedelta(hours=24)),
+    }
+
+
+def ruta_fragmento(subida, indice):
+    return f"subidas/{subida.id}/{indice:06d}"
+
+
+def iniciar_subida(paciente, user, destino, nombre, tamaño, sha256):
+    config = get_config()
+    nombre = os.path.basename(nombre or '')
+
+    if destino not in dict(SubidaFragmentada.DESTINOS):
+        raise ErrorSubida("Destino no válido")
+    extensiones = EXTENSIONES_DOCUMENTO if destino == SubidaFragmentada.DOCUMENTO else ('.pdf',)
+    if not nombre.lower().endswith(extensiones):
+        raise ErrorSubida(f"El archivo debe tener extensión {', '.join(extensiones)}")
+    try:
+        tamaño = int(tamaño)
+    except (TypeError, ValueError):
+        raise ErrorSubida("tamaño debe ser un número entero")
+    if not 0 < tamaño <= config['tamaño_maximo']:
+        raise ErrorSubida(f"El tamaño debe estar entre 1 y {config['tamaño_maximo']} bytes")
+    sha256 = (sha256 or '').lower()
+    if len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256):
+        raise ErrorSubida("sha256 debe ser el hash hexadecimal del fichero")
+
+    return SubidaFragmentada.objects.create(
+        paciente=paciente, user=user, destino=destino, nombre=nombre,
+        tamaño=tamaño, tamaño_fragmento=config['tamaño_fragmento'], sha256=sha256,
+    )
+
+
+def estado_subida(subida):
+    recibidos = sorted(subida.fragmentos.values_list('indice', flat=True))
+    return {
+        'id': str(subida.id),
+        'estado': subida.estado,
+        'destino': subida.destino,
+        'nombre': subida.nombre,
+        'tamaño': subida.tamaño,
+        'tamaño_fragmento': subida.tamaño_fragmento,
+        'total_fragmentos': subida.total_fragmentos,
+        'recibidos': recibidos,
+    }
+
+
+def guardar_fragmento(subida, indice, stream):
+    """
+    Lee el fragmento del cuerpo de la petición (como mucho tamaño_fragmento
+    bytes) y lo guarda en el storage. Reenviar un fragmento lo sustituye.
+    """
+    if subida.estado != SubidaFragmentada.PENDIENTE:
+        raise ErrorSubida("La subida ya se ha finalizado")
+    if not 0 <= indice < subida.total_fragmentos:
+        raise ErrorSubida(f"El índice debe estar entre 0 y {subida.total_fragmentos - 1}")
+
+    esperado = subida.tamaño_esperado(indice)
+    datos = stream.read(esperado + 1) if stream else b''
+    if len(datos) != esperado:
+        raise ErrorSubida(f"El fragmento {indice} debe tener {esperado} bytes")
+
+    ruta = ruta_fragmento(subida, indice)
+    if default_storage.exists(ruta):
+        default_storage.delete(ruta)
+    nombre = default_storage.save(ruta, ContentFile(datos))
+    FragmentoSubida.objects.update_or_create(subida=subida, indice=indice, defaults={'archivo': nombre})
+
+
+class LectorFragmentos(io.RawIOBase):
+    """
+    Lee los fragmentos del storage uno detrás de otro como si fueran un solo
+    fichero, calculando el sha256 de lo leído.
+    """
+    def __init__(self, nombres):
+        self.nombres = iter(nombres)
+        self.actual = None
+        self.hash = hashlib.sha256()
+        self.leidos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            if self.actual is None:
+                nombre = next(self.nombres, None)
+                if nombre is None:
+                    return 0
+                self.actual = default_storage.open(nombre, 'rb')
+            datos = self.actual.read(len(buffer))
+            if datos:
+                buffer[:len(datos)] = datos
+                self.hash.update(datos)
+                self.leidos += len(datos)
+                return len(datos)
+            self.actual.close()
+            self.actual = None
+
+    def close(self):
+        if self.actual is not None:
+            self.actual.close()
+        super().close()
+
+
+def borrar_fragmentos(subida):
+    for nombre in subida.fragmentos.values_list('archivo', flat=True):
+        default_storage.delete(nombre)
+    subida.fragmentos.all().delete()
+
+
+def finalizar_subida(subida_id, user):
+    """
+    Une los fragmentos en la ruta definitiva del campo de destino, comprueba
+    tamaño y sha256 y adjunta el fichero. Devuelve la subida actualizada.
+    """
+    with transaction.atomic():
+        subida = (
+            SubidaFragmentada.objects.select_for_update()
+            .select_related('paciente')
+            .get(id=subida_id, user=user)
+        )
+        if subida.estado == SubidaFragmentada.COMPLETADA:
+            return subida
+
+        fragmentos = list(subida.fragmentos.order_by('indice').values_list('indice', 'archivo'))
+        faltan = sorted(set(range(subida.total_fragmentos)) - {indice for indice, _ in fragmentos})
+        if faltan:
+            raise ErrorSubida(f"Faltan fragmentos: {faltan[:20]}")
+
+        paciente = subida.paciente
+        if subida.destino == SubidaFragmentada.DOCUMENTO:
+            instancia = PacienteDocumentacion(paciente=paciente)
+            campo = PacienteDocumentacion._meta.get_field('archivo')
+        else:
+            instancia = paciente
+            campo = Paciente._meta.get_field(subida.destino)
+
+        lector = LectorFragmentos(archivo for _, archivo in fragmentos)
+        with lector:
+            contenido = File(io.BufferedReader(lector, 1024 * 1024), name=subida.nombre)
+            contenido.size = subida.tamaño
+            nombre_final = campo.storage.save(campo.generate_filename(instancia, subida.nombre), contenido)
+
+        valida = lector.leidos == subida.tamaño and lector.hash.hexdigest() == subida.sha256
+        if valida:
+            if subida.destino == SubidaFragmentada.DOCUMENTO:
+                instancia.archivo = nombre_final
+                instancia.save()
+                subida.documento = instancia
+            else:
+                setattr(paciente, subida.destino, nombre_final)
+                paciente.save(update_fields=[subida.destino])
+
+            subida.estado = SubidaFragmentada.COMPLETADA
+            subida.save(update_fields=['estado', 'documento'])
+        else:
+            campo.storage.delete(nombre_final)
+
+        borrar_fragmentos(subida)
+
+    if not valida:
+        raise ErrorSubida("El sha256 del fichero no coincide; hay que volver a subir los fragmentos")
+    return subida
+
+
+def limpiar_subidas_caducadas():
+    """
+    Borra las subidas sin finalizar más antiguas que SUBIDAS_CADUCIDAD junto
+    con sus fragmentos. Devuelve cuántas se han borrado.
+    """
+    limite = timezone.now() - get_config()['caducidad']
+    caducadas = SubidaFragmentada.objects.filter(estado=SubidaFragmentada.PENDIENTE, created_at__lt=limite)
+    total = 0
+    for subida in caducadas.iterator():
+        borrar_fragmentos(subida)
+        subida.delete()
+        total += 1
+    return total
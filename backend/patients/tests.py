@@ -1,13 +1,33 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from rest_framework.test import APIClient
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth.models import Group
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from .models import Paciente
 from .models import PacienteDocumentacion
-from datetime import date
+from .models import SubidaFragmentada
+from citas.models import Cita, CitaEliminada, RecordatorioEnvio, SerieCita
+from citas.whatsapp import FakeWhatsAppClient
+from userinfo.models import UserInfo
+from facturacion.models import Factura
+from almacenamiento.models import Blob
+from datetime import date, timedelta
+import csv
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
 
 class PacienteModelTest(TestCase):
     def setUp(self):
@@ -112,6 +132,121 @@ class PacienteViewsTest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 1)
 
+    def crear_paciente_con_relaciones(self, i):
+        paciente = Paciente.objects.create(
+            nombre=f"Paciente{i}", primer_apellido="Ruiz", email=f"p{i}@example.com",
+            phone="600000000", fecha_nacimiento="1990-01-01", grupo=self.group
+        )
+        PacienteDocumentacion.objects.create(
+            paciente=paciente, archivo=SimpleUploadedFile(f"doc{i}.pdf", b"%PDF-1.4", content_type="application/pdf")
+        )
+        for hora in ("10:00", "11:00"):
+            Cita.objects.create(
+                paciente=paciente, user=self.user, fecha="2024-05-01", comenzar=hora, finalizar=hora.replace(":00", ":45")
+            )
+        return paciente
+
+    def test_list_pacientes_consultas_constantes(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/pacientes/')
+        consultas_un_paciente = len(ctx.captured_queries)
+
+        for i in range(7):
+            self.crear_paciente_con_relaciones(i)
+
+        with self.assertNumQueries(consultas_un_paciente):
+            response = self.client.get('/pacientes/')
+        self.assertEqual(len(response.data['results']), 8)
+
+        fila = next(p for p in response.data['results'] if p['nombre'] == "Paciente0")
+        self.assertEqual(fila['num_documentos'], 1)
+        self.assertEqual(fila['num_citas'], 2)
+        self.assertEqual(fila['group_name'], 'Fisioterapia')
+        self.assertNotIn('documents', fila)
+
+    def test_list_pacientes_por_cursor(self):
+        for i in range(11):
+            Paciente.objects.create(
+                nombre=f"Cursor{i}", primer_apellido="Ruiz", segundo_apellido="", email=f"c{i}@example.com",
+                fecha_nacimiento="1990-01-01", grupo=self.group
+            )
+        esperados = list(Paciente.objects.filter(grupo=self.group).order_by('-created_at', '-id').values_list('id', flat=True))
+
+        vistos = []
+        url = '/pacientes/?cursor=&page_size=5'
+        with CaptureQueriesContext(connection) as ctx:
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                vistos.extend(p['id'] for p in response.data['results'])
+                url = response.data['next']
+        self.assertEqual(vistos, esperados)
+        self.assertFalse([q['sql'] for q in ctx.captured_queries if '__count' in q['sql']])
+
+        # Volver atrás desde la última página devuelve la anterior
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([p['id'] for p in response.data['results']], esperados[5:10])
+
+    def test_exportar_pacientes_csv(self):
+        otro_grupo = Group.objects.create(name='Psicología')
+        Paciente.objects.create(
+            nombre="=Otro", primer_apellido="Grupo", segundo_apellido="", email="otro@example.com",
+            fecha_nacimiento="1990-01-01", grupo=otro_grupo
+        )
+        Paciente.objects.create(
+            nombre="=SUMA(A1)", primer_apellido="Ruiz", segundo_apellido="", email="formula@example.com",
+            fecha_nacimiento="1990-01-01", grupo=self.group
+        )
+
+        response = self.client.get('/pacientes/exportar/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="pacientes-', response['Content-Disposition'])
+
+        filas = list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual([f['nombre'] for f in filas], ["'=SUMA(A1)", "Laura"])
+        self.assertEqual(filas[1]['grupo'], 'Fisioterapia')
+        self.assertEqual(filas[1]['alergias'], 'false')
+
+        self.assertEqual(self.client.get('/pacientes/exportar/', {'formato': 'xml'}).status_code, 400)
+
+    def test_list_pacientes_cursor_invalido(self):
+        response = self.client.get('/pacientes/', {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_busqueda_sin_tildes_y_por_dni(self):
+        Paciente.objects.create(
+            nombre="José", primer_apellido="Núñez", segundo_apellido="Peña", email="jose@example.com",
+            phone="600 123 456", fecha_nacimiento="1980-01-01", dni="33333333C", grupo=self.group
+        )
+        for termino, esperado in (("jose nunez", "José"), ("NÚÑEZ", "José"), ("33333333c", "José"), ("600123", "José")):
+            response = self.client.get('/pacientes/', {'search': termino})
+            self.assertEqual([p['nombre'] for p in response.data['results']], [esperado], termino)
+
+    def test_busqueda_ordenada_por_relevancia(self):
+        for nombre, apellido in (("Ana", "Perezagua"), ("Perla", "Gómez")):
+            Paciente.objects.create(
+                nombre=nombre, primer_apellido=apellido, segundo_apellido="", email=f"{nombre}@example.com",
+                fecha_nacimiento="1980-01-01", grupo=self.group
+            )
+        response = self.client.get('/pacientes/', {'search': 'per'})
+        # "Perla" empieza por el término, "Pérez" y "Perezagua" tienen una palabra que empieza por él
+        self.assertEqual(response.data['results'][0]['nombre'], "Perla")
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_busqueda_se_actualiza_al_editar(self):
+        self.paciente.primer_apellido = "Ibáñez"
+        self.paciente.save(update_fields=['primer_apellido'])
+        self.paciente.refresh_from_db()
+        self.assertIn("ibanez", self.paciente.busqueda)
+
+    def test_detalle_paciente_mantiene_documentos(self):
+        paciente = self.crear_paciente_con_relaciones(1)
+        response = self.client.get(f'/pacientes/{paciente.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['documents']), 1)
+        self.assertIn('pdf_urls', response.data)
+
     def test_create_paciente(self):
         data = {
             "nombre": "Mario",
@@ -130,6 +265,28 @@ class PacienteViewsTest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(response.data["nombre"], "Mario")
 
+    def test_grupos_consultados_una_vez_por_peticion(self):
+        data = {
+            "nombre": "Mario",
+            "primer_apellido": "López",
+            "segundo_apellido": "Sanz",
+            "email": "mario@example.com",
+            "phone": "611111111",
+            "fecha_nacimiento": "1980-12-12",
+            "dni": "22222222B",
+            "address": "Calle Luna 1",
+            "city": "Granada",
+            "code_postal": "18001",
+            "country": "España"
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/pacientes/', data)
+            self.client.get('/pacientes/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        consultas_grupos = [q['sql'] for q in ctx.captured_queries if 'auth_user_groups' in q['sql']]
+        self.assertEqual(len(consultas_grupos), 2)
+
     def test_retrieve_update_delete_paciente(self):
         url = f'/pacientes/{self.paciente.pk}/'
 
@@ -157,6 +314,37 @@ class PacienteViewsTest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn("pdf_firmado_general", response.data["pdf_urls"])
 
+    def test_upload_pdfs_firmados_una_sola_escritura(self):
+        url = f'/pacientes/{self.paciente.pk}/upload-signed-pdf/'
+        data = {
+            'pdf_firmado_general': SimpleUploadedFile("lpd.pdf", b"%PDF-1.4 general", content_type="application/pdf"),
+            'pdf_firmado_menor': SimpleUploadedFile("cm.pdf", b"%PDF-1.4 menor", content_type="application/pdf"),
+        }
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data["pdf_urls"]), {"pdf_firmado_general", "pdf_firmado_menor"})
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "patients_paciente"')]
+        self.assertEqual(len(updates), 1)
+
+        # Al sustituir un PDF el anterior se borra tras confirmar la transacción
+        self.paciente.refresh_from_db()
+        anterior = self.paciente.pdf_firmado_general
+        nuevo = SimpleUploadedFile("lpd2.pdf", b"%PDF-1.4 nuevo", content_type="application/pdf")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'pdf_firmado_general': nuevo}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(anterior.storage.exists(anterior.name))
+
+    def test_upload_pdf_firmado_no_es_pdf(self):
+        falso = SimpleUploadedFile("virus.pdf", b"MZ no soy un pdf", content_type="application/pdf")
+        response = self.client.post(f'/pacientes/{self.paciente.pk}/upload-signed-pdf/',
+                                    {'pdf_firmado_general': falso}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.paciente.refresh_from_db()
+        self.assertFalse(self.paciente.pdf_firmado_general)
+
     def test_upload_documento_paciente(self):
         pdf = SimpleUploadedFile(
             "doc_test.pdf", b"%PDF-1.4 archivo doc", content_type="application/pdf"
@@ -206,3 +394,464 @@ class PacienteViewsTest(TestCase):
         self.assertEqual(response.data["nombre"], "Laura Editada")
         self.assertEqual(response.data["email"], "nueva_laura@example.com")
         self.assertEqual(response.data["city"], "Alicante")
+
+class PacienteAutocompletarTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(name='Fisioterapia')
+        otro_grupo = Group.objects.create(name='Psicología')
+        self.user = User.objects.create_user(username='autocompletar', password='testpass')
+        self.user.groups.add(self.group)
+
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+        for nombre, apellido, grupo in (
+            ("Álvaro", "Núñez", self.group), ("Alba", "Ruiz", self.group),
+            ("Carlos", "Alvarado", self.group), ("Alicia", "Moreno", otro_grupo),
+        ):
+            self.crear_paciente(nombre, apellido, grupo)
+
+    def crear_paciente(self, nombre, apellido, grupo):
+        return Paciente.objects.create(
+            nombre=nombre, primer_apellido=apellido, segundo_apellido="", email=f"{nombre}@example.com",
+            phone="600000000", fecha_nacimiento="1990-01-01", grupo=grupo
+        )
+
+    def nombres(self, q):
+        response = self.client.get('/pacientes/autocompletar/', {'q': q})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [p['nombre'] for p in response.data]
+
+    def test_autocompletar_por_prefijo_sin_tildes(self):
+        # Primero los que empiezan por el término, luego los que tienen otra palabra que empieza por él
+        self.assertEqual(self.nombres("alva"), ["Álvaro", "Carlos"])
+        self.assertEqual(self.nombres("al nu"), ["Álvaro"])
+        self.assertEqual(self.nombres(""), [])
+
+        response = self.client.get('/pacientes/autocompletar/', {'q': 'alba'})
+        self.assertEqual(set(response.data[0]), {'id', 'nombre', 'primer_apellido', 'segundo_apellido', 'phone'})
+
+    def test_autocompletar_no_consulta_pacientes_si_no_cambian(self):
+        self.nombres("al")
+        with CaptureQueriesContext(connection) as ctx:
+            self.nombres("alb")
+        self.assertFalse([q['sql'] for q in ctx.captured_queries if 'patients_paciente' in q['sql']])
+
+    def test_autocompletar_ve_cambios_de_otro_proceso(self):
+        self.assertEqual(self.nombres("alb"), ["Alba"])
+        # Otro proceso, con su propio índice en memoria, da de alta un paciente
+        with mock.patch('patients.autocompletar._indices', {}):
+            self.crear_paciente("Albert", "Sanz", self.group)
+            self.assertEqual(self.nombres("alb"), ["Alba", "Albert"])
+        # La versión está en la caché compartida: este proceso reconstruye su índice
+        self.assertEqual(self.nombres("alb"), ["Alba", "Albert"])
+
+    def test_autocompletar_se_invalida_al_guardar_y_borrar(self):
+        self.assertEqual(self.nombres("alb"), ["Alba"])
+        nuevo = self.crear_paciente("Albert", "Sanz", self.group)
+        self.assertEqual(self.nombres("alb"), ["Alba", "Albert"])
+        nuevo.delete()
+        self.assertEqual(self.nombres("alb"), ["Alba"])
+
+class PacienteImportacionTest(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(name='Fisioterapia')
+        self.user = User.objects.create_user(username='importar', password='testpass')
+        self.user.groups.add(self.group)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+        Paciente.objects.create(
+            nombre="Existente", primer_apellido="Uno", segundo_apellido="", email="existente@example.com",
+            fecha_nacimiento="1990-01-01", grupo=self.group
+        )
+
+    def importar(self, nombre, contenido):
+        fichero = SimpleUploadedFile(nombre, contenido)
+        return self.client.post('/pacientes/importar/', {'file': fichero}, format='multipart')
+
+    def test_importar_csv(self):
+        contenido = (
+            "nombre;primer_apellido;segundo_apellido;email;fecha_nacimiento;dni;address;city;code_postal;country;alergias;patologias\n"
+            "José;Núñez;Peña;jose@example.com;15/03/1985;1A;Calle 1;Madrid;28001;España;sí;asma, diabetes\n"
+            "Ana;Ruiz;Paz;existente@example.com;1990-01-01;2B;Calle 2;Madrid;28001;España;no;\n"
+            "Eva;Gil;Paz;jose@example.com;1990-01-01;3C;Calle 3;Madrid;28001;España;no;\n"
+            "Luis;Sanz;Paz;no-es-un-email;fecha;4D;Calle 4;Madrid;28001;España;no;\n"
+        ).encode('utf-8-sig')
+
+        response = self.importar('pacientes.csv', contenido)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['filas'], 4)
+        self.assertEqual(response.data['creados'], 1)
+        self.assertEqual(response.data['duplicados'], 2)
+        self.assertEqual(response.data['total_errores'], 1)
+        self.assertEqual(response.data['errores'][0]['fila'], 5)
+        self.assertEqual(set(response.data['errores'][0]['errores']), {'email', 'fecha_nacimiento'})
+
+        jose = Paciente.objects.get(email="jose@example.com")
+        self.assertEqual(jose.grupo, self.group)
+        self.assertEqual(str(jose.fecha_nacimiento), "1985-03-15")
+        self.assertTrue(jose.alergias)
+        self.assertEqual(jose.patologias, ["asma", "diabetes"])
+        self.assertEqual(jose.busqueda, "jose nunez pena 1a")
+
+    def test_importar_xlsx(self):
+        from openpyxl import Workbook
+
+        libro = Workbook()
+        hoja = libro.active
+        hoja.append(["nombre", "primer_apellido", "segundo_apellido", "email", "phone", "fecha_nacimiento",
+                     "dni", "address", "city", "code_postal", "country"])
+        hoja.append(["Lucía", "Díaz", "Mora", "lucia@example.com", 600111222, date(1970, 5, 4),
+                     "5E", "Calle 5", "Sevilla", 41001, "España"])
+        contenido = io.BytesIO()
+        libro.save(contenido)
+
+        response = self.importar('pacientes.xlsx', contenido.getvalue())
+        self.assertEqual(response.data['creados'], 1)
+        lucia = Paciente.objects.get(email="lucia@example.com")
+        self.assertEqual(lucia.phone, "600111222")
+        self.assertEqual(lucia.code_postal, "41001")
+
+    def test_importar_formato_no_soportado(self):
+        response = self.importar('pacientes.txt', b"nombre\nAna\n")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_importar_csv_de_excel_en_windows_1252(self):
+        contenido = (
+            "nombre;primer_apellido;segundo_apellido;email;fecha_nacimiento;dni;address;city;code_postal;country\r\n"
+            "Begoña;Muñoz;Ibáñez;begona@example.com;1980-02-01;6F;Calle 6;Bilbao;48001;España\r\n"
+        ).encode('cp1252')
+
+        response = self.importar('pacientes.csv', contenido)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['creados'], 1)
+        self.assertEqual(Paciente.objects.get(email="begona@example.com").primer_apellido, "Muñoz")
+
+    def test_importar_xlsx_dañado(self):
+        response = self.importar('pacientes.xlsx', b"esto no es un libro de Excel")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+MEDIA_TEMPORAL = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_TEMPORAL, SUBIDAS_TAMAÑO_FRAGMENTO=4)
+class SubidaFragmentadaTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_TEMPORAL, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.group = Group.objects.create(name='Fisioterapia')
+        self.user = User.objects.create_user(username='subidas', password='testpass')
+        self.user.groups.add(self.group)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.paciente = Paciente.objects.create(
+            nombre="Ana", primer_apellido="Ruiz", segundo_apellido="Paz", email="ana@example.com",
+            fecha_nacimiento="1990-01-01", grupo=self.group
+        )
+        self.contenido = b"%PDF-1.4 contenido"
+
+    def iniciar(self, destino='documento', nombre='informe.pdf', sha256=None):
+        return self.client.post(f'/pacientes/{self.paciente.id}/subidas/', {
+            'destino': destino,
+            'nombre': nombre,
+            'tamaño': len(self.contenido),
+            'sha256': sha256 or hashlib.sha256(self.contenido).hexdigest(),
+        }, format='json')
+
+    def enviar(self, subida_id, indice):
+        datos = self.contenido[indice * 4:(indice + 1) * 4]
+        return self.client.put(f'/pacientes/subidas/{subida_id}/fragmentos/{indice}/', datos,
+                               content_type='application/octet-stream')
+
+    def test_subida_completa_documento(self):
+        response = self.iniciar()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        subida_id = response.data['id']
+        self.assertEqual(response.data['total_fragmentos'], 5)
+
+        # Los fragmentos se pueden mandar en cualquier orden
+        for indice in reversed(range(5)):
+            self.assertEqual(self.enviar(subida_id, indice).status_code, status.HTTP_200_OK)
+
+        response = self.client.post(f'/pacientes/subidas/{subida_id}/finalizar/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        documento = PacienteDocumentacion.objects.get(paciente=self.paciente)
+        with documento.archivo.open('rb') as archivo:
+            self.assertEqual(archivo.read(), self.contenido)
+        self.assertFalse(SubidaFragmentada.objects.get(id=subida_id).fragmentos.exists())
+
+    def test_reanudar_subida(self):
+        subida_id = self.iniciar().data['id']
+        self.enviar(subida_id, 0)
+        self.enviar(subida_id, 2)
+
+        response = self.client.get(f'/pacientes/subidas/{subida_id}/')
+        self.assertEqual(response.data['recibidos'], [0, 2])
+
+        response = self.client.post(f'/pacientes/subidas/{subida_id}/finalizar/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        for indice in (1, 3, 4):
+            self.enviar(subida_id, indice)
+        response = self.client.post(f'/pacientes/subidas/{subida_id}/finalizar/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_fragmento_tamaño_incorrecto(self):
+        subida_id = self.iniciar().data['id']
+        response = self.client.put(f'/pacientes/subidas/{subida_id}/fragmentos/0/', b"abcdef",
+                                   content_type='application/octet-stream')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sha256_no_coincide(self):
+        subida_id = self.iniciar(sha256='0' * 64).data['id']
+        for indice in range(5):
+            self.enviar(subida_id, indice)
+
+        response = self.client.post(f'/pacientes/subidas/{subida_id}/finalizar/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(PacienteDocumentacion.objects.exists())
+        self.assertEqual(self.client.get(f'/pacientes/subidas/{subida_id}/').data['recibidos'], [])
+
+    def test_subida_pdf_firmado(self):
+        subida_id = self.iniciar(destino='pdf_firmado_general', nombre='firmado.pdf').data['id']
+        for indice in range(5):
+            self.enviar(subida_id, indice)
+
+        response = self.client.post(f'/pacientes/subidas/{subida_id}/finalizar/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.paciente.refresh_from_db()
+        with self.paciente.pdf_firmado_general.open('rb') as archivo:
+            self.assertEqual(archivo.read(), self.contenido)
+
+    def test_subida_de_otro_usuario(self):
+        subida_id = self.iniciar().data['id']
+        otro = User.objects.create_user(username='otro', password='testpass')
+        otro.groups.add(self.group)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(otro).access_token}')
+        self.assertEqual(self.enviar(subida_id, 0).status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_TEMPORAL)
+class DocumentoMiniaturaTest(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(name='Fisioterapia')
+        self.user = User.objects.create_user(username='miniaturas', password='testpass')
+        self.user.groups.add(self.group)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.paciente = Paciente.objects.create(
+            nombre="Ana", primer_apellido="Ruiz", segundo_apellido="Paz", email="ana@example.com",
+            fecha_nacimiento="1990-01-01", grupo=self.group
+        )
+
+    def documento(self, nombre, contenido):
+        return PacienteDocumentacion.objects.create(
+            paciente=self.paciente, archivo=SimpleUploadedFile(nombre, contenido)
+        )
+
+    def png(self, ancho, alto):
+        from PIL import Image
+
+        contenido = io.BytesIO()
+        Image.new('RGBA', (ancho, alto), (255, 0, 0, 128)).save(contenido, 'PNG')
+        return contenido.getvalue()
+
+    def pdf(self):
+        from reportlab.pdfgen import canvas
+
+        contenido = io.BytesIO()
+        documento = canvas.Canvas(contenido)
+        documento.drawString(100, 750, "Consentimiento")
+        documento.save()
+        return contenido.getvalue()
+
+    def test_comando_genera_miniaturas_pendientes(self):
+        from PIL import Image
+
+        imagen = self.documento("radiografia.png", self.png(1600, 800))
+        pdf = self.documento("informe.pdf", self.pdf())
+        roto = self.documento("roto.pdf", b"%PDF-1.4 sin contenido")
+
+        call_command('generar_miniaturas', '--once', stdout=io.StringIO())
+
+        for documento in (imagen, pdf, roto):
+            documento.refresh_from_db()
+        self.assertEqual(imagen.miniatura_estado, PacienteDocumentacion.MINIATURA_GENERADA)
+        self.assertEqual(pdf.miniatura_estado, PacienteDocumentacion.MINIATURA_GENERADA)
+        self.assertEqual(roto.miniatura_estado, PacienteDocumentacion.MINIATURA_ERROR)
+        with imagen.miniatura.open('rb') as archivo:
+            miniatura = Image.open(archivo)
+            self.assertEqual(miniatura.format, 'JPEG')
+            self.assertEqual(miniatura.size, (320, 160))
+
+        response = self.client.get(f'/pacientes/documentos/?patient_id={self.paciente.pk}')
+        miniaturas = {doc['id']: doc['miniatura'] for doc in response.data['results']}
+        self.assertTrue(miniaturas[imagen.id].endswith('.jpg'))
+        self.assertIsNone(miniaturas[roto.id])
+
+    def test_vista_genera_la_miniatura_bajo_demanda(self):
+        documento = self.documento("foto.png", self.png(50, 50))
+
+        response = self.client.get(reverse('document-thumbnail', args=[documento.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'\xff\xd8'))
+        documento.refresh_from_db()
+        self.assertEqual(documento.miniatura_estado, PacienteDocumentacion.MINIATURA_GENERADA)
+
+        otro_grupo = Group.objects.create(name='Psicología')
+        self.paciente.grupo = otro_grupo
+        self.paciente.save()
+        response = self.client.get(reverse('document-thumbnail', args=[documento.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_TEMPORAL)
+class EliminacionPacienteTest(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(name='Fisioterapia')
+        self.user = User.objects.create_user(username='eliminar', password='testpass')
+        self.user.groups.add(self.group)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.paciente = Paciente.objects.create(
+            nombre="Ana", primer_apellido="Ruiz", segundo_apellido="Paz", email="ana@example.com",
+            fecha_nacimiento="1990-01-01", grupo=self.group
+        )
+        self.documento = PacienteDocumentacion.objects.create(
+            paciente=self.paciente, archivo=SimpleUploadedFile("informe.pdf", b"%PDF-1.4 informe")
+        )
+        self.citas = [
+            Cita.objects.create(paciente=self.paciente, user=self.user, fecha="2024-05-01",
+                                comenzar=f"{hora}:00", finalizar=f"{hora}:45")
+            for hora in (9, 10, 11)
+        ]
+        self.factura = Factura(cita=self.citas[0], numero_factura=1, usuario=self.user)
+        self.factura.pdf.save("factura_1.pdf", ContentFile(b"%PDF-1.4 factura"))
+
+    def test_eliminar_oculta_al_momento_y_purga_despues(self):
+        response = self.client.delete(f'/pacientes/{self.paciente.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        # Oculto en el acto, pero los datos siguen hasta la purga
+        self.assertEqual(self.client.get(f'/pacientes/{self.paciente.pk}/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get('/pacientes/').data['results'], [])
+        self.assertEqual(Cita.objects.filter(paciente_id=self.paciente.pk).count(), 3)
+
+        # Se puede volver a dar de alta el mismo email en el grupo
+        Paciente.objects.create(
+            nombre="Ana", primer_apellido="Ruiz", segundo_apellido="Paz", email="ana@example.com",
+            fecha_nacimiento="1990-01-01", grupo=self.group
+        )
+
+        directorio = os.path.join(MEDIA_TEMPORAL, "pacientes", str(self.paciente.uuid))
+        self.assertTrue(os.path.isdir(directorio))
+        factura_pdf = self.factura.pdf.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('purgar_pacientes', '--once', '--lote', '2', stdout=io.StringIO())
+
+        self.assertFalse(Paciente.todos.filter(pk=self.paciente.pk).exists())
+        self.assertFalse(Cita.objects.filter(pk__in=[cita.pk for cita in self.citas]).exists())
+        self.assertFalse(Factura.objects.filter(pk=self.factura.pk).exists())
+        self.assertFalse(PacienteDocumentacion.objects.filter(pk=self.documento.pk).exists())
+        self.assertFalse(os.path.exists(directorio))
+        self.assertFalse(self.factura.pdf.storage.exists(factura_pdf))
+        self.assertFalse(Blob.objects.filter(referencias__gt=0).exists())
+
+    @override_settings(WHATSAPP_CLIENT="citas.whatsapp.FakeWhatsAppClient", WHATSAPP_MENSAJES_POR_SEGUNDO=1000)
+    def test_eliminar_borra_su_agenda_pendiente(self):
+        UserInfo.objects.filter(user=self.user).update(
+            twilio_account_sid="AC123", twilio_auth_token="token", whatsapp_business_number="+14155238886"
+        )
+        Paciente.objects.filter(pk=self.paciente.pk).update(phone="+34600000000")
+        FakeWhatsAppClient.outbox = []
+        mañana = timezone.localdate() + timedelta(days=1)
+        futura = Cita.objects.create(paciente=self.paciente, user=self.user, fecha=mañana,
+                                     comenzar="09:00", finalizar="09:45")
+        SerieCita.objects.create(paciente=self.paciente, user=self.user, fecha_inicio=mañana,
+                                 comenzar="12:00", finalizar="12:45")
+
+        response = self.client.delete(f'/pacientes/{self.paciente.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        calendario = self.client.get('/citas/calendario/', {'start': mañana.isoformat(), 'end': mañana.isoformat()})
+        self.assertEqual(calendario.data['dias'], {})
+        self.assertTrue(CitaEliminada.objects.filter(cita_id=futura.pk).exists())
+        # Las citas pasadas siguen hasta la purga
+        self.assertEqual(Cita.objects.filter(paciente_id=self.paciente.pk).count(), 3)
+
+        call_command('enviar_recordatorios_manana', stdout=io.StringIO())
+        call_command('enviar_recordatorios_manana', fecha="2024-05-01", stdout=io.StringIO())
+        self.assertEqual(FakeWhatsAppClient.outbox, [])
+        self.assertFalse(RecordatorioEnvio.objects.exists())
+
+
+class ResumenPacienteTest(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(name='Fisioterapia')
+        self.user = User.objects.create_user(username='resumen', password='testpass')
+        self.user.groups.add(self.group)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.paciente = Paciente.objects.create(
+            nombre="Ana", primer_apellido="Ruiz", segundo_apellido="Paz", email="ana@example.com",
+            fecha_nacimiento="1990-01-01", grupo=self.group
+        )
+        self.pasadas = [
+            Cita.objects.create(paciente=self.paciente, user=self.user, fecha=f"2024-05-0{dia}",
+                                comenzar="10:00", finalizar="10:45", precio=30, pagado=dia == 1)
+            for dia in (1, 2, 3)
+        ]
+        self.proxima = Cita.objects.create(paciente=self.paciente, user=self.user, fecha="2099-01-01",
+                                           comenzar="10:00", finalizar="10:45")
+        Factura.objects.create(cita=self.pasadas[0], numero_factura=1, total=30, usuario=self.user)
+        PacienteDocumentacion.objects.create(
+            paciente=self.paciente, archivo=SimpleUploadedFile("informe.pdf", b"%PDF-1.4 informe")
+        )
+        self.url = reverse('patient-summary', args=[self.paciente.pk])
+
+    def test_resumen_en_una_peticion(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('citas', response.data['paciente'])
+        totales = response.data['totales']
+        self.assertEqual(totales['citas'], 4)
+        self.assertEqual(totales['visitas'], 3)
+        self.assertEqual(float(totales['pendiente_pago']), 60)
+        self.assertEqual(totales['facturas'], 1)
+        self.assertEqual(totales['documentos'], 1)
+        self.assertEqual(str(totales['ultima_visita']), '2024-05-03')
+        self.assertEqual(str(totales['proxima_visita']), '2099-01-01')
+        self.assertEqual([c['id'] for c in response.data['proximas_citas']], [self.proxima.id])
+        self.assertEqual([c['id'] for c in response.data['ultimas_visitas']], [c.id for c in reversed(self.pasadas)])
+        self.assertEqual(len(response.data['facturas']), 1)
+        self.assertEqual(len(response.data['documentos']), 1)
+
+    def test_etag_responde_304_hasta_que_cambia_algo(self):
+        with CaptureQueriesContext(connection) as completa:
+            etag = self.client.get(self.url)['ETag']
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        # Con el 304 no se leen los tramos de citas, facturas ni documentos
+        self.assertLessEqual(len(consultas), len(completa) - 4)
+
+        self.pasadas[1].pagado = True
+        self.pasadas[1].save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_paciente_de_otro_grupo(self):
+        self.paciente.grupo = Group.objects.create(name='Psicología')
+        self.paciente.save()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
@@ -1,13 +1,27 @@
 from django.urls import path
-from .views import PatientListCreateView, PatientRetrieveUpdateDestroyView, UploadSignedPDFView, PatientDocumentListCreateView, PatientDocumentDeleteView
+from .views import PatientListCreateView, PatientAutocompleteView, PatientImportView, PatientExportView, SubidaFragmentadaCreateView, SubidaFragmentadaDetailView, FragmentoSubidaView, FinalizarSubidaView, PatientRetrieveUpdateDestroyView, PatientSummaryView, UploadSignedPDFView, PatientDocumentListCreateView, PatientDocumentDeleteView, PatientDocumentThumbnailView
 
 urlpatterns = [
     # Ruta listar y crear pacientes
     path('', PatientListCreateView.as_view(), name="patient-list-create"),
+    # Ruta para autocompletar pacientes (selectores)
+    path('autocompletar/', PatientAutocompleteView.as_view(), name="patient-autocomplete"),
+    # Ruta para importar pacientes desde CSV/XLSX
+    path('importar/', PatientImportView.as_view(), name="patient-import"),
+    # Ruta para exportar pacientes (CSV/NDJSON)
+    path('exportar/', PatientExportView.as_view(), name="patient-export"),
     # Ruta para obtener, actualizar y eliminar un paciente
     path('<int:pk>/', PatientRetrieveUpdateDestroyView.as_view(), name="patient-detail"),
+    # Resumen del paciente (ficha, citas, facturas y documentos) con ETag
+    path('<int:pk>/resumen/', PatientSummaryView.as_view(), name="patient-summary"),
     # Ruta para subir el PDF firmado
     path('<int:pk>/upload-signed-pdf/', UploadSignedPDFView.as_view(), name="upload-signed-pdf"),
+    # Subidas por fragmentos: iniciar, estado, fragmentos y finalizar
+    path('<int:pk>/subidas/', SubidaFragmentadaCreateView.as_view(), name="subida-crear"),
+    path('subidas/<uuid:subida_id>/', SubidaFragmentadaDetailView.as_view(), name="subida-detalle"),
+    path('subidas/<uuid:subida_id>/fragmentos/<int:indice>/', FragmentoSubidaView.as_view(), name="subida-fragmento"),
+    path('subidas/<uuid:subida_id>/finalizar/', FinalizarSubidaView.as_view(), name="subida-finalizar"),
     path('documentos/', PatientDocumentListCreateView.as_view(), name="list-create-document"),
+    path('documentos/<int:pk>/miniatura/', PatientDocumentThumbnailView.as_view(), name='document-thumbnail'),
     path('documentos/<int:pk>/eliminar/', PatientDocumentDeleteView.as_view(), name='delete-document'),
 ]
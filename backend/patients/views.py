@@ -1,19 +1,52 @@
 from rest_framework import generics, status, serializers
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.http import JsonResponse
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.http import parse_etags
 from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q
-from .models import Paciente, PacienteDocumentacion
-from .serializers import PacienteSerializer, PacienteDocumentoSerializer
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from .models import Paciente, PacienteDocumentacion, SubidaFragmentada, CAMPOS_PDF_FIRMADO, tiene_cabecera_pdf
+from .serializers import PacienteSerializer, PacienteListSerializer, PacienteDocumentoSerializer, PacienteFichaSerializer
+from citas.models import Cita
+from citas.serializers import CitaSerializer
+from facturacion.serializers import FacturaSerializer
+from .busqueda import buscar_pacientes
+from .autocompletar import autocompletar
+from .importacion import ErrorImportacion, importar_pacientes
+from .eliminacion import marcar_eliminado
+from .miniaturas import generar_miniatura
+from .resumen import cargar_tramos, con_totales, etag_resumen
+from .subidas import ErrorSubida, estado_subida, finalizar_subida, guardar_fragmento, iniciar_subida
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from django.core.exceptions import ValidationError
-
-class PatientPagination(PageNumberPagination):
+from backend.roles import get_roles
+from backend.pagination import KeysetPaginationMixin
+from backend.exportacion import FORMATOS, respuesta_exportacion
+
+def contar_por_paciente(queryset):
+    """
+    Subconsulta con el número de filas de 'queryset' de cada paciente. Con
+    subconsultas cada contador se calcula por separado y no se multiplican las
+    filas como al hacer Count sobre dos JOIN.
+    """
+    total = (
+        queryset.filter(paciente=OuterRef('pk'))
+        .order_by()
+        .values('paciente')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(total, output_field=IntegerField()), 0)
+
+class PatientPagination(KeysetPaginationMixin, PageNumberPagination):
     page_size = 8
+    keyset_ordering = ('-created_at', '-id')
     page_size_query_param = 'page_size'
     max_page_size = 100
 
@@ -23,58 +56,196 @@ class PatientListCreateView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     pagination_class = PatientPagination
 
+    def get_serializer_class(self):
+        # El listado usa la representación ligera; al crear se devuelve la completa
+        if self.request.method == 'GET':
+            return PacienteListSerializer
+        return PacienteSerializer
+
     def get_queryset(self):
-        user = self.request.user  # Obtener al usuario que realiza la consulta
         search_term = self.request.query_params.get('search', None)
 
         # Inicializar queryset con todos los pacientes
         queryset = Paciente.objects.all()
 
-        # Filtrar pacientes por grupo(s) del usuario
-        relevant_groups = user.groups.exclude(name='Admin')  # Excluimos el grupo admin
+        # Filtrar pacientes por grupo(s) del usuario (sin contar Admin)
+        relevant_group_ids = get_roles(self.request).tenant_group_ids
 
-        if relevant_groups.exists():
+        if relevant_group_ids:
             # Si el usuario pertenece a un grupo relevante, filtramos los pacientes por ese/estos grupos
-            queryset = queryset.filter(grupo__in=relevant_groups).distinct()
+            queryset = queryset.filter(grupo_id__in=relevant_group_ids)
         else:
             queryset = queryset.none()  # Si el usuario no tiene grupos relevantes, no mostramos pacientes
 
-        # Filtrado por término de búsqueda, si existe
+        # Filtrado por término de búsqueda (sin tildes, también por DNI y teléfono)
         if search_term:
-            queryset = queryset.filter(
-                Q(nombre__icontains=search_term) |
-                Q(primer_apellido__icontains=search_term) |
-                Q(segundo_apellido__icontains=search_term)
+            queryset = buscar_pacientes(queryset, search_term)
+
+        if self.request.method == 'GET':
+            queryset = queryset.select_related('grupo').annotate(
+                num_documentos=contar_por_paciente(PacienteDocumentacion.objects.all()),
+                num_citas=contar_por_paciente(Cita.objects.all()),
             )
 
         return queryset
 
     def perform_create(self, serializer):
-        user = self.request.user
-        relevant_groups = user.groups.exclude(name='Admin')
+        relevant_groups = get_roles(self.request).tenant_groups
 
-        if not relevant_groups.exists():
+        if not relevant_groups:
             raise ValidationError("El usuario no pertenece a ningún grupo válido para asignar paciente.")
 
         # Si quieres asegurarte de que solo un grupo sea asignado, podrías:
-        if relevant_groups.count() > 1:
+        if len(relevant_groups) > 1:
             # Aquí podrías lanzar error o elegir un grupo específico basado en lógica de negocio
             raise ValidationError("El usuario pertenece a múltiples grupos, no se puede asignar paciente automáticamente.")
 
-        relevant_group = relevant_groups.first()
-        serializer.save(grupo=relevant_group)
+        serializer.save(grupo=relevant_groups[0])
+
+class PatientImportView(APIView):
+    """
+    Importación masiva de pacientes desde un CSV o XLSX (campo 'file') al
+    grupo del usuario. Devuelve cuántos se han creado, cuántos se han saltado
+    por duplicados y los errores de validación por fila.
+    """
+    parser_classes = (MultiPartParser, FormParser)
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        fichero = request.FILES.get('file')
+        if not fichero:
+            return Response({"error": "No se ha enviado ningún fichero"}, status=status.HTTP_400_BAD_REQUEST)
+
+        grupos = get_roles(request).tenant_groups
+        if len(grupos) != 1:
+            return Response(
+                {"error": "El usuario debe pertenecer a un único grupo para importar pacientes"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            informe = importar_pacientes(fichero, fichero.name, grupos[0])
+        except ErrorImportacion as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(informe, status=status.HTTP_200_OK)
+
+COLUMNAS_EXPORTACION_PACIENTES = [
+    ('id', 'id'),
+    ('nombre', 'nombre'),
+    ('primer_apellido', 'primer_apellido'),
+    ('segundo_apellido', 'segundo_apellido'),
+    ('email', 'email'),
+    ('phone', 'phone'),
+    ('fecha_nacimiento', 'fecha_nacimiento'),
+    ('dni', 'dni'),
+    ('address', 'address'),
+    ('city', 'city'),
+    ('code_postal', 'code_postal'),
+    ('country', 'country'),
+    ('alergias', 'alergias'),
+    ('grupo__name', 'grupo'),
+    ('created_at', 'created_at'),
+]
+
+class PatientExportView(APIView):
+    """
+    Exporta en streaming (CSV o NDJSON con ?formato=) los pacientes que el
+    usuario ve en el listado, con el mismo filtro ?search= opcional.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATOS:
+            return Response({"error": "formato debe ser csv o ndjson"}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = Paciente.objects.filter(grupo_id__in=get_roles(request).tenant_group_ids)
+        search_term = request.query_params.get('search')
+        if search_term:
+            queryset = buscar_pacientes(queryset, search_term)
+        else:
+            queryset = queryset.order_by('-created_at', '-id')
+
+        return respuesta_exportacion(queryset, COLUMNAS_EXPORTACION_PACIENTES, 'pacientes', formato)
+
+MAX_RESULTADOS_AUTOCOMPLETAR = 20
+
+class PatientAutocompleteView(APIView):
+    """
+    Sugerencias de pacientes para los selectores (p. ej. al crear una cita).
+    Se sirven desde el índice de prefijos en memoria de cada grupo, sin
+    consultar la tabla de pacientes mientras no cambie.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        termino = request.query_params.get('q', '')
+        try:
+            limite = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({"error": "limit debe ser un número entero"}, status=status.HTTP_400_BAD_REQUEST)
+        limite = max(1, min(limite, MAX_RESULTADOS_AUTOCOMPLETAR))
+
+        return Response(autocompletar(get_roles(request).tenant_group_ids, termino, limite))
 
 # Obtener, Actualizar y Eliminar Pacientes
 class PatientRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Paciente.objects.all()
+    queryset = Paciente.objects.select_related('grupo').prefetch_related('documentos')
     serializer_class = PacienteSerializer
     permission_classes = [IsAuthenticated]
 
     def delete(self, request, *args, **kwargs):
         instance = self.get_object()
-        instance.delete()
+        # Se oculta al momento; sus citas, facturas y ficheros los borra
+        # el comando purgar_pacientes (ver patients/eliminacion.py)
+        marcar_eliminado(instance)
         return Response({'message': 'Paciente eliminado correctamente'}, status=status.HTTP_204_NO_CONTENT)
 
+# Resumen del paciente: ficha, próximas citas, últimas visitas, facturas y
+# documentos recientes con sus totales (ver patients/resumen.py)
+class PatientSummaryView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        ahora = timezone.localtime()
+        pacientes = Paciente.objects.filter(grupo_id__in=get_roles(request).tenant_group_ids).select_related('grupo')
+        paciente = get_object_or_404(con_totales(pacientes, ahora), pk=pk)
+
+        etag = etag_resumen(paciente)
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and ('*' in parse_etags(if_none_match) or etag in parse_etags(if_none_match)):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        facturas = cargar_tramos(paciente, ahora)
+        context = {'request': request}
+        proximas = paciente.proximas_citas
+        ultimas = paciente.ultimas_visitas
+
+        response = Response({
+            "paciente": PacienteFichaSerializer(paciente, context=context).data,
+            "totales": {
+                "citas": paciente.total_citas,
+                "visitas": paciente.total_visitas,
+                "pendiente_pago": paciente.pendiente_pago,
+                "facturas": paciente.total_facturas,
+                "facturado": paciente.total_facturado,
+                "documentos": paciente.total_documentos,
+                "ultima_visita": ultimas[0].fecha if ultimas else None,
+                "proxima_visita": proximas[0].fecha if proximas else None,
+            },
+            "proximas_citas": CitaSerializer(proximas, many=True, context=context).data,
+            "ultimas_visitas": CitaSerializer(ultimas, many=True, context=context).data,
+            "facturas": FacturaSerializer(facturas, many=True, context=context).data,
+            "documentos": PacienteDocumentoSerializer(paciente.ultimos_documentos, many=True, context=context).data,
+        })
+        response['ETag'] = etag
+        # El navegador guarda la respuesta pero la revalida siempre con el ETag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
 # Vista para subir el PDF firmado
 
 class UploadSignedPDFView(APIView):
@@ -85,54 +256,82 @@ class UploadSignedPDFView(APIView):
         # Obtener al paciente con el id 'pk' (si no existe, 404)
         patient = get_object_or_404(Paciente, pk=pk)
 
-        if not request.FILES:
-            return JsonResponse({"error": "No se ha subido ningún archivo."}, status=400)
+        ficheros = {campo: request.FILES[campo] for campo in CAMPOS_PDF_FIRMADO if campo in request.FILES}
+        if not ficheros:
+            return Response({"error": "No se ha subido ningún archivo."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Asegúrate de que todos los archivos subidos sean PDFs
-        for file in request.FILES.values():
-            if not file.name.endswith('.pdf'):
-                return JsonResponse({"error": "El archivo debe ser un PDF."}, status=400)
+        # Extensión y cabecera %PDF-: solo se lee el primer bloque de cada fichero
+        for file in ficheros.values():
+            if not file.name.lower().endswith('.pdf') or not tiene_cabecera_pdf(file):
+                return Response({"error": "El archivo debe ser un PDF."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Diccionario con los campos de archivo del modelo Patient
-        file_fields = {
-            "pdf_firmado_general": "paciente_{}_LPD.pdf",
-            "pdf_firmado_menor": "paciente_{}_CM.pdf",
-            "pdf_firmado_inyecciones": "paciente_{}_CMI.pdf"
-        }
+        # Todos los PDFs en un solo UPDATE. Los que se sustituyen los borra
+        # almacenamiento.signals cuando se confirma la transacción.
+        with transaction.atomic():
+            for campo, file in ficheros.items():
+                setattr(patient, campo, file)
+            patient.save(update_fields=list(ficheros))
+
+        saved_files = {campo: getattr(patient, campo).url for campo in ficheros}
+        return Response({"message": "PDF(s) guardado(s) correctamente", "pdf_urls": saved_files})
 
-        saved_files = {}
+# Subidas por fragmentos (ver patients/subidas.py)
+class SubidaFragmentadaCreateView(APIView):
+    permission_classes = [IsAuthenticated]
 
-        # Iterar sobre los archivos y los campos esperados en el modelo
-        for field_name, file_name_template in file_fields.items():
-            if field_name in request.FILES:
-                file = request.FILES[field_name]
+    def post(self, request, pk):
+        paciente = get_object_or_404(Paciente, pk=pk, grupo_id__in=get_roles(request).tenant_group_ids)
+        try:
+            subida = iniciar_subida(
+                paciente, request.user,
+                destino=request.data.get('destino'),
+                nombre=request.data.get('nombre'),
+                tamaño=request.data.get('tamaño'),
+                sha256=request.data.get('sha256'),
+            )
+        except ErrorSubida as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(estado_subida(subida), status=status.HTTP_201_CREATED)
 
-                # Verifica nuevamente que el archivo sea un PDF
-                if not file.name.endswith('.pdf'):
-                    return JsonResponse({"error": "El archivo debe ser un PDF."}, status=400)
 
-                # Genera el nombre del archivo para el paciente
-                pdf_name = file_name_template.format(pk)
+class SubidaFragmentadaDetailView(APIView):
+    permission_classes = [IsAuthenticated]
 
-                # Asigna el archivo al campo correspondiente del modelo (usando un FileField en el modelo)
-                if field_name == "pdf_firmado_general":
-                    patient.pdf_firmado_general = file
-                elif field_name == "pdf_firmado_menor":
-                    patient.pdf_firmado_menor = file
-                elif field_name == "pdf_firmado_inyecciones":
-                    patient.pdf_firmado_inyecciones = file
+    def get(self, request, subida_id):
+        subida = get_object_or_404(SubidaFragmentada, id=subida_id, user=request.user)
+        return Response(estado_subida(subida))
 
-                # Guarda el modelo después de asignar los archivos
-                patient.save()
 
-                # Obtener la URL del archivo guardado en S3 o en el almacenamiento configurado
-                file_url = getattr(patient, field_name).url
+class FragmentoSubidaView(APIView):
+    """
+    Recibe un fragmento como cuerpo crudo del PUT (application/octet-stream).
+    """
+    permission_classes = [IsAuthenticated]
 
-                # Añadir la URL del archivo al diccionario de archivos guardados
-                saved_files[field_name] = file_url
+    def put(self, request, subida_id, indice):
+        subida = get_object_or_404(SubidaFragmentada, id=subida_id, user=request.user)
+        try:
+            guardar_fragmento(subida, indice, request.stream)
+        except ErrorSubida as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(estado_subida(subida))
 
-        # Retornar la respuesta con las URLs de los PDFs guardados
-        return Response({"message": "PDF(s) guardado(s) correctamente", "pdf_urls": saved_files})
+
+class FinalizarSubidaView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, subida_id):
+        get_object_or_404(SubidaFragmentada, id=subida_id, user=request.user)
+        try:
+            subida = finalizar_subida(subida_id, request.user)
+        except ErrorSubida as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if subida.destino == SubidaFragmentada.DOCUMENTO:
+            return Response(PacienteDocumentoSerializer(subida.documento).data, status=status.HTTP_201_CREATED)
+        pdf = getattr(subida.paciente, subida.destino)
+        return Response({"message": "PDF guardado correctamente", "pdf_urls": {subida.destino: pdf.url}},
+                        status=status.HTTP_201_CREATED)
 
 # Subir documentos al paciente y listar
 class PatientDocumentListCreateView(generics.ListCreateAPIView):
@@ -155,6 +354,26 @@ class PatientDocumentListCreateView(generics.ListCreateAPIView):
         serializer.save(paciente=paciente)
 
 
+# Miniatura del documento (se genera la primera vez si aún no lo ha hecho el comando generar_miniaturas)
+class PatientDocumentThumbnailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        documento = get_object_or_404(
+            PacienteDocumentacion, pk=pk, paciente__grupo_id__in=get_roles(request).tenant_group_ids
+        )
+        if documento.miniatura_estado == PacienteDocumentacion.MINIATURA_PENDIENTE:
+            documento = generar_miniatura(documento.id)
+
+        if documento.miniatura_estado != PacienteDocumentacion.MINIATURA_GENERADA:
+            return Response({"error": "Este documento no tiene miniatura."}, status=status.HTTP_404_NOT_FOUND)
+
+        response = FileResponse(documento.miniatura.open('rb'), content_type='image/jpeg')
+        # La miniatura no cambia: si cambia el documento es otro documento
+        response['Cache-Control'] = 'private, max-age=604800'
+        return response
+
+
 # Eliminar documento del paciente
 class PatientDocumentDeleteView(generics.DestroyAPIView):
     queryset = PacienteDocumentacion.objects.all()
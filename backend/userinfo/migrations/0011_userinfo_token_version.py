@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userinfo', '0010_userinfo_nombre_userinfo_primer_apellido_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userinfo',
+            name='token_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -22,5 +22,9 @@ class UserInfo(models.Model):
     twilio_auth_token = models.CharField(max_length=255, blank=True, null=True)
     twilio_integration_verified = models.BooleanField(default=False)
 
+    # Se incrementa al cambiar los grupos del usuario; los tokens emitidos con
+    # una versión anterior dejan de usarse como fuente de sus grupos
+    token_version = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return f"Información de {self.user.username}"
\ No newline at end of file
@@ -1,9 +1,27 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from .models import UserInfo
+from .tokens import incrementar_token_version
 
 @receiver(post_save, sender=User)
 def create_user_info(sender, instance, created, **kwargs):
     if created:  # Solo se ejecuta cuando se crea un nuevo usuario
-        UserInfo.objects.create(user=instance)
\ No newline at end of file
+        UserInfo.objects.create(user=instance)
+    elif not instance.is_active:
+        # Un usuario desactivado no puede seguir usando sus tokens sin pasar por la base de datos
+        incrementar_token_version([instance.pk])
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidar_tokens_al_cambiar_grupos(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Cambiar los grupos de un usuario invalida los grupos que llevan sus tokens.
+    Con reverse=True el cambio se hace desde el grupo (group.user_set.add(...)).
+    """
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            incrementar_token_version([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        incrementar_token_version(pk_set)
+    elif action == 'pre_clear':
+        incrementar_token_version(instance.user_set.values_list('id', flat=True))
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from .models import UserInfo
+
+
+def cache_key_token_version(user_id):
+    return f"userinfo:token_version:{user_id}"
+
+
+def get_token_version(user_id):
+    """
+    Versión actual de los tokens del usuario. Se guarda en caché
+    JWT_TOKEN_VERSION_CACHE_TIMEOUT segundos para no consultar la base de
+    datos en cada petición. Devuelve None si el usuario no tiene UserInfo.
+    """
+    key = cache_key_token_version(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = UserInfo.objects.filter(user_id=user_id).values_list('token_version', flat=True).first()
+        if version is not None:
+            cache.set(key, version, getattr(settings, 'JWT_TOKEN_VERSION_CACHE_TIMEOUT', 60))
+    return version
+
+
+def incrementar_token_version(user_ids):
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    UserInfo.objects.filter(user_id__in=user_ids).update(token_version=F('token_version') + 1)
+    claves = [cache_key_token_version(user_id) for user_id in user_ids]
+    cache.delete_many(claves)
+    # La caché es compartida (CACHES en settings.py): se vuelve a borrar al
+    # confirmar por si otro proceso guardó la versión anterior entretanto
+    transaction.on_commit(lambda: cache.delete_many(claves))
+
+
+def añadir_claims(token, user):
+    """
+    Claims propios que llevan los tokens: datos básicos del usuario, sus
+    grupos y la versión con la que se emitieron.
+    """
+    grupos = list(user.groups.values_list('id', 'name'))
+    token['user_id'] = user.id
+    token['groups'] = [name for _, name in grupos]
+    token['group_ids'] = [group_id for group_id, _ in grupos]
+    token['first_name'] = user.first_name
+    token['last_name'] = user.last_name
+
+    version = get_token_version(user.id)
+    if version is not None:
+        token['token_version'] = version
+    return token
@@ -0,0 +1,138 @@
+"""
+Feed iCalendar (ICS) con la agenda de un worker, para suscribirse desde el
+calendario del móvil.
+
+El feed cubre una ventana móvil (DIAS_ATRAS días atrás y DIAS_ADELANTE
+adelante) e incluye las citas y las ocurrencias de sus series que aún no son
+cita. Se genera en streaming, leyendo las citas con iterator().
+
+Los clientes de calendario consultan el feed cada pocos minutos: la versión
+(ETag) se calcula con dos consultas de agregados, de modo que si no ha
+cambiado nada se responde 304 sin generar el feed. No se envía Last-Modified:
+los borrados, las citas que pasan a otro worker y el avance de la ventana no
+dejan una fecha de modificación en las filas del feed, y un cliente que solo
+usara If-Modified-Since se quedaría con eventos que ya no existen.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone as datetime_timezone
+from django.db.models import Count, Max
+from django.utils import timezone
+from citas.models import Cita, SerieCita
+from citas.ocurrencias import ocurrencias, series_en_rango
+
+DIAS_ATRAS = 30
+DIAS_ADELANTE = 180
+TAMAÑO_BLOQUE = 2000
+
+CAMPOS_CITA = (
+    'id', 'fecha', 'comenzar', 'finalizar', 'descripcion', 'updated_at', 'serie_id', 'fecha_serie',
+    'paciente__nombre', 'paciente__primer_apellido', 'paciente__segundo_apellido',
+)
+
+
+def ventana():
+    hoy = timezone.localdate()
+    return hoy - timedelta(days=DIAS_ATRAS), hoy + timedelta(days=DIAS_ADELANTE)
+
+
+def version_feed(worker, start, end):
+    """
+    ETag del feed. Además de las últimas modificaciones se usan los totales,
+    que cambian con los borrados, y el inicio de la ventana, que avanza cada día.
+    """
+    citas = Cita.objects.filter(worker=worker, fecha__range=(start, end)).aggregate(
+        total=Count('id'), actualizada=Max('updated_at'), paciente=Max('paciente__updated_at'),
+    )
+    series = SerieCita.objects.filter(worker=worker).aggregate(
+        total=Count('id'), actualizada=Max('updated_at'), paciente=Max('paciente__updated_at'),
+    )
+    partes = (worker.pk, start, end, *citas.values(), *series.values())
+    return '"%s"' % hashlib.sha1(repr(partes).encode()).hexdigest()
+
+
+def escapar(texto):
+    return (
+        (texto or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def linea(nombre, valor):
+    """
+    Línea de contenido terminada en CRLF y plegada a 75 octetos, como pide
+    RFC 5545 (las continuaciones empiezan por un espacio).
+    """
+    contenido = f"{nombre}:{valor}".encode()
+    partes = []
+    while len(contenido) > 75:
+        corte = 75
+        # No partir un carácter UTF-8 por la mitad
+        while corte and (contenido[corte] & 0xC0) == 0x80:
+            corte -= 1
+        partes.append(contenido[:corte])
+        contenido = b' ' + contenido[corte:]
+    partes.append(contenido)
+    return b'\r\n'.join(partes).decode() + '\r\n'
+
+
+def formato_utc(fecha, hora):
+    """Fecha y hora locales de la cita en UTC con formato iCalendar."""
+    local = timezone.make_aware(datetime.combine(fecha, hora))
+    return local.astimezone(datetime_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def evento(uid, fecha, comenzar, finalizar, resumen, descripcion, modificado):
+    yield linea('BEGIN', 'VEVENT')
+    yield linea('UID', uid)
+    yield linea('DTSTAMP', modificado.astimezone(datetime_timezone.utc).strftime('%Y%m%dT%H%M%SZ'))
+    yield linea('DTSTART', formato_utc(fecha, comenzar))
+    yield linea('DTEND', formato_utc(fecha, finalizar))
+    yield linea('SUMMARY', escapar(resumen))
+    if descripcion:
+        yield linea('DESCRIPTION', escapar(descripcion))
+    yield linea('END', 'VEVENT')
+
+
+def uid_ocurrencia(serie_id, fecha, dominio):
+    # La cita de una ocurrencia conserva su UID para que el calendario la actualice en lugar de duplicarla
+    return f"serie-{serie_id}-{fecha:%Y%m%d}@{dominio}"
+
+
+def generar_feed(worker, start, end, dominio):
+    """
+    Genera el ICS por trozos: cabecera, citas de la ventana y ocurrencias de
+    las series del worker.
+    """
+    yield linea('BEGIN', 'VCALENDAR')
+    yield linea('VERSION', '2.0')
+    yield linea('PRODID', '-//clinic_app//Agenda//ES')
+    yield linea('CALSCALE', 'GREGORIAN')
+    yield linea('X-WR-CALNAME', escapar(f"Agenda {worker.get_full_name()}"))
+
+    citas = (
+        Cita.objects.filter(worker=worker, fecha__range=(start, end))
+        .order_by('fecha', 'comenzar')
+        .values(*CAMPOS_CITA)
+        .iterator(chunk_size=TAMAÑO_BLOQUE)
+    )
+    for cita in citas:
+        if cita['serie_id'] and cita['fecha_serie']:
+            uid = uid_ocurrencia(cita['serie_id'], cita['fecha_serie'], dominio)
+        else:
+            uid = f"cita-{cita['id']}@{dominio}"
+        paciente = " ".join(filter(None, [
+            cita['paciente__nombre'], cita['paciente__primer_apellido'], cita['paciente__segundo_apellido'],
+        ]))
+        yield from evento(
+            uid, cita['fecha'], cita['comenzar'], cita['finalizar'],
+            paciente or "Cita", cita['descripcion'], cita['updated_at'],
+        )
+
+    series = series_en_rango(SerieCita.objects.filter(worker=worker), start, end).select_related('paciente')
+    for serie, fecha in ocurrencias(series, start, end):
+        yield from evento(
+            uid_ocurrencia(serie.id, fecha, dominio), fecha, serie.comenzar, serie.finalizar,
+            str(serie.paciente), serie.descripcion, serie.updated_at,
+        )
+
+    yield linea('END', 'VCALENDAR')
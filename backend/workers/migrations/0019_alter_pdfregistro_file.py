@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:51
+
+import almacenamiento.storage
+import workers.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workers', '0018_pdfregistro_created_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pdfregistro',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=almacenamiento.storage.AlmacenamientoPorContenido(), upload_to=workers.models.upload_to_registro),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workers', '0019_alter_pdfregistro_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='worker',
+            name='token_calendario',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import User, Group
+from backend.roles import RoleContext
+from almacenamiento.storage import almacenamiento_por_contenido
 from django.utils import timezone
 import os
+import secrets
 from datetime import datetime
 
 def upload_to_registro(instance, filename):
@@ -15,6 +18,13 @@ class Worker(models.Model):
     last_name = models.CharField(max_length=50, default='Desconocido')  # Valor por defecto adecuado
     groups = models.ManyToManyField(Group, related_name='workers', blank=True)
     color = models.CharField(max_length=7, default="#ffffff")
+    # Token secreto de la URL del feed ICS (ver workers/calendario.py)
+    token_calendario = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+
+    def regenerar_token_calendario(self):
+        self.token_calendario = secrets.token_urlsafe(32)
+        self.save(update_fields=['token_calendario'])
+        return self.token_calendario
 
     def get_full_name(self):
         return f"{self.first_name} {self.last_name}"
@@ -24,17 +34,37 @@ class Worker(models.Model):
         return f"{self.user.username} - {grupos}"
 
     @staticmethod
-    def for_user(user):
+    def for_user(user, roles=None):
         """
         Filtra trabajadores basados en el grupo y la rama del usuario.
         """
-        if user.groups.filter(name='Admin').exists():
+        roles = roles or RoleContext(user)
+        if roles.is_admin:
             return Worker.objects.filter(created_by=user)
         return Worker.objects.none()
 
+    @staticmethod
+    def visibles_para(user, roles=None):
+        """
+        Trabajadores que puede consultar el usuario: Admin + Fisioterapia/Psicología
+        ven todos, el resto de admins los que han creado y un worker solo el suyo.
+        Si se pasa el RoleContext de la petición no se vuelven a consultar los grupos.
+        """
+        roles = roles or RoleContext(user)
+
+        is_admin = roles.is_admin
+        has_fisio = roles.is_fisio
+        has_psico = roles.is_psico
+
+        if is_admin and (has_fisio or has_psico):
+            return Worker.objects.all()
+        if is_admin:
+            return Worker.objects.filter(created_by=user)
+        return Worker.objects.filter(user=user)
+
 class PDFRegistro(models.Model):
     worker = models.ForeignKey(Worker, related_name='pdf_registros', on_delete=models.CASCADE)
-    file = models.FileField(upload_to=upload_to_registro, blank=True, null=True)
+    file = models.FileField(upload_to=upload_to_registro, storage=almacenamiento_por_contenido, blank=True, null=True)
     created_by = models.ForeignKey(User, related_name='pdf_registros', on_delete=models.CASCADE)
     is_admin_upload = models.BooleanField(default=False)
     created_at = models.DateTimeField(default=timezone.now)
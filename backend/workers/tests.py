@@ -1,9 +1,13 @@
 from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.test import TestCase
 from django.contrib.auth.models import User, Group
 from rest_framework.test import APITestCase
 from rest_framework import status
-from datetime import datetime, time, date
+from datetime import datetime, time, date, timedelta
+from django.utils import timezone
+from django.utils.http import http_date
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.exceptions import ValidationError
@@ -11,7 +15,7 @@ from rest_framework.exceptions import ValidationError
 from patients.models import Paciente
 from workers.models import Worker, PDFRegistro
 from workers.serializers import UserSerializer, WorkerSerializer
-from citas.models import Cita
+from citas.models import Cita, SerieCita
 
 
 # ---------------- SERIALIZERS TEST ---------------- #
@@ -200,6 +204,49 @@ class WorkerViewsTest(APITestCase):
         self.assertEqual(res.status_code, 200)
         self.assertGreaterEqual(len(res.data), 1)
 
+    def test_appointment_list_sin_consulta_por_cita(self):
+        paciente = Paciente.objects.create(
+            nombre="Luis", primer_apellido="Mora", segundo_apellido="Gil", email="luis@example.com",
+            fecha_nacimiento=date(1990, 1, 1), grupo=self.fisio_group
+        )
+        url = reverse('worker-appointments-list', args=[self.worker_created.id])
+        self.auth(self.token_admin)
+
+        def crear_citas(cantidad):
+            hora = Cita.objects.count() + 8
+            Cita.objects.bulk_create([
+                Cita(worker=self.worker_created, user=self.admin_user, paciente=paciente,
+                     fecha=date(2025, 6, 10), comenzar=time(hora + i, 0), finalizar=time(hora + i, 45))
+                for i in range(cantidad)
+            ])
+
+        crear_citas(1)
+        with CaptureQueriesContext(connection) as una:
+            res = self.client.get(url)
+        self.assertEqual(res.data['results'][0]['paciente_nombre'], "Luis Mora Gil")
+        crear_citas(5)
+        with CaptureQueriesContext(connection) as seis:
+            res = self.client.get(url)
+        self.assertEqual(len(res.data['results']), 6)
+        self.assertEqual(len(seis), len(una))
+
+    def test_appointment_detail_una_consulta_para_la_cita(self):
+        paciente = Paciente.objects.create(
+            nombre="Luis", primer_apellido="Mora", segundo_apellido="Gil", email="luis@example.com",
+            fecha_nacimiento=date(1990, 1, 1), grupo=self.fisio_group
+        )
+        cita = Cita.objects.create(worker=self.worker_created, user=self.admin_user, paciente=paciente,
+                                   fecha=date(2025, 6, 10), comenzar=time(10, 0), finalizar=time(11, 0))
+        url = reverse('worker-appointment-detail', kwargs={'worker_pk': self.worker_created.pk, 'pk': cita.id})
+        self.auth(self.token_admin)
+
+        with CaptureQueriesContext(connection) as consultas:
+            res = self.client.get(url)
+        self.assertEqual(res.data['paciente_nombre'], "Luis Mora Gil")
+        # La cita llega con su paciente: ninguna consulta aparte a patients_paciente
+        self.assertFalse(any(q['sql'].startswith('SELECT') and 'FROM "patients_paciente"' in q['sql']
+                             for q in consultas.captured_queries))
+
     def test_appointment_create(self):
         self.auth(self.token_admin)
         url = reverse('worker-appointments-create', args=[self.worker_created.id])
@@ -268,6 +315,89 @@ class WorkerViewsTest(APITestCase):
         self.assertEqual(self.client.get(url2).status_code, 404)
 
 
+class WorkerCalendarioTest(APITestCase):
+    def setUp(self):
+        self.grupo = Group.objects.create(name='Fisioterapia')
+        self.admin = User.objects.create_user(username='admin', password='pass123')
+        self.admin.groups.add(Group.objects.create(name='Admin'), self.grupo)
+        self.worker = Worker.objects.create(
+            user=User.objects.create_user(username='fisio', password='pass123'),
+            created_by=self.admin, first_name='Marta', last_name='Gil'
+        )
+        self.paciente = Paciente.objects.create(
+            nombre="Luis", primer_apellido="Mora", segundo_apellido="Gil", email="luis@example.com",
+            fecha_nacimiento=date(1990, 1, 1), grupo=self.grupo
+        )
+        self.manana = timezone.localdate() + timedelta(days=1)
+        self.cita = Cita.objects.create(
+            worker=self.worker, user=self.admin, paciente=self.paciente, fecha=self.manana,
+            comenzar=time(10, 0), finalizar=time(11, 0), descripcion="Revisión; rodilla, izquierda"
+        )
+        # Fuera de la ventana del feed
+        Cita.objects.create(worker=self.worker, user=self.admin, paciente=self.paciente,
+                            fecha=self.manana + timedelta(days=400), comenzar=time(10, 0), finalizar=time(11, 0))
+        self.serie = SerieCita.objects.create(
+            worker=self.worker, user=self.admin, paciente=self.paciente, fecha_inicio=self.manana,
+            fecha_fin=self.manana + timedelta(days=7), comenzar=time(12, 0), finalizar=time(13, 0)
+        )
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(self.admin).access_token))
+
+    def url_feed(self):
+        res = self.client.get(reverse('worker-calendario', args=[self.worker.id]))
+        self.assertEqual(res.status_code, 200)
+        return res.data['url']
+
+    def test_feed_ics(self):
+        url = self.url_feed()
+        self.assertEqual(url, self.url_feed())
+
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'text/calendar; charset=utf-8')
+        ics = b''.join(res.streaming_content).decode()
+        self.assertTrue(ics.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn(f"UID:cita-{self.cita.id}@testserver", ics)
+        self.assertIn("SUMMARY:Luis Mora Gil", ics)
+        self.assertIn("DESCRIPTION:Revisión\\; rodilla\\, izquierda", ics)
+        self.assertIn(f"DTSTART:{self.manana:%Y%m%d}T100000Z", ics)
+        self.assertEqual(ics.count("BEGIN:VEVENT"), 3)  # la cita y dos ocurrencias de la serie
+        self.assertIn(f"UID:serie-{self.serie.id}-{self.manana + timedelta(days=7):%Y%m%d}@testserver", ics)
+
+    def test_get_condicional(self):
+        url = self.url_feed()
+        res = self.client.get(url)
+        etag = res['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.cita.delete()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_borrado_con_if_modified_since(self):
+        url = self.url_feed()
+        res = self.client.get(url)
+        self.assertNotIn('Last-Modified', res)
+
+        # Un cliente que solo revalida por fecha recibe el feed sin la cita borrada
+        self.cita.delete()
+        res = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn(f"UID:cita-{self.cita.id}@", b''.join(res.streaming_content).decode())
+
+    def test_token_invalido_y_regenerado(self):
+        url = self.url_feed()
+        res = self.client.post(reverse('worker-calendario', args=[self.worker.id]))
+        self.assertNotEqual(res.data['url'], url)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(res.data['url']).status_code, 200)
+
+        otro = User.objects.create_user(username='otro', password='pass123')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(otro).access_token))
+        self.assertEqual(self.client.get(reverse('worker-calendario', args=[self.worker.id])).status_code, 404)
+
+
 class PDFRegistroViewsTest(APITestCase):
     def setUp(self):
         self.admin_group = Group.objects.create(name='Admin')
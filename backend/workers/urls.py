@@ -3,7 +3,7 @@ from .views import (
     WorkerListCreateView, WorkerDetailView,
     WorkerAppointmentsView, CreateWorkerAppointmentView, AppointmentDetailView,
     UploadPDF, GetPDFs, DeletePDF,
-    WorkerIdFromUserId,
+    WorkerIdFromUserId, WorkerCalendarioView, WorkerCalendarioFeedView,
     get_worker_by_user,
 )
 
@@ -17,6 +17,10 @@ urlpatterns = [
     path('<int:worker_pk>/appointments/create/', CreateWorkerAppointmentView.as_view(), name='worker-appointments-create'),
     path('<int:worker_pk>/appointments/<int:pk>/', AppointmentDetailView.as_view(), name='worker-appointment-detail'),
 
+    # Feed ICS de la agenda: URL con token y el feed en sí
+    path('<int:worker_pk>/calendario/', WorkerCalendarioView.as_view(), name='worker-calendario'),
+    path('calendario/<str:token>.ics', WorkerCalendarioFeedView.as_view(), name='worker-calendario-feed'),
+
     # PDFs asociados a un trabajador
     path('<int:worker_pk>/pdfs/upload/', UploadPDF.as_view(), name='worker-pdf-upload'),
     path('<int:worker_pk>/pdfs/', GetPDFs.as_view(), name='worker-pdf-list'),
@@ -1,5 +1,4 @@
 from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView, ListAPIView, CreateAPIView
-from django.core.files.storage import FileSystemStorage
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated
@@ -8,15 +7,20 @@ from django.db import IntegrityError
 from .models import Worker, PDFRegistro
 from .serializers import WorkerSerializer, PDFRegistroSerializer
 from citas.models import Cita
-from citas.serializers import CitaSerializer
+from citas.serializers import CitaSerializer, CitaLecturaSerializer, citas_para_lectura
 from backend.permissions import IsAdminOrReadOnlyForWorkers
+from backend.roles import get_roles
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
+from django.http import Http404, StreamingHttpResponse
+from django.urls import reverse
+from django.views import View
+from django.utils.cache import get_conditional_response
+from .calendario import generar_feed, ventana, version_feed
 from rest_framework.decorators import api_view
 from rest_framework.pagination import PageNumberPagination
 import logging
-import os
 
 logger = logging.getLogger(__name__)
 
@@ -51,23 +55,7 @@ class WorkerListCreateView(ListCreateAPIView):
     permission_classes = [IsAuthenticated, IsAdminOrReadOnlyForWorkers]
 
     def get_queryset(self):
-        user = self.request.user
-        user_groups = set(user.groups.values_list("name", flat=True))
-
-        is_admin = "Admin" in user_groups
-        has_fisio = "Fisioterapia" in user_groups
-        has_psico = "Psicología" in user_groups
-
-        # Admin + Fisioterapia o Admin + Psicología ven todos los workers
-        if is_admin and (has_fisio or has_psico):
-            return Worker.objects.all().order_by('id')
-
-        # Admin + otros grupos (que no sean Fisio ni Psico) ven solo sus workers
-        if is_admin and not (has_fisio or has_psico):
-            return Worker.objects.filter(created_by=user).order_by('id')
-
-        # Trabajadores normales ven solo su propio worker
-        return Worker.objects.filter(user=user).order_by('id')
+        return Worker.visibles_para(self.request.user, get_roles(self.request)).order_by('id')
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -84,35 +72,21 @@ class WorkerDetailView(RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        user_groups = set(user.groups.values_list("name", flat=True))
-
-        is_admin = "Admin" in user_groups
-        has_fisio = "Fisioterapia" in user_groups
-        has_psico = "Psicología" in user_groups
-
-        if is_admin and (has_fisio or has_psico):
-            # Admin + Fisio o Psico pueden acceder a todos
-            return Worker.objects.all().order_by('id')
-
-        if is_admin and not (has_fisio or has_psico):
-            # Admin otros grupos solo sus workers
-            return Worker.objects.filter(created_by=user).order_by('id')
-
-        # Worker normal solo ve su worker
-        return Worker.objects.filter(user=user).order_by('id')
+        return Worker.visibles_para(self.request.user, get_roles(self.request)).order_by('id')
 
     def perform_update(self, serializer):
         worker = self.get_object()
         user = self.request.user
+        roles = get_roles(self.request)
 
-        if worker.created_by != user and not (user.is_staff and ("Fisioterapia" in user.groups.values_list("name", flat=True) or "Psicología" in user.groups.values_list("name", flat=True))):
+        if worker.created_by != user and not (user.is_staff and (roles.is_fisio or roles.is_psico)):
             raise PermissionDenied("No tienes permiso para editar este trabajador.")
         serializer.save()
 
     def perform_destroy(self, instance):
         user = self.request.user
-        if instance.created_by != user and not (user.is_staff and ("Fisioterapia" in user.groups.values_list("name", flat=True) or "Psicología" in user.groups.values_list("name", flat=True))):
+        roles = get_roles(self.request)
+        if instance.created_by != user and not (user.is_staff and (roles.is_fisio or roles.is_psico)):
             raise PermissionDenied("No tienes permiso para eliminar este trabajador.")
 
         try:
@@ -124,18 +98,21 @@ class WorkerDetailView(RetrieveUpdateDestroyAPIView):
         instance.delete()
 
 class WorkerAppointmentsView(ListAPIView):
-    serializer_class = CitaSerializer
+    serializer_class = CitaLecturaSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
+        return citas_para_lectura(self.get_citas_worker())
+
+    def get_citas_worker(self):
         user = self.request.user
         worker_id = self.kwargs.get('worker_pk')
         worker = get_object_or_404(Worker, id=worker_id)
 
-        user_groups = set(user.groups.values_list("name", flat=True))
-        is_admin = "Admin" in user_groups
-        has_fisio = "Fisioterapia" in user_groups
-        has_psico = "Psicología" in user_groups
+        roles = get_roles(self.request)
+        is_admin = roles.is_admin
+        has_fisio = roles.is_fisio
+        has_psico = roles.is_psico
 
         # Admin + Fisio o Psico ven todas las citas de cualquier worker
         if is_admin and (has_fisio or has_psico):
@@ -153,6 +130,58 @@ class WorkerAppointmentsView(ListAPIView):
         # Otros casos no tienen permiso
         raise PermissionDenied("No tienes permiso para ver las citas de este trabajador.")
 
+class WorkerCalendarioView(APIView):
+    """
+    URL del feed ICS de un worker. GET la devuelve (y crea el token la primera
+    vez); POST genera un token nuevo, con lo que la URL anterior deja de valer.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_worker(self, request, worker_pk):
+        return get_object_or_404(Worker.visibles_para(request.user, get_roles(request)), pk=worker_pk)
+
+    def respuesta(self, request, token):
+        url = request.build_absolute_uri(reverse('worker-calendario-feed', args=[token]))
+        return Response({'url': url})
+
+    def get(self, request, worker_pk):
+        worker = self.get_worker(request, worker_pk)
+        return self.respuesta(request, worker.token_calendario or worker.regenerar_token_calendario())
+
+    def post(self, request, worker_pk):
+        worker = self.get_worker(request, worker_pk)
+        return self.respuesta(request, worker.regenerar_token_calendario())
+
+
+class WorkerCalendarioFeedView(View):
+    """
+    Feed ICS de la agenda del worker. Los calendarios no envían cabecera de
+    autorización, así que se accede por el token secreto de la URL. Responde
+    304 si el cliente ya tiene la versión actual (If-None-Match).
+
+    Es una vista de Django y no de DRF: la negociación de contenido de DRF
+    rechazaría los clientes que piden text/calendar.
+    """
+    def get(self, request, token):
+        worker = Worker.objects.filter(token_calendario=token).first()
+        if worker is None:
+            raise Http404
+
+        start, end = ventana()
+        etag = version_feed(worker, start, end)
+        no_modificado = get_conditional_response(request, etag=etag)
+        if no_modificado is not None:
+            return no_modificado
+
+        response = StreamingHttpResponse(
+            generar_feed(worker, start, end, request.get_host().split(':')[0]),
+            content_type='text/calendar; charset=utf-8',
+        )
+        response['ETag'] = etag
+        response['Content-Disposition'] = f'inline; filename="agenda-{worker.pk}.ics"'
+        return response
+
+
 class CreateWorkerAppointmentView(CreateAPIView):
     serializer_class = CitaSerializer
     permission_classes = [IsAuthenticated]
@@ -162,8 +191,7 @@ class CreateWorkerAppointmentView(CreateAPIView):
         worker_id = self.kwargs.get('worker_pk')
         worker = get_object_or_404(Worker, id=worker_id)
 
-        user_groups = set(user.groups.values_list("name", flat=True))
-        is_admin = "Admin" in user_groups
+        is_admin = get_roles(self.request).is_admin
 
         if worker.created_by != user and not is_admin:
             raise PermissionDenied("No tienes permiso para agregar citas a este trabajador.")
@@ -180,20 +208,22 @@ class AppointmentDetailView(RetrieveUpdateDestroyAPIView):
         worker_pk = self.kwargs.get('worker_pk')
         worker = get_object_or_404(Worker, pk=worker_pk)
 
-        user_groups = set(user.groups.values_list("name", flat=True))
-        is_admin = "Admin" in user_groups
-        has_fisio = "Fisioterapia" in user_groups
-        has_psico = "Psicología" in user_groups
+        roles = get_roles(self.request)
+        is_admin = roles.is_admin
+        has_fisio = roles.is_fisio
+        has_psico = roles.is_psico
+
+        citas = Cita.objects.select_related('paciente')
 
         if is_admin and (has_fisio or has_psico):
-            return Cita.objects.filter(worker=worker).order_by('fecha')
+            return citas.filter(worker=worker).order_by('fecha')
 
         if is_admin and not (has_fisio or has_psico) and worker.created_by == user:
-            return Cita.objects.filter(worker=worker).order_by('fecha')
+            return citas.filter(worker=worker).order_by('fecha')
 
         # Worker solo ve sus citas creadas por el creador del worker
         if worker.user == user:
-            return Cita.objects.filter(worker=worker, user=worker.created_by).order_by('fecha')
+            return citas.filter(worker=worker, user=worker.created_by).order_by('fecha')
 
         raise PermissionDenied("No tienes permiso para ver o editar esta cita.")
 
@@ -202,10 +232,10 @@ class AppointmentDetailView(RetrieveUpdateDestroyAPIView):
         cita = self.get_object()
         worker = cita.worker
 
-        user_groups = set(user.groups.values_list("name", flat=True))
-        is_admin = "Admin" in user_groups
-        has_fisio = "Fisioterapia" in user_groups
-        has_psico = "Psicología" in user_groups
+        roles = get_roles(self.request)
+        is_admin = roles.is_admin
+        has_fisio = roles.is_fisio
+        has_psico = roles.is_psico
 
         if is_admin and (has_fisio or has_psico):
             serializer.save()
@@ -225,10 +255,10 @@ class AppointmentDetailView(RetrieveUpdateDestroyAPIView):
         user = self.request.user
         worker = instance.worker
 
-        user_groups = set(user.groups.values_list("name", flat=True))
-        is_admin = "Admin" in user_groups
-        has_fisio = "Fisioterapia" in user_groups
-        has_psico = "Psicología" in user_groups
+        roles = get_roles(self.request)
+        is_admin = roles.is_admin
+        has_fisio = roles.is_fisio
+        has_psico = roles.is_psico
 
         if is_admin and (has_fisio or has_psico):
             instance.delete()
@@ -250,16 +280,12 @@ class UploadPDF(APIView):
 
     def post(self, request, worker_pk, *args, **kwargs):
         worker = get_object_or_404(Worker, pk=worker_pk)
-        is_admin = request.user.groups.filter(name='Admin').exists()
+        is_admin = get_roles(request).is_admin
         file = request.FILES.get('file')
 
         if not file:
             return Response({"error": "No file uploaded"}, status=status.HTTP_400_BAD_REQUEST)
 
-        fs = FileSystemStorage()
-        filename = fs.save(file.name, file)
-        file_url = fs.url(filename)
-
         pdf_registro = PDFRegistro.objects.create(
             worker=worker,
             file=file,
@@ -267,7 +293,7 @@ class UploadPDF(APIView):
             is_admin_upload=is_admin
         )
 
-        return Response({'message': 'PDF subido correctamente', 'file_url': file_url}, status=status.HTTP_200_OK)
+        return Response({'message': 'PDF subido correctamente', 'file_url': pdf_registro.file.url}, status=status.HTTP_200_OK)
 
 class GetPDFs(APIView):
     permission_classes = [IsAuthenticated]
@@ -314,9 +340,7 @@ class DeletePDF(APIView):
             )
 
         if pdf_registro.file:
-            file_path = pdf_registro.file.path
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            pdf_registro.file.delete(save=False)
 
         pdf_registro.delete()
         return Response({"message": "PDF eliminado correctamente"}, status=status.HTTP_200_OK)
@@ -75,7 +75,17 @@ const PatientDocuments = ({ patientId }) => {
           documents.map((doc) => (
             <li key={doc.id} className="patologia-elemento-li">
               <a href={doc.archivo} target="_blank" rel="noopener noreferrer">
-                <FaFilePdf /> {doc.archivo.split("/").pop()}
+                {doc.miniatura ? (
+                  <img
+                    src={doc.miniatura}
+                    alt=""
+                    loading="lazy"
+                    className="inline-block h-12 w-12 object-cover mr-2"
+                  />
+                ) : (
+                  <FaFilePdf />
+                )}{" "}
+                {doc.archivo.split("/").pop()}
               </a>
               <button
                 className="btn-eliminar"